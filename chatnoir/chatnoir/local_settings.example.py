@@ -53,7 +53,8 @@ SEARCH_INDICES = {
       'display_name': '',               # Friendly index name
       'source_url': '',                 # URL to upstream source dataset
       'compat_search_versions': [1],    # Compatible search versions (so far always 1)
-      'default': True                   # Whether this is the default index (optional)
+      'default': True,                  # Whether this is the default index (optional)
+      'warc_locator': None              # Local WARC record locator file (optional, see buildwarclocator)
   }
 }
 
@@ -44,11 +44,37 @@ API_ADMIN_ROLE = 'admin'
 API_KEYCREATE_ROLE = 'keycreate'
 API_NOLOG_ROLE = 'nolog'
 API_NOTAKEDOWN_ROLE = 'notakedown'
+API_NOPREFETCH_ROLE = 'noprefetch'
 
 # API key signatures
 API_KEY_TOKEN_MAX_VALIDITY = 86400
 API_KEY_TOKEN_DEFAULT_VALIDITY = 7200
 API_KEY_TOKEN_FRONTEND_VALIDITY = 300
+# Fraction of the validity period after which cached link and session tokens are renewed
+API_KEY_TOKEN_CACHE_RENEWAL = 0.5
+
+# Seconds to cache authenticated API keys in each worker process (0 to disable) and maximum number of cached keys
+API_AUTH_CACHE_TTL = 60
+API_AUTH_CACHE_SIZE = 4096
+# Django cache alias for invalidating cached API keys across workers and seconds between invalidation checks
+# (apps without a shared cache in CACHES, such as the web cache, only see changes after API_AUTH_CACHE_TTL)
+API_AUTH_CACHE = 'default'
+API_AUTH_CACHE_VERSION_CHECK = 5
+
+# Django cache alias for sharing per-second request rate and concurrent search counters of API keys between workers
+# (must be shared between processes and support atomic increments, i.e. Redis or Memcached, not the local-memory
+# or database cache; API key rate limits are not enforced if None)
+API_RATE_LIMIT_CACHE = None
+# Seconds after which concurrent search slots expire if never released (should exceed the longest request)
+API_RATE_LIMIT_SLOT_TIMEOUT = 900
+
+# Maximum number of queries per batch search request
+API_MSEARCH_MAX_QUERIES = 100
+
+# Seconds between writes of API quota usage counted in each worker process (0 to write on every request)
+API_QUOTA_FLUSH_INTERVAL = 10
+# Seconds after which per-process quota counts of unused API keys are dropped
+API_QUOTA_IDLE_TIMEOUT = 3600
 
 # Set to true if running behind a proxy
 API_TRUST_X_FORWARDED_FOR = False
@@ -209,10 +235,52 @@ SEARCH_INDICES = {
         'display_name': '',             # Friendly index name
         'source_url': '',               # URL to upstream source dataset
         'compat_search_versions': [1],  # Compatible search versions (so far always 1)
-        'default': True                 # Whether this is the default index (optional)
+        'default': True,                # Whether this is the default index (optional)
+        'warc_locator': None            # Local WARC record locator file (optional)
     }
 }
 
+# Seconds to cache the set of taken-down documents for serving WARC locator hits
+WARC_LOCATOR_TAKEDOWN_TTL = 60
+
+# Local disk cache for rendered web cache pages (disabled if None, must be the same directory for the admin backend)
+RENDER_CACHE_DIR = None
+RENDER_CACHE_MAX_SIZE = 4 * 1024 ** 3
+RENDER_CACHE_MAX_ENTRY_SIZE = 8 * 1024 ** 2
+
+# Resolve outlinks of cached pages to archived documents (non-archived links point to the live web)
+CACHE_RESOLVE_OUTLINKS = True
+# Number of URL to UUID resolutions to cache per index and seconds to cache them
+OUTLINK_RESOLUTION_CACHE_SIZE = 100000
+OUTLINK_RESOLUTION_CACHE_TTL = 3600
+
+# Django cache alias for caching search results (None to disable). Should be a Redis or Memcached cache shared
+# between workers. A database cache adds database queries and writes to every search instead of saving time.
+SERP_CACHE = None
+SERP_CACHE_TTL = 300
+# Serve stale search results if the search backend times out and for how many seconds after expiry
+SERP_CACHE_SERVE_STALE = True
+SERP_CACHE_STALE_TTL = 3600
+
+# Seconds to wait for an identical in-flight search request in the same worker process instead of sending it again
+# (0 to disable request coalescing)
+SEARCH_COALESCE_TIMEOUT = 10
+
+# Over-fetch the next result page of API searches within the rescore window into the search result cache
+# (keys with the API_NOPREFETCH_ROLE are excluded) and average backend response time in ms above which to pause it
+SEARCH_PREFETCH_NEXT_PAGE = False
+SEARCH_PREFETCH_MAX_LATENCY = 500
+
+# Count total hits exactly only up to this number (larger totals are reported as lower bounds, True to always count)
+SEARCH_TRACK_TOTAL_HITS = 10000
+
+# Run searches with stored search templates on the cluster (install with "manage.py installsearchtemplates")
+SEARCH_STORED_TEMPLATES = False
+
+# Number of results per point-in-time page and point-in-time keep-alive for search result exports
+SEARCH_EXPORT_PAGE_SIZE = 1000
+SEARCH_EXPORT_PIT_KEEP_ALIVE = '5m'
+
 # Additional settings to pass to the JavaScript frontend (all settings in this are user-readable!)
 FRONTEND_ADDITIONAL_SETTINGS = {}
 
@@ -5,6 +5,8 @@ from elasticsearch_dsl import Q, Search, connections
 from elasticsearch.helpers import bulk
 
 from chatnoir_search.elastic_backend import get_index
+from chatnoir_search.serp_cache import get_serp_cache
+from web_cache.render_cache import get_render_cache
 from .forms import TakedownForm
 
 
@@ -29,7 +31,9 @@ def takedowns(request):
             connections.configure(default=settings.ELASTICSEARCH_PROPERTIES)
 
         index_refresh_pending = set()
+        index_takedowns_updated = set()
         bulk_actions = {}
+        render_cache = get_render_cache()
 
         # Collect exact-UUID takedowns from cache URLs first
         takedowns_by_index = {}
@@ -112,6 +116,11 @@ def takedowns(request):
                     'doc': {'takedown': do_take_down},
                 }
                 index_refresh_pending.add(hit.meta.index)
+                index_takedowns_updated.add(index_name)
+
+                # Invalidate rendered cache pages
+                if render_cache and getattr(hit, 'uuid', None):
+                    render_cache.invalidate(index_name, hit.uuid)
 
         # Summarise prefix takedown stats
         for prefix, action in takedown_prefixes.items():
@@ -132,6 +141,11 @@ def takedowns(request):
         if index_refresh_pending:
             es.indices.refresh(index=list(index_refresh_pending))
 
+        # Invalidate cached search results of updated indices
+        serp_cache = get_serp_cache()
+        if serp_cache and index_takedowns_updated:
+            serp_cache.invalidate_indices(index_takedowns_updated)
+
     context = {
         **admin.site.each_context(request),
         'form': form,
@@ -15,7 +15,8 @@
 import os
 
 from django.contrib import admin, messages
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Count, Q
 from django.forms import ModelForm, Textarea
 from django.urls import reverse
 from django.utils.html import escape, mark_safe
@@ -45,6 +46,7 @@ class ApiKeyAdminBaseMixin:
         'parent',
         ('issue_date', '_expires'),
         ('_limits_day', '_limits_week', '_limits_month'),
+        ('_limits_second', '_limits_concurrent'),
         'roles',
         'allowed_remote_hosts',
         'comments',
@@ -66,6 +68,8 @@ class ApiKeyAdmin(ApiKeyAdminBaseMixin, admin.ModelAdmin):
         'limits_day',
         'limits_week',
         'limits_month',
+        'limits_second',
+        'limits_concurrent',
         '_is_root_key',
         'key_id',
     )
@@ -120,6 +124,7 @@ class ApiKeyAdmin(ApiKeyAdminBaseMixin, admin.ModelAdmin):
                     '_revoked_bool',
                     '_valid_bool',
                     ('limits_day', 'limits_week', 'limits_month'),
+                    ('limits_second', 'limits_concurrent'),
                 )})
             )
 
@@ -155,25 +160,27 @@ class ApiKeyAdmin(ApiKeyAdminBaseMixin, admin.ModelAdmin):
         # Exclude keys which are not allowed to issue other API keys
         if '/autocomplete/' in request.path:
             keycreate_roles = (settings.API_ADMIN_ROLE, settings.API_KEYCREATE_ROLE)
-            queryset = queryset.filter(Q(roles__in=keycreate_roles, _revoked=False),
-                                       Q(_expires__gte=timezone.now()) | Q(_expires__isnull=True))
+            queryset = queryset.filter(Q(roles__in=keycreate_roles, effective_revoked=False),
+                                       Q(effective_expires__gt=timezone.now()) | Q(effective_expires__isnull=True))
+            use_distinct = True
 
-            # Prevent cycles through self-parenting
+            # Prevent cycles through parenting a key to itself or one of its sub keys
             if request.META.get('HTTP_REFERER') and '/apikey/' in request.META.get('HTTP_REFERER'):
                 p = os.path.basename(os.path.dirname(request.META.get('HTTP_REFERER').rstrip('/')))
-                queryset = queryset.exclude(Q(api_key=p) | Q(key_id=p))
-
-            queryset = [r for r in queryset if r.valid]
+                queryset = queryset.exclude(Q(ancestor_links__ancestor__api_key=p) |
+                                            Q(ancestor_links__ancestor__key_id=p))
 
         return queryset, use_distinct
 
     @admin.action(description=_('Revoke selected API Keys'))
     def revoke_keys(self, request, queryset):
         count = 0
-        for key in queryset:
-            key._revoked = True
-            count += 1
-        ApiKey.objects.bulk_update(queryset, ['_revoked'])
+        with transaction.atomic():
+            # Save parents before sub keys, so effective values are propagated from updated parents
+            for key in queryset.annotate(level=Count('ancestor_links', distinct=True)).order_by('level'):
+                key.revoked = True
+                key.save()
+                count += 1
 
         if count > 0:
             self.message_user(request, ngettext('%s API key successfully revoked.',
@@ -183,10 +190,12 @@ class ApiKeyAdmin(ApiKeyAdminBaseMixin, admin.ModelAdmin):
     @admin.action(description=_('Unrevoke selected API Keys'))
     def unrevoke_keys(self, request, queryset):
         count = 0
-        for key in queryset:
-            key._revoked = False
-            count += 1
-        ApiKey.objects.bulk_update(queryset, ['_revoked'])
+        with transaction.atomic():
+            # Save parents before sub keys, so effective values are propagated from updated parents
+            for key in queryset.annotate(level=Count('ancestor_links', distinct=True)).order_by('level'):
+                key.revoked = False
+                key.save()
+                count += 1
 
         if count > 0:
             self.message_user(request, ngettext('%s API key successfully unrevoked.',
@@ -19,3 +19,11 @@ from django.utils.translation import gettext_lazy as _
 class ChatnoirApiConfig(AppConfig):
     name = 'chatnoir_api'
     verbose_name = _('ChatNoir REST API')
+
+    def ready(self):
+        # Register cache invalidation signal handlers
+        from . import auth_cache
+
+        # Fail on startup if the rate limit cache cannot be used
+        from .rate_limit import rate_limiter
+        rate_limiter.check_cache()
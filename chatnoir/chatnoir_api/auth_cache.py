@@ -0,0 +1,145 @@
+# Copyright 2026 Janek Bevendorff
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import OrderedDict
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .models import ApiConfiguration, ApiKey, ApiKeyRole, ApiUser
+
+
+class AuthContextCache:
+    """
+    Per-process TTL cache of fully loaded API keys for authentication.
+
+    Cached keys come with their user and role names (see :attr:`ApiKey.role_names`), so authenticating
+    a cached key needs no database queries.
+    Callers receive a copy of the cached key, which they may annotate per request.
+
+    Saving or deleting API keys, users, roles, or the API configuration invalidates the caches of all
+    processes by bumping a version counter in the shared Django cache ``settings.API_AUTH_CACHE``.
+    Other processes check the counter at most every ``settings.API_AUTH_CACHE_VERSION_CHECK`` seconds.
+    Processes that do not share this cache (e.g., web cache workers with Django's default local-memory cache)
+    only see changes after ``settings.API_AUTH_CACHE_TTL`` seconds.
+    """
+
+    VERSION_KEY = 'chatnoir_api.auth_cache.version'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._version = None
+        self._next_version_check = 0.0
+
+    @property
+    def _shared_cache(self):
+        return caches[settings.API_AUTH_CACHE]
+
+    def _check_version(self, now):
+        """Clear the cache if another process invalidated it. Call while holding the lock."""
+        if now < self._next_version_check:
+            return
+        version = self._shared_cache.get(self.VERSION_KEY, 0)
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+        self._next_version_check = now + settings.API_AUTH_CACHE_VERSION_CHECK
+
+    def get(self, lookup, load):
+        """
+        Get a cached object or load and cache it.
+
+        :param lookup: hashable lookup key
+        :param load: function loading the object if it is not cached (exceptions are not cached)
+        :return: copy of the cached object
+        """
+        if not settings.API_AUTH_CACHE_TTL:
+            return load()
+
+        now = time.monotonic()
+        with self._lock:
+            self._check_version(now)
+            entry = self._entries.get(lookup)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(lookup)
+                return copy.copy(entry[1])
+            version = self._version
+
+        obj = load()
+        with self._lock:
+            # Do not cache objects loaded before an invalidation
+            if version == self._version:
+                self._entries[lookup] = (now + settings.API_AUTH_CACHE_TTL, obj)
+                self._entries.move_to_end(lookup)
+                while len(self._entries) > settings.API_AUTH_CACHE_SIZE:
+                    self._entries.popitem(last=False)
+        return copy.copy(obj)
+
+    def invalidate(self):
+        """Invalidate the caches of all processes."""
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+            self._next_version_check = 0.0
+        shared_cache = self._shared_cache
+        # Version counter must not expire, otherwise it could restart at an old value
+        shared_cache.add(self.VERSION_KEY, 0, timeout=None)
+        try:
+            shared_cache.incr(self.VERSION_KEY)
+            # Some backends (e.g., the database cache) reset the timeout to the default on incr()
+            shared_cache.touch(self.VERSION_KEY, None)
+        except ValueError:
+            shared_cache.set(self.VERSION_KEY, 1, timeout=None)
+
+
+auth_context_cache = AuthContextCache()
+
+
+def load_api_key(**lookup):
+    """
+    Load an API key with everything needed for authentication.
+
+    :param lookup: field lookup identifying the key
+    :return: :class:`ApiKey`
+    :raises ApiKey.DoesNotExist: if the key does not exist
+    """
+    api_key = ApiKey.objects.select_related('user').prefetch_related('roles').get(**lookup)
+    _ = api_key.role_names
+    return api_key
+
+
+@receiver(post_save, sender=ApiKey)
+@receiver(post_save, sender=ApiUser)
+@receiver(post_save, sender=ApiKeyRole)
+@receiver(post_save, sender=ApiConfiguration)
+@receiver(post_delete, sender=ApiKey)
+@receiver(post_delete, sender=ApiUser)
+@receiver(post_delete, sender=ApiKeyRole)
+def _invalidate_on_change(sender, **kwargs):
+    auth_context_cache.invalidate()
+
+
+@receiver(m2m_changed, sender=ApiKey.roles.through)
+def _invalidate_on_roles_change(sender, instance, action, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if isinstance(instance, ApiKey):
+        instance._role_names = None
+    auth_context_cache.invalidate()
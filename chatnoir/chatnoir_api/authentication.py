@@ -13,11 +13,13 @@
 # limitations under the License.
 
 import base64
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone as dt_timezone
 import ipaddress
 import json
-import pickle
 import secrets
+import threading
+import time
 from hashlib import sha256
 
 from django.conf import settings
@@ -27,12 +29,30 @@ from cryptography.exceptions import InvalidSignature
 from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
 from rest_framework import authentication, exceptions as rest_exceptions, permissions
 
+from .auth_cache import auth_context_cache, load_api_key
 from .models import ApiConfiguration, ApiKey
+from .quota import quota_counters
+from .rate_limit import rate_limiter
 
 
 class ApiKeyAuthentication(authentication.BaseAuthentication):
     SIGNED_TOKEN_PREFIX = 'sig:'
 
+    """Whether to acquire a concurrent search slot (released by the view, see :meth:`release_search_slot`)."""
+    ACQUIRE_SEARCH_SLOT = False
+
+    """Maximum number of per-key signed tokens to keep in the process-local token cache."""
+    SIGNED_TOKEN_CACHE_SIZE = 4096
+
+    _SIGNED_TOKEN_CACHE = OrderedDict()
+    _SIGNED_TOKEN_CACHE_LOCK = threading.Lock()
+
+    """Maximum number of verified signed tokens to keep in the process-local verification cache."""
+    VERIFIED_TOKEN_CACHE_SIZE = 4096
+
+    _VERIFIED_TOKEN_CACHE = OrderedDict()
+    _VERIFIED_TOKEN_CACHE_LOCK = threading.Lock()
+
     @staticmethod
     def _b64decode(data):
         if isinstance(data, str):
@@ -71,13 +91,67 @@ class ApiKeyAuthentication(authentication.BaseAuthentication):
 
     @classmethod
     def _get_web_frontend_api_key(cls):
-        return ApiConfiguration.objects.get().web_frontend_key
+        return auth_context_cache.get(
+            ('web_frontend',), lambda: load_api_key(pk=ApiConfiguration.objects.get().web_frontend_key_id))
+
+    @classmethod
+    def _get_verified_token(cls, token_digest, api_key_token_str):
+        """
+        Get the API key of a previously verified signed token from the process-local verification cache.
+
+        Entries are evicted if the token has expired or if the key was revoked or its private key changed.
+
+        :param token_digest: SHA-256 digest of the token
+        :param api_key_token_str: token string
+        :return: API key or ``None`` if the token is not cached or needs to be verified again
+        """
+        with cls._VERIFIED_TOKEN_CACHE_LOCK:
+            entry = cls._VERIFIED_TOKEN_CACHE.get(token_digest)
+            if entry is None:
+                return None
+            cls._VERIFIED_TOKEN_CACHE.move_to_end(token_digest)
+
+        valid_until, key_id, temporary_session, private_key_digest = entry
+        api_key = None
+        if timezone.now() <= valid_until:
+            try:
+                if temporary_session:
+                    api_key = cls._get_web_frontend_api_key()
+                else:
+                    api_key = auth_context_cache.get(('key_id', key_id), lambda: load_api_key(key_id=key_id))
+            except ApiKey.DoesNotExist:
+                pass
+
+        if api_key is None or api_key.key_id != key_id or api_key.revoked or \
+                sha256(api_key.private_key.encode()).digest() != private_key_digest:
+            with cls._VERIFIED_TOKEN_CACHE_LOCK:
+                cls._VERIFIED_TOKEN_CACHE.pop(token_digest, None)
+            return None
+
+        api_key._auth_credential = api_key_token_str
+        api_key._auth_via_signature = True
+        return api_key
+
+    @classmethod
+    def _cache_verified_token(cls, token_digest, valid_until, temporary_session, api_key):
+        entry = (valid_until, api_key.key_id, temporary_session, sha256(api_key.private_key.encode()).digest())
+        with cls._VERIFIED_TOKEN_CACHE_LOCK:
+            cls._VERIFIED_TOKEN_CACHE[token_digest] = entry
+            cls._VERIFIED_TOKEN_CACHE.move_to_end(token_digest)
+            while len(cls._VERIFIED_TOKEN_CACHE) > cls.VERIFIED_TOKEN_CACHE_SIZE:
+                cls._VERIFIED_TOKEN_CACHE.popitem(last=False)
 
     @classmethod
     def _authenticate_signed_token(cls, request, api_key_token_str):
         if not api_key_token_str.startswith(cls.SIGNED_TOKEN_PREFIX):
             return None
 
+        # Skip parsing and signature verification for recently verified tokens
+        token_digest = sha256(api_key_token_str.encode()).digest()
+        api_key = cls._get_verified_token(token_digest, api_key_token_str)
+        if api_key is not None:
+            return api_key
+
         try:
             token_data = json.loads(cls._b64decode(api_key_token_str[len(cls.SIGNED_TOKEN_PREFIX):]).decode())
             key_id = token_data['key_id']
@@ -101,7 +175,8 @@ class ApiKeyAuthentication(authentication.BaseAuthentication):
             raise rest_exceptions.AuthenticationFailed(_('API key token has expired.'), 'expired')
 
         message = cls._canonical_signed_token_payload(token_data)
-        if token_data.get('temporary_session'):
+        temporary_session = bool(token_data.get('temporary_session'))
+        if temporary_session:
             if not isinstance(token_data.get('issuer'), str) or not token_data['issuer']:
                 raise rest_exceptions.NotAuthenticated(_('Invalid API key token.'))
 
@@ -110,20 +185,24 @@ class ApiKeyAuthentication(authentication.BaseAuthentication):
                 raise rest_exceptions.NotAuthenticated(_('Invalid API key token.'))
 
             try:
-                return cls._verify_signed_token_for_api_key(
+                api_key = cls._verify_signed_token_for_api_key(
                     web_frontend_api_key, nonce, signature, message, api_key_token_str
                 )
             except InvalidSignature:
                 raise rest_exceptions.NotAuthenticated(_('Invalid API key token.'))
-
-        try:
+        else:
             try:
-                api_key = ApiKey.objects.get(key_id=key_id)
-            except ApiKey.DoesNotExist:
+                try:
+                    api_key = auth_context_cache.get(('key_id', key_id), lambda: load_api_key(key_id=key_id))
+                except ApiKey.DoesNotExist:
+                    raise rest_exceptions.NotAuthenticated(_('Invalid API key token.'))
+                api_key = cls._verify_signed_token_for_api_key(api_key, nonce, signature, message, api_key_token_str)
+            except InvalidSignature:
                 raise rest_exceptions.NotAuthenticated(_('Invalid API key token.'))
-            return cls._verify_signed_token_for_api_key(api_key, nonce, signature, message, api_key_token_str)
-        except InvalidSignature:
-            raise rest_exceptions.NotAuthenticated(_('Invalid API key token.'))
+
+        if not api_key.revoked:
+            cls._cache_verified_token(token_digest, valid_until, temporary_session, api_key)
+        return api_key
 
     @classmethod
     def create_signed_apikey_token(cls, api_key, validity=None):
@@ -154,8 +233,69 @@ class ApiKeyAuthentication(authentication.BaseAuthentication):
             payload)
 
     @classmethod
-    def create_temporary_frontend_token(cls, validity=300, issuer='web_frontend'):
+    def _get_cached_token(cls, cache_key, validity, create_token):
+        """
+        Return a cached token for ``cache_key`` or mint a new one with ``create_token()``.
+
+        Cached tokens are renewed once the fraction of their validity period configured in
+        ``settings.API_KEY_TOKEN_CACHE_RENEWAL`` has passed, so that handed-out tokens are never
+        about to expire.
+        """
+        now = time.monotonic()
+        with cls._SIGNED_TOKEN_CACHE_LOCK:
+            cached = cls._SIGNED_TOKEN_CACHE.get(cache_key)
+            if cached is not None and cached[0] > now:
+                cls._SIGNED_TOKEN_CACHE.move_to_end(cache_key)
+                return cached[1]
+
+        token = create_token()
+        renew_at = now + validity * settings.API_KEY_TOKEN_CACHE_RENEWAL
+        with cls._SIGNED_TOKEN_CACHE_LOCK:
+            cls._SIGNED_TOKEN_CACHE[cache_key] = (renew_at, token)
+            cls._SIGNED_TOKEN_CACHE.move_to_end(cache_key)
+            while len(cls._SIGNED_TOKEN_CACHE) > cls.SIGNED_TOKEN_CACHE_SIZE:
+                cls._SIGNED_TOKEN_CACHE.popitem(last=False)
+        return token
+
+    @classmethod
+    def get_signed_apikey_token(cls, api_key, validity=None):
+        """
+        Get a signed API key token for the given API key from the process-local token cache.
+
+        Unlike :meth:`create_signed_apikey_token`, this returns the same token for all calls with the same
+        key within a validity window instead of signing a new token every time. Use this for embedding
+        tokens into generated links (e.g., cache URLs on a SERP).
+
+        :param api_key: API key model object
+        :param validity: validity period in seconds (default from settings if ``None``)
+        :returns: tuple of token and JSON payload
+        """
+        if not validity:
+            validity = min(settings.API_KEY_TOKEN_DEFAULT_VALIDITY, settings.API_KEY_TOKEN_MAX_VALIDITY)
+        cache_key = ('apikey', api_key.key_id, sha256(api_key.private_key.encode()).digest(), validity)
+        return cls._get_cached_token(cache_key, validity, lambda: cls.create_signed_apikey_token(api_key, validity))
+
+    @classmethod
+    def get_temporary_frontend_token(cls, validity=300, issuer='web_frontend'):
+        """
+        Get a temporary web frontend session token from the process-local token cache.
+
+        See :meth:`get_signed_apikey_token` and :meth:`create_temporary_frontend_token`.
+
+        :param validity: validity period in seconds
+        :param issuer: token issuer name
+        :returns: tuple of token and JSON payload
+        """
         web_frontend_api_key = cls._get_web_frontend_api_key()
+        cache_key = ('frontend', web_frontend_api_key.key_id,
+                     sha256(web_frontend_api_key.private_key.encode()).digest(), validity, issuer)
+        return cls._get_cached_token(
+            cache_key, validity, lambda: cls.create_temporary_frontend_token(validity, issuer, web_frontend_api_key))
+
+    @classmethod
+    def create_temporary_frontend_token(cls, validity=300, issuer='web_frontend', web_frontend_api_key=None):
+        if web_frontend_api_key is None:
+            web_frontend_api_key = cls._get_web_frontend_api_key()
         valid_from = datetime.now(dt_timezone.utc)
         valid_until = valid_from + timedelta(seconds=validity)
         payload = {
@@ -203,53 +343,86 @@ class ApiKeyAuthentication(authentication.BaseAuthentication):
 
     @classmethod
     def validate_api_limits(cls, api_key, increment=True):
+        """
+        Validate and charge the request quota of an API key.
+
+        :param api_key: API key
+        :param increment: charge the request quota, either ``True`` for one request or the number of requests
+        :raises rest_exceptions.Throttled: if the request would exceed the quota
+        """
         limits = api_key.limits
         if limits == (None, None, None):
             # Entirely unlimited
             return
 
-        day_seconds = 60 * 60 * 24
-        now = datetime.now()
-        bucket_default = (int(now.timestamp()), 0)
-        month_back = int((now - timedelta(seconds=day_seconds * 30)).timestamp())
-        week_back = int((now - timedelta(seconds=day_seconds * 7)).timestamp())
-        day_back = int((now - timedelta(seconds=day_seconds)).timestamp())
+        if not quota_counters.charge(api_key, int(increment), limits):
+            raise rest_exceptions.Throttled(None, _('API request limit exceeded.'), 'quota_exceeded')
 
-        if not api_key.quota_used:
-            quota_used = [bucket_default]
-        else:
-            # Load pickled quota and drop buckets older than a month
-            quota_used = [q for q in pickle.loads(api_key.quota_used) if q[0] >= month_back]
+    @classmethod
+    def validate_rate_limit(cls, api_key, num_requests=1):
+        """
+        Validate the per-second request rate limit of an API key.
 
-        # Append "today" bucket if needed
-        if not quota_used or quota_used[-1][0] < day_back:
-            quota_used.append(bucket_default)
+        :param api_key: API key
+        :param num_requests: number of requests
+        :raises rest_exceptions.Throttled: if the request would exceed the rate limit
+        """
+        retry_after = rate_limiter.acquire_rate(api_key, num_requests, api_key.limits_second)
+        if retry_after:
+            raise rest_exceptions.Throttled(retry_after, _('API request rate limit exceeded.'), 'rate_limited')
 
-        day_used = quota_used[-1][1]
-        week_used = 0
-        month_used = 0
-        for bucket in quota_used:
-            month_used += bucket[1]
-            if bucket[0] >= week_back:
-                week_used += bucket[1]
+    @classmethod
+    def acquire_search_slot(cls, request, api_key):
+        """
+        Acquire a concurrent search slot of an API key for a request.
 
-        def exceeded(u, l):
-            return l is not None and l <= u
+        :param request: HTTP request
+        :param api_key: API key
+        :raises rest_exceptions.Throttled: if the key has no free slot
+        """
+        acquired, request.search_slot = rate_limiter.acquire_slot(api_key, api_key.limits_concurrent)
+        if not acquired:
+            raise rest_exceptions.Throttled(1, _('Too many concurrent searches.'), 'too_many_searches')
 
-        quota_exceeded = exceeded(day_used, limits[0]) or \
-            exceeded(week_used, limits[1]) or exceeded(month_used, limits[2])
+    @staticmethod
+    def release_search_slot(request):
+        """
+        Release the concurrent search slot acquired for a request (if any).
 
-        if increment and not quota_exceeded:
-            quota_used[-1] = (quota_used[-1][0], quota_used[-1][1] + 1)
+        :param request: HTTP request
+        """
+        slot = getattr(request, 'search_slot', None)
+        request.search_slot = None
+        rate_limiter.release_slot(slot)
 
-        pickled = pickle.dumps(quota_used)
-        if api_key.quota_used != pickled:
-            api_key.quota_used = pickled
-            if api_key._state.db:
-                api_key.save()
+    def get_request_cost(self, request):
+        """
+        Number of requests to charge to the API quota for a request.
 
-        if quota_exceeded:
-            raise rest_exceptions.Throttled(None, _('API request limit exceeded.'), 'quota_exceeded')
+        :param request: HTTP request
+        :return: request cost
+        """
+        return 1
+
+    def get_api_key(self, request, api_key_str):
+        """
+        Resolve and validate an API key or signed token without charging the request quota.
+
+        :param request: HTTP request
+        :param api_key_str: API key or signed token
+        :return: API key
+        """
+        api_key = self._authenticate_signed_token(request, api_key_str)
+        if not api_key:
+            try:
+                api_key = auth_context_cache.get(('api_key', api_key_str), lambda: load_api_key(api_key=api_key_str))
+            except ApiKey.DoesNotExist:
+                raise rest_exceptions.NotAuthenticated(_('Invalid API key.'))
+
+        self.validate_expiration(api_key)
+        self.validate_revocation(api_key)
+        self.validate_remote_hosts(api_key, request)
+        return api_key
 
     def authenticate(self, request):
         if request.method == 'OPTIONS':
@@ -264,23 +437,45 @@ class ApiKeyAuthentication(authentication.BaseAuthentication):
         if not api_key_str:
             raise rest_exceptions.NotAuthenticated(_('No API key supplied.'))
 
-        api_key = self._authenticate_signed_token(request, api_key_str)
-        if not api_key:
-            try:
-                api_key = ApiKey.objects.get(api_key=api_key_str)
-            except ApiKey.DoesNotExist:
-                raise rest_exceptions.NotAuthenticated(_('Invalid API key.'))
+        api_key = self.get_api_key(request, api_key_str)
+        cost = self.get_request_cost(request)
 
-        self.validate_expiration(api_key)
-        self.validate_revocation(api_key)
-        self.validate_remote_hosts(api_key, request)
-        self.validate_api_limits(api_key)
+        # Check concurrent searches first, so rejected requests are not charged
+        if self.ACQUIRE_SEARCH_SLOT:
+            self.acquire_search_slot(request, api_key)
+        try:
+            self.validate_rate_limit(api_key, cost)
+            self.validate_api_limits(api_key, cost)
+        except rest_exceptions.APIException:
+            self.release_search_slot(request)
+            raise
 
         if not hasattr(api_key, '_auth_credential'):
             api_key._auth_credential = api_key.api_key
 
         return api_key.user, api_key
 
+
+class SearchApiKeyAuthentication(ApiKeyAuthentication):
+    """
+    API key authentication for search requests, which are subject to the key's concurrent search limit.
+    """
+
+    ACQUIRE_SEARCH_SLOT = True
+
+
+class BatchApiKeyAuthentication(SearchApiKeyAuthentication):
+    """
+    API key authentication for batch requests, which charges one request per query in the batch.
+    """
+
+    def get_request_cost(self, request):
+        queries = request.data.get('queries') if hasattr(request.data, 'get') else None
+        if not isinstance(queries, list):
+            return 1
+        return max(1, min(len(queries), settings.API_MSEARCH_MAX_QUERIES))
+
+
 class HasKeyCreateRole(permissions.BasePermission):
     def has_permission(self, request, view):
         return request.auth and request.auth.can_issue_keys
@@ -0,0 +1,68 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory
+
+from chatnoir_api.authentication import ApiKeyAuthentication
+from chatnoir_api.models import ApiConfiguration, ApiKey
+
+
+class Command(BaseCommand):
+    help = 'Benchmark API key authentication latency per request with and without authentication caches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--apikey',
+            help='API key to authenticate with (default: default issue key).',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=1000,
+            help='Number of requests per credential type (default: 1000).',
+        )
+
+    def _run(self, credential, num_requests):
+        auth = ApiKeyAuthentication()
+        request = APIRequestFactory().get('/api/v1/_search', REMOTE_ADDR='127.0.0.1')
+        # Warm-up request to exclude one-time costs
+        auth.get_api_key(request, credential)
+        start = time.perf_counter()
+        for _ in range(num_requests):
+            auth.get_api_key(request, credential)
+        return (time.perf_counter() - start) * 1000 / num_requests
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('--requests must be positive.')
+
+        if options['apikey']:
+            try:
+                api_key = ApiKey.objects.get(api_key=options['apikey'])
+            except ApiKey.DoesNotExist:
+                raise CommandError('API key does not exist.')
+        else:
+            api_key = ApiConfiguration.objects.get().default_issue_key
+            if not api_key:
+                raise CommandError('No default issue key configured, use --apikey.')
+
+        credentials = [('Plain key', api_key.api_key)]
+        try:
+            credentials.append(('Signed token', ApiKeyAuthentication.create_signed_apikey_token(api_key)[0]))
+            credentials.append(('Frontend token', ApiKeyAuthentication.create_temporary_frontend_token()[0]))
+        except (ApiConfiguration.DoesNotExist, ApiKey.DoesNotExist):
+            self.stderr.write('No web frontend key configured, skipping frontend tokens.')
+
+        verified_token_cache_size = ApiKeyAuthentication.VERIFIED_TOKEN_CACHE_SIZE
+        for label, credential in credentials:
+            try:
+                ApiKeyAuthentication.VERIFIED_TOKEN_CACHE_SIZE = 0
+                with ApiKeyAuthentication._VERIFIED_TOKEN_CACHE_LOCK:
+                    ApiKeyAuthentication._VERIFIED_TOKEN_CACHE.clear()
+                with override_settings(API_AUTH_CACHE_TTL=0):
+                    uncached = self._run(credential, options['requests'])
+            finally:
+                ApiKeyAuthentication.VERIFIED_TOKEN_CACHE_SIZE = verified_token_cache_size
+            cached = self._run(credential, options['requests'])
+            self.stdout.write(f'{label + ":":<16} {uncached:.3f} ms uncached, {cached:.3f} ms cached per request')
@@ -0,0 +1,60 @@
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from chatnoir_search.search import SimpleSearch, search_singleflight
+
+
+class Command(BaseCommand):
+    help = 'Benchmark concurrent identical searches with and without request coalescing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('queries', help='Text file with one query per line.')
+        parser.add_argument(
+            '--index',
+            action='append',
+            help='Index shorthand to search (can be given multiple times, default: default indices).',
+        )
+        parser.add_argument(
+            '--search-method',
+            default='default',
+            choices=SimpleSearch.SEARCH_METHODS,
+            help='Search method (default: default).',
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=16,
+            help='Number of threads sending each query at the same time (default: 16).',
+        )
+
+    def _run(self, queries, options, coalesce_timeout):
+        def search(query):
+            SimpleSearch(options['index'], search_method=options['search_method']).search(query)
+
+        # Bypass the search result cache, so every request would go to the backend
+        with override_settings(SERP_CACHE=None, SEARCH_COALESCE_TIMEOUT=coalesce_timeout), \
+                ThreadPoolExecutor(options['threads']) as pool:
+            stats_before = search_singleflight.stats()
+            start = time.perf_counter()
+            for query in queries:
+                list(pool.map(search, [query] * options['threads']))
+            elapsed = time.perf_counter() - start
+            stats = search_singleflight.stats()
+        return elapsed, {k: stats[k] - stats_before[k] for k in stats_before}
+
+    def handle(self, *args, **options):
+        with open(options['queries'], 'r') as f:
+            queries = [q.strip() for q in f if q.strip()]
+        if not queries:
+            raise CommandError(f'No queries found in {options["queries"]}')
+
+        for label, timeout in (('uncoalesced', 0), ('coalesced', 10)):
+            elapsed, stats = self._run(queries, options, timeout)
+            self.stdout.write(f'{label.capitalize() + ":":<14} {elapsed * 1000 / len(queries):.1f} ms per query '
+                              f'({options["threads"]} concurrent requests each)')
+            if timeout:
+                self.stdout.write(f'  Backend requests: {stats["executed"]}, coalesced: {stats["coalesced"]}, '
+                                  f'wait timeouts: {stats["wait_timeouts"]}, leader errors: {stats["leader_errors"]}')
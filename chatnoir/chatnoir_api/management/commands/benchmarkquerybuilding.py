@@ -0,0 +1,88 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chatnoir_search.search import SimpleSearch, PhraseSearch
+
+
+class Command(BaseCommand):
+    help = 'Benchmark search request construction with and without precompiled search templates.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('queries', help='Text file with one query per line.')
+        parser.add_argument(
+            '--index',
+            action='append',
+            help='Index shorthand to search (can be given multiple times, default: default indices).',
+        )
+        parser.add_argument(
+            '--search-method',
+            default='default',
+            choices=SimpleSearch.SEARCH_METHODS + ['phrase'],
+            help='Search method (default: default).',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=100,
+            help='Number of times to build each request (default: 100).',
+        )
+
+    def _create_search(self, options):
+        if options['search_method'] == 'phrase':
+            return PhraseSearch(options['index'])
+        return SimpleSearch(options['index'], search_method=options['search_method'])
+
+    @staticmethod
+    def _build_uncompiled(search, query):
+        if search.search_method == 'default':
+            query, user_filters = search._parse_query_string_operators(query)
+            return search._compile_default_search_request(query, user_filters.filter)
+        return search._compile_bm25_search_request(query)
+
+    @staticmethod
+    def _time(fn, repeat):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best * 1e6
+
+    def handle(self, *args, **options):
+        with open(options['queries'], 'r') as f:
+            queries = [q.strip() for q in f if q.strip()]
+        if not queries:
+            raise CommandError(f'No queries found in {options["queries"]}')
+
+        uncompiled_times = []
+        compiled_times = []
+        mismatches = 0
+        for query in queries:
+            search = self._create_search(options)
+            uncompiled = self._build_uncompiled(search, query).to_dict()
+            search = self._create_search(options)
+            compiled = search.build_search_request(query).to_dict()
+            if compiled != uncompiled:
+                mismatches += 1
+                self.stderr.write(f'Request body mismatch for query: {query}')
+
+            uncompiled_times.append(self._time(
+                lambda: self._build_uncompiled(self._create_search(options), query).to_dict(), options['repeat']))
+            compiled_times.append(self._time(
+                lambda: self._create_search(options).build_search_request(query).to_dict(), options['repeat']))
+
+        # Search object creation is part of both measurements
+        init_time = self._time(lambda: self._create_search(options), options['repeat'])
+
+        uncompiled_median = statistics.median(uncompiled_times) - init_time
+        compiled_median = statistics.median(compiled_times) - init_time
+        self.stdout.write(f'Queries:               {len(queries)} (best of {options["repeat"]} runs each)')
+        self.stdout.write(f'Body mismatches:       {mismatches}')
+        self.stdout.write(f'Search object init:    {init_time:.1f} µs')
+        self.stdout.write(f'Uncompiled (median):   {uncompiled_median:.1f} µs per request')
+        self.stdout.write(f'Compiled (median):     {compiled_median:.1f} µs per request')
+        if compiled_median > 0:
+            self.stdout.write(f'Speedup:               {uncompiled_median / compiled_median:.1f}x')
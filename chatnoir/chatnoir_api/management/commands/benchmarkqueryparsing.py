@@ -0,0 +1,193 @@
+import locale
+import random
+import re
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from elasticsearch_dsl import Q
+
+from chatnoir_search.search import SimpleSearch
+from chatnoir_search.types import FieldName
+
+
+def _legacy_parse_query_string_operators(search, query):
+    """Previous multi-pass implementation of :meth:`SimpleSearch._parse_query_string_operators` for reference."""
+    query = re.sub(r'(?!\B"[^"]*) AND (?![^"]*"\B)', ' +', query)
+    query = re.sub(r'(?!\B"[^"]*) OR (?![^"]*"\B)', ' | ', query)
+    query_string_orig = query
+
+    filter_query = Q('bool', filter=[])
+
+    for filter_keyword in search.QUERY_FILTERS:
+        filter_field = search.QUERY_FILTERS[filter_keyword].i18n(search.search_language)
+
+        is_range = filter_keyword.endswith('<>')
+        value_match = r'("[^"]+"|[^"]\S*)' if not is_range else r'(\d+)'
+        filter_keyword = filter_keyword.strip('<>')
+        kw_esc = re.escape(filter_keyword)
+
+        for filter_match in re.finditer(
+                rf'(?:^|(?<=\s))({kw_esc})([<>]=?|[=:])\s*{value_match}(?:$|\s)',
+                query_string_orig):
+            filter_value = filter_match.group(3).strip()
+
+            if is_range and not filter_value.isdigit():
+                continue
+
+            query = query.replace(query_string_orig[filter_match.start():filter_match.end()], '', 1)
+
+            if filter_field == '#index':
+                search._indices_unvalidated = [i.strip() for i in filter_value.split(',')]
+                continue
+
+            if filter_field == 'lang':
+                if filter_value in locale.locale_alias:
+                    search.search_language = filter_value
+                continue
+
+            if is_range and filter_match.group(2) in ('<', '<=', '>', '>='):
+                filter_query.filter.append(
+                    Q('range', **{filter_field: {
+                        ('lte' if filter_match.group(2).startswith('<') else 'gte'): filter_value}
+                    }))
+            else:
+                query_type = 'match_phrase' if ' ' in filter_value else 'match'
+                filter_query.filter.append(Q(query_type, **{
+                    filter_field.i18n(search.search_language): filter_value.strip('"')}))
+
+        query_string_orig = query.strip()
+
+    return query.strip(), filter_query
+
+
+class _FuzzSearch(SimpleSearch):
+    """Simple search with an additional numeric range filter."""
+    QUERY_FILTERS = dict(SimpleSearch.QUERY_FILTERS, **{'year<>': FieldName('year', False)})
+
+
+# Intentional differences to the legacy parser: filters after AND are extracted instead of being glued to a
+# literal "+", trailing AND operators are dropped, empty filter values are not treated as filters, and
+# operators followed by a quote at the end of a word (27") are not mistaken for being inside a phrase.
+_KNOWN_DIVERGENCE_REGEX = re.compile(
+    r'(?:^|\s)AND\s+(?:\S*[:<>=]|$)|\s(?:AND|OR)\s[^"]*\w"(?:\s|$)|(?:^|\s)(?:' +
+    '|'.join(re.escape(k.strip('<>')) for k in _FuzzSearch.QUERY_FILTERS) +
+    r')(?:[<>]=?|[=:])\s*(?:$|\s|AND\s|OR\s)')
+
+
+class Command(BaseCommand):
+    help = 'Check the query string parser for equivalence with the previous implementation and benchmark it.'
+
+    _FUZZ_WORDS = ['hello', 'world', 'foo', 'bar', '-baz', 'qu*', 'AND', 'OR', 'and', 'ANDroid', 'site',
+                   'site:example.com', 'site:"a b"', 'site: example.org', 'lang:de', 'lang:xx', 'index:cw22',
+                   'index:cw12,cw22', 'year>2010', 'year<=2020', 'year:2015', 'year>abc', 'site:', '|', '+x',
+                   '27"', 'O"Reilly']
+
+    # Queries with quotes inside words, which must not start a phrase
+    _EDGE_CASE_QUERIES = [
+        '27" monitor site:amazon.com "best price"',
+        'O"Reilly site:x "python"',
+        'O"Reilly AND "python OR java" site:x',
+    ]
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', help='Text file with one logged query per line.')
+        parser.add_argument(
+            '--fuzz',
+            type=int,
+            default=10000,
+            help='Number of random queries to compare (default: 10000).',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed for fuzzing (default: 42).',
+        )
+        parser.add_argument(
+            '--long-query-words',
+            type=int,
+            default=5000,
+            help='Number of words in the long pasted query benchmark (default: 5000).',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Number of benchmark runs (default: 5).',
+        )
+        parser.add_argument(
+            '--show',
+            type=int,
+            default=10,
+            help='Number of mismatching queries to show (default: 10).',
+        )
+
+    def _fuzz_query(self, rnd):
+        words = []
+        for _ in range(rnd.randint(0, 12)):
+            if rnd.random() < 0.1:
+                words.append('"' + ' '.join(rnd.choice(['a', 'b', 'AND', 'OR']) for _ in range(rnd.randint(1, 3))) + '"')
+            else:
+                words.append(rnd.choice(self._FUZZ_WORDS))
+        return ''.join(w + rnd.choice([' ', ' ', ' ', '  ']) for w in words)
+
+    @staticmethod
+    def _parse_result(parse_fn, query):
+        search = _FuzzSearch()
+        query_string, filter_query = parse_fn(search, query)
+        filters = sorted(repr(f.to_dict()) for f in filter_query.filter)
+        return ' '.join(query_string.split()), filters, search.search_language, search._indices_unvalidated
+
+    @staticmethod
+    def _time(fn, repeat):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+        return min(times) * 1000
+
+    def handle(self, *args, **options):
+        queries = []
+        if options['queries']:
+            with open(options['queries'], 'r') as f:
+                queries.extend(q.rstrip('\n') for q in f if q.strip())
+        queries.extend(self._EDGE_CASE_QUERIES)
+        rnd = random.Random(options['seed'])
+        queries.extend(self._fuzz_query(rnd) for _ in range(options['fuzz']))
+
+        new_parse = _FuzzSearch._parse_query_string_operators
+        mismatches = 0
+        known_divergences = 0
+        for query in queries:
+            legacy = self._parse_result(_legacy_parse_query_string_operators, query)
+            new = self._parse_result(new_parse, query)
+            if legacy == new:
+                continue
+            if _KNOWN_DIVERGENCE_REGEX.search(query):
+                known_divergences += 1
+                continue
+            mismatches += 1
+            if mismatches <= options['show']:
+                self.stderr.write(f'Mismatch for query: {query!r}\n  legacy: {legacy}\n  new:    {new}')
+
+        self.stdout.write(f'Queries compared:        {len(queries)}')
+        self.stdout.write(f'Known divergences:       {known_divergences}')
+        self.stdout.write(f'Unexpected mismatches:   {mismatches}')
+
+        words = [rnd.choice(self._FUZZ_WORDS[:6]) for _ in range(options['long_query_words'])]
+        words[len(words) // 2] = 'site:example.com'
+        long_query = ' '.join(words)
+        search = _FuzzSearch()
+        legacy_time = self._time(lambda: _legacy_parse_query_string_operators(search, long_query), options['repeat'])
+        new_time = self._time(lambda: search._parse_query_string_operators(long_query), options['repeat'])
+
+        short_times = {}
+        for name, fn in (('legacy', _legacy_parse_query_string_operators), ('new', new_parse)):
+            short_times[name] = statistics.median(
+                self._time(lambda: fn(search, q), options['repeat']) * 1000 for q in queries[:1000])
+
+        self.stdout.write(f'Short queries (median):  legacy {short_times["legacy"]:.1f} µs, '
+                          f'new {short_times["new"]:.1f} µs')
+        self.stdout.write(f'Long query ({len(words)} words): legacy {legacy_time:.2f} ms, new {new_time:.2f} ms')
@@ -0,0 +1,73 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chatnoir_search.search import SimpleSearch
+
+
+class Command(BaseCommand):
+    help = 'Compare search latencies with capped and exact total hit counting.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('queries', help='Text file with one query per line.')
+        parser.add_argument(
+            '--index',
+            action='append',
+            help='Index shorthand to search (can be given multiple times, default: default indices).',
+        )
+        parser.add_argument(
+            '--search-method',
+            default='default',
+            choices=SimpleSearch.SEARCH_METHODS,
+            help='Search method (default: default).',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Number of times to run each query per mode (default: 3).',
+        )
+
+    def _run(self, query, options, exact_total):
+        search = SimpleSearch(options['index'], search_method=options['search_method'])
+        search.exact_total = exact_total
+        request = search.build_search_request(query)
+
+        best_took = best_wall = None
+        response = None
+        for _ in range(options['repeat']):
+            # Bypass the search result cache
+            start = time.perf_counter()
+            response = request.execute(ignore_cache=True)
+            wall = time.perf_counter() - start
+            best_took = response.took if best_took is None else min(best_took, response.took)
+            best_wall = wall if best_wall is None else min(best_wall, wall)
+        return best_took, best_wall * 1000, response.hits.total
+
+    def handle(self, *args, **options):
+        with open(options['queries'], 'r') as f:
+            queries = [q.strip() for q in f if q.strip()]
+        if not queries:
+            raise CommandError(f'No queries found in {options["queries"]}')
+
+        results = {False: [], True: []}
+        lower_bounds = 0
+        for query in queries:
+            for exact_total in (False, True):
+                took, wall, total = self._run(query, options, exact_total)
+                results[exact_total].append((took, wall))
+                if not exact_total and total.relation == 'gte':
+                    lower_bounds += 1
+            self.stdout.write(f'{query[:40]:<40}  capped: {results[False][-1][0]:>6} ms'
+                              f'  exact: {results[True][-1][0]:>6} ms')
+
+        self.stdout.write('')
+        self.stdout.write(f'Queries:             {len(queries)} (best of {options["repeat"]} runs each)')
+        self.stdout.write(f'Capped totals:       {lower_bounds}')
+        for exact_total, label in ((False, 'capped'), (True, 'exact')):
+            took = [r[0] for r in results[exact_total]]
+            wall = [r[1] for r in results[exact_total]]
+            self.stdout.write(f'Median ({label + "):":<8}    {statistics.median(took):.1f} ms took, '
+                              f'{statistics.median(wall):.1f} ms wall')
+            self.stdout.write(f'Max ({label + "):":<8}       {max(took)} ms took, {max(wall):.1f} ms wall')
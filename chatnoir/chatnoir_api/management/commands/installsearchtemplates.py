@@ -0,0 +1,89 @@
+import importlib
+import itertools
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from elasticsearch_dsl import connections
+
+
+class Command(BaseCommand):
+    help = 'Install or upgrade stored Elasticsearch search templates for the configured search indices.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--language',
+            action='append',
+            help='Search language to install templates for (can be given multiple times, default: en).',
+        )
+        parser.add_argument(
+            '--search-module',
+            default='chatnoir_search.search',
+            help='Module with the SimpleSearch and PhraseSearch classes (default: chatnoir_search.search).',
+        )
+        parser.add_argument(
+            '--prune',
+            action='store_true',
+            help='Delete stored ChatNoir search templates that are not current anymore.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only print the template IDs that would be installed or deleted.',
+        )
+
+    def _collect_templates(self, search_cls, languages):
+        """Build templates for each search method, language, and index selection (single indices and defaults)."""
+        compat_indices = {k: v for k, v in settings.SEARCH_INDICES.items()
+                          if search_cls.SEARCH_VERSION in v['compat_search_versions']}
+        selections = [[k] for k in compat_indices] + [None]
+
+        # Phrase searches need one template per slop value
+        slops = range(search_cls.MAX_SLOP + 1) if hasattr(search_cls, 'MAX_SLOP') else [None]
+
+        templates = {}
+        for search_method in search_cls.SEARCH_METHODS:
+            for lang in languages:
+                for indices, slop in itertools.product(selections, slops):
+                    search = search_cls(indices)
+                    search._allowed_indices = compat_indices
+                    search._restricted_indices = {}
+                    search.search_language = lang
+                    if slop is not None:
+                        search.slop = slop
+                    compile_fn = getattr(search, f'_compile_{search_method}_search_request')
+                    for has_query in (True, False):
+                        template = search._get_search_template(search_method, compile_fn, has_query)
+                        if template.stored_template_id is None:
+                            self.stderr.write(f'Cannot store template {template.name}, skipping.')
+                            continue
+                        templates[template.stored_template_id] = template.stored_template_source
+        return templates
+
+    def handle(self, *args, **options):
+        try:
+            search_module = importlib.import_module(options['search_module'])
+        except ImportError as e:
+            raise CommandError(f'Cannot import search module: {e}')
+
+        languages = options['language'] or ['en']
+        templates = {}
+        for search_cls in (search_module.SimpleSearch, search_module.PhraseSearch):
+            templates.update(self._collect_templates(search_cls, languages))
+
+        es = connections.get_connection()
+        for template_id, source in sorted(templates.items()):
+            self.stdout.write(f'Installing {template_id}')
+            if not options['dry_run']:
+                es.put_script(id=template_id, body={'script': {'lang': 'mustache', 'source': source}})
+
+        if options['prune']:
+            state = es.cluster.state(metric='metadata', filter_path='metadata.stored_scripts')
+            stored = state.get('metadata', {}).get('stored_scripts', {})
+            for template_id in sorted(stored):
+                if template_id.startswith('chatnoir-') and template_id not in templates:
+                    self.stdout.write(f'Deleting {template_id}')
+                    if not options['dry_run']:
+                        es.delete_script(id=template_id)
+
+        if not settings.SEARCH_STORED_TEMPLATES:
+            self.stdout.write(self.style.WARNING('Stored templates are disabled (settings.SEARCH_STORED_TEMPLATES).'))
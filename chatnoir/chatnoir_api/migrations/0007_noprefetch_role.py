@@ -0,0 +1,27 @@
+from django.db import migrations, transaction
+from django.utils.translation import gettext as _
+
+
+def create_noprefetch_role(apps, schema_editor):
+    with transaction.atomic():
+        ApiKeyRole = apps.get_model('chatnoir_api', 'ApiKeyRole')
+        ApiKeyRole.objects.get_or_create(
+            role='noprefetch',
+            defaults={'description': _('Key without next-page prefetching')},
+        )
+
+
+def remove_noprefetch_role(apps, schema_editor):
+    with transaction.atomic():
+        ApiKeyRole = apps.get_model('chatnoir_api', 'ApiKeyRole')
+        ApiKeyRole.objects.filter(role='noprefetch').delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('chatnoir_api', '0006_apiconfiguration_web_frontend_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_noprefetch_role, remove_noprefetch_role),
+    ]
@@ -0,0 +1,56 @@
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+import pickle
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def convert_quota_buckets(apps, schema_editor):
+    ApiKey = apps.get_model('chatnoir_api', 'ApiKey')
+    ApiKeyQuotaUsage = apps.get_model('chatnoir_api', 'ApiKeyQuotaUsage')
+
+    month_back = datetime.now(timezone.utc).date() - timedelta(days=30)
+    usage = []
+    for api_key, quota_used in ApiKey.objects.exclude(quota_used=b'').values_list('api_key', 'quota_used'):
+        try:
+            buckets = pickle.loads(bytes(quota_used))
+        except (pickle.UnpicklingError, EOFError, TypeError, ValueError):
+            continue
+        days = defaultdict(int)
+        for ts, requests in buckets:
+            day = datetime.fromtimestamp(ts, timezone.utc).date()
+            if day > month_back and requests:
+                days[day] += requests
+        usage.extend(ApiKeyQuotaUsage(api_key_id=api_key, day=d, requests=r) for d, r in days.items())
+    ApiKeyQuotaUsage.objects.bulk_create(usage, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatnoir_api', '0007_noprefetch_role'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApiKeyQuotaUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='Day')),
+                ('requests', models.PositiveBigIntegerField(default=0, verbose_name='Requests')),
+                ('api_key', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quota_usage',
+                                              to='chatnoir_api.apikey', verbose_name='API Key')),
+            ],
+            options={
+                'verbose_name': 'Quota Usage',
+                'verbose_name_plural': 'Quota Usage',
+                'unique_together': {('api_key', 'day')},
+            },
+        ),
+        migrations.RunPython(convert_quota_buckets, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='apikey',
+            name='quota_used',
+        ),
+    ]
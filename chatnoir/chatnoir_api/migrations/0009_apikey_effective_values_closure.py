@@ -0,0 +1,106 @@
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+INHERITED_FIELDS = ('expires', 'revoked', 'limits_day', 'limits_week', 'limits_month')
+
+
+def inherit_values(parent_values, own_values):
+    # Same as ApiKey.inherit_values(), which is not available on historical models
+    if parent_values is None:
+        return tuple(own_values)
+    effective = []
+    for f, parent_val, own_val in zip(INHERITED_FIELDS, parent_values, own_values):
+        if f == 'revoked':
+            effective.append(parent_val is True or own_val is True)
+        elif parent_val is not None:
+            effective.append(min(parent_val, own_val or parent_val))
+        else:
+            effective.append(own_val)
+    return tuple(effective)
+
+
+def build_hierarchy(apps, schema_editor):
+    ApiKey = apps.get_model('chatnoir_api', 'ApiKey')
+    ApiKeyClosure = apps.get_model('chatnoir_api', 'ApiKeyClosure')
+
+    keys = {k.pk: k for k in ApiKey.objects.all()}
+    children = defaultdict(list)
+    for k in keys.values():
+        children[k.parent_id if k.parent_id in keys else None].append(k)
+
+    links = []
+    # Walk the hierarchy top-down, passing down the ancestor chain and effective values
+    stack = [(k, [], None) for k in children[None]]
+    while stack:
+        key, ancestors, parent_values = stack.pop()
+        values = inherit_values(parent_values, [getattr(key, '_' + f) for f in INHERITED_FIELDS])
+        for f, v in zip(INHERITED_FIELDS, values):
+            setattr(key, 'effective_' + f, v)
+        ancestors = ancestors + [key.pk]
+        links.extend(ApiKeyClosure(ancestor_id=a, descendant_id=key.pk, depth=len(ancestors) - i - 1)
+                     for i, a in enumerate(ancestors))
+        stack.extend((c, ancestors, values) for c in children[key.pk])
+
+    ApiKey.objects.bulk_update(keys.values(), ['effective_' + f for f in INHERITED_FIELDS], batch_size=1000)
+    ApiKeyClosure.objects.bulk_create(links, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatnoir_api', '0008_apikeyquotausage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apikey',
+            name='effective_expires',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True,
+                                       verbose_name='Effective Expiration Date'),
+        ),
+        migrations.AddField(
+            model_name='apikey',
+            name='effective_revoked',
+            field=models.BooleanField(db_index=True, default=False, editable=False,
+                                      verbose_name='Effectively Revoked'),
+        ),
+        migrations.AddField(
+            model_name='apikey',
+            name='effective_limits_day',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True,
+                                              verbose_name='Effective Request Limit Day'),
+        ),
+        migrations.AddField(
+            model_name='apikey',
+            name='effective_limits_week',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True,
+                                              verbose_name='Effective Request Limit Week'),
+        ),
+        migrations.AddField(
+            model_name='apikey',
+            name='effective_limits_month',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True,
+                                              verbose_name='Effective Request Limit Month'),
+        ),
+        migrations.CreateModel(
+            name='ApiKeyClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField(verbose_name='Depth')),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE,
+                                               related_name='descendant_links', to='chatnoir_api.apikey',
+                                               verbose_name='Ancestor')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE,
+                                                 related_name='ancestor_links', to='chatnoir_api.apikey',
+                                                 verbose_name='Descendant')),
+            ],
+            options={
+                'verbose_name': 'API Key Hierarchy',
+                'verbose_name_plural': 'API Key Hierarchy',
+                'unique_together': {('ancestor', 'descendant')},
+            },
+        ),
+        migrations.RunPython(build_hierarchy, migrations.RunPython.noop),
+    ]
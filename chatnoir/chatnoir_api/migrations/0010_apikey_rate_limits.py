@@ -0,0 +1,35 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatnoir_api', '0009_apikey_effective_values_closure'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apikey',
+            name='_limits_second',
+            field=models.PositiveIntegerField(blank=True, db_column='limits_second', null=True,
+                                              verbose_name='Request Limit Second'),
+        ),
+        migrations.AddField(
+            model_name='apikey',
+            name='_limits_concurrent',
+            field=models.PositiveIntegerField(blank=True, db_column='limits_concurrent', null=True,
+                                              verbose_name='Concurrent Search Limit'),
+        ),
+        migrations.AddField(
+            model_name='apikey',
+            name='effective_limits_second',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True,
+                                              verbose_name='Effective Request Limit Second'),
+        ),
+        migrations.AddField(
+            model_name='apikey',
+            name='effective_limits_concurrent',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True,
+                                              verbose_name='Effective Concurrent Search Limit'),
+        ),
+    ]
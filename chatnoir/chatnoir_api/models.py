@@ -19,7 +19,6 @@ import re
 import uuid
 
 from django.conf import settings
-from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.mail import EmailMultiAlternatives
 from django.db import IntegrityError, models, transaction
@@ -125,7 +124,6 @@ class ApiKey(models.Model):
     roles = models.ManyToManyField(ApiKeyRole, verbose_name=_('API Key Roles'), blank=True)
     allowed_remote_hosts = models.TextField(verbose_name=_('Allowed Remote Hosts'), null=True, blank=True)
     comments = models.TextField(verbose_name=_('Comments'), blank=True)
-    quota_used = models.BinaryField(blank=True, default=b'')
 
     # Inherited fields
     _expires = models.DateTimeField(verbose_name=_('Expiration Date'), null=True, blank=True, db_column='expires')
@@ -136,31 +134,56 @@ class ApiKey(models.Model):
                                                blank=True, db_column='limits_week')
     _limits_month = models.PositiveIntegerField(verbose_name=_('Request Limit Month'), null=True,
                                                 blank=True, db_column='limits_month')
+    _limits_second = models.PositiveIntegerField(verbose_name=_('Request Limit Second'), null=True,
+                                                 blank=True, db_column='limits_second')
+    _limits_concurrent = models.PositiveIntegerField(verbose_name=_('Concurrent Search Limit'), null=True,
+                                                     blank=True, db_column='limits_concurrent')
 
     _is_root_key = models.BooleanField(default=False, verbose_name=_('Root API Key'))
 
-    class _Inherited:
-        def __init__(self):
-            self.expires = None
-            self.revoked = None
-            self.limits_day = None
-            self.limits_week = None
-            self.limits_month = None
+    # Effective values of inherited fields, maintained on save and propagated to all sub keys
+    effective_expires = models.DateTimeField(verbose_name=_('Effective Expiration Date'), null=True, blank=True,
+                                             editable=False, db_index=True)
+    effective_revoked = models.BooleanField(verbose_name=_('Effectively Revoked'), default=False,
+                                            editable=False, db_index=True)
+    effective_limits_day = models.PositiveIntegerField(verbose_name=_('Effective Request Limit Day'), null=True,
+                                                       blank=True, editable=False)
+    effective_limits_week = models.PositiveIntegerField(verbose_name=_('Effective Request Limit Week'), null=True,
+                                                        blank=True, editable=False)
+    effective_limits_month = models.PositiveIntegerField(verbose_name=_('Effective Request Limit Month'), null=True,
+                                                         blank=True, editable=False)
+    effective_limits_second = models.PositiveIntegerField(verbose_name=_('Effective Request Limit Second'),
+                                                          null=True, blank=True, editable=False)
+    effective_limits_concurrent = models.PositiveIntegerField(verbose_name=_('Effective Concurrent Search Limit'),
+                                                              null=True, blank=True, editable=False)
+
+    INHERITED_FIELDS = ('expires', 'revoked', 'limits_day', 'limits_week', 'limits_month',
+                        'limits_second', 'limits_concurrent')
+    EFFECTIVE_FIELDS = tuple('effective_' + f for f in INHERITED_FIELDS)
 
     def __init__(self, *args, **kwargs):
-        self._inherited = self._Inherited()
+        self._role_names = None
         super().__init__(*args, **kwargs)
+        self._loaded_parent_id = None
+        self._loaded_effective = None
 
     @classmethod
     def from_db(cls, *args, **kwargs):
         instance = super().from_db(*args, **kwargs)
-        # noinspection PyProtectedMember
-        instance._resolve_inheritance()
+        instance._remember_loaded_state()
         return instance
 
     def refresh_from_db(self, *args, **kwargs):
         super().refresh_from_db(*args, **kwargs)
-        self._resolve_inheritance()
+        self._remember_loaded_state()
+
+    def _remember_loaded_state(self):
+        """Remember persisted parent and effective values to detect changes that need propagation."""
+        deferred = self.get_deferred_fields()
+        if 'parent_id' not in deferred:
+            self._loaded_parent_id = self.parent_id
+        if not deferred.intersection(self.EFFECTIVE_FIELDS):
+            self._loaded_effective = self._get_effective()
 
     def clean(self, exclude=None):
         errors = {}
@@ -180,47 +203,104 @@ class ApiKey(models.Model):
             errors['parent'] = ValidationError(_('Cannot create a key without a parent.'), 'invalid_parent')
         elif self.parent and self._is_root_key:
             errors['parent'] = ValidationError(_('The root key must not have a parent.'), 'invalid_parent')
-        if self._is_root_key and ApiKey.objects.filter(_is_root_key=True).exists():
+        if self._is_root_key and ApiKey.objects.filter(_is_root_key=True).exclude(pk=self.pk).exists():
             errors['_is_root_key'] = ValidationError(_('There can be only a single root key.'), 'duplicate_root')
+        if self.parent_id and not self._state.adding and \
+                ApiKeyClosure.objects.filter(ancestor_id=self.pk, descendant_id=self.parent_id).exists():
+            errors['parent'] = ValidationError(_('Cannot parent an API key to one of its sub keys.'), 'invalid_parent')
 
         if errors:
             raise ValidationError(errors)
 
     def save(self, *args, **kwargs):
         self.full_clean()
-        super().save(*args, **kwargs)
-        self._resolve_inheritance()
+        with transaction.atomic():
+            adding = self._state.adding
+            parent_changed = adding or self.parent_id != self._loaded_parent_id
+            self._update_effective()
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], *self.EFFECTIVE_FIELDS}
+            super().save(*args, **kwargs)
+            if parent_changed:
+                self._update_closure(adding)
+            if not adding and (parent_changed or self._get_effective() != self._loaded_effective):
+                self._update_sub_keys()
+        self._remember_loaded_state()
 
     def delete(self, using=None, keep_parents=False):
         if self._is_root_key:
             raise ValueError(_('Cannot delete root key.'))
         return super().delete(using, keep_parents)
 
-    def _resolve_inheritance(self):
-        """Resolve inherited field values and cache them."""
-        if self.pk is None:
-            raise RuntimeError('Cannot resolve inheritance on unsaved model.')
-
-        if not self.parent:
-            return
-
-        cache_key = '.'.join((__name__, self.__class__.__name__, self.pk))
-        cached = cache.get(cache_key)
-        if cached is not None:
-            self._inherited = cached
-            return
-
-        self._inherited = self._Inherited()
-        field_names = [f for f in dir(self._inherited) if not f.startswith('_')]
+    @staticmethod
+    def inherit_values(parent_values, own_values):
+        """
+        Combine a parent's effective inherited field values with a key's own values.
 
-        for f in field_names:
-            self_val = getattr(self, '_' + f)
-            parent_val = getattr(self.parent, f)
-            setattr(self._inherited, f, parent_val)
-            if self_val is not None:
-                setattr(self._inherited, f, getattr(self, f))
+        Keys cannot extend the expiration date or limits of their parent and are revoked if their parent is.
 
-        cache.set(cache_key, self._inherited)
+        :param parent_values: effective values of the parent in the order of :attr:`INHERITED_FIELDS`
+                              (``None`` for keys without parent)
+        :param own_values: the key's own values in the order of :attr:`INHERITED_FIELDS`
+        :return: tuple of effective values
+        """
+        if parent_values is None:
+            return tuple(own_values)
+        effective = []
+        for f, parent_val, own_val in zip(ApiKey.INHERITED_FIELDS, parent_values, own_values):
+            if f == 'revoked':
+                effective.append(parent_val is True or own_val is True)
+            elif parent_val is not None:
+                effective.append(min(parent_val, own_val or parent_val))
+            else:
+                effective.append(own_val)
+        return tuple(effective)
+
+    def _get_own(self):
+        return tuple(getattr(self, '_' + f) for f in self.INHERITED_FIELDS)
+
+    def _get_effective(self):
+        return tuple(getattr(self, f) for f in self.EFFECTIVE_FIELDS)
+
+    def _set_effective(self, values):
+        for f, v in zip(self.EFFECTIVE_FIELDS, values):
+            setattr(self, f, v)
+
+    def _update_effective(self):
+        """Recompute this key's effective values from its own values and its parent's effective values."""
+        parent_values = self.parent._get_effective() if self.parent_id else None
+        self._set_effective(self.inherit_values(parent_values, self._get_own()))
+
+    def _update_closure(self, adding):
+        """Link this key and, if it was moved, all its sub keys to the ancestors of its parent."""
+        subtree = []
+        if not adding:
+            subtree = list(ApiKeyClosure.objects.filter(ancestor_id=self.pk).values_list('descendant_id', 'depth'))
+            subtree_ids = [d for d, _ in subtree]
+            ApiKeyClosure.objects.filter(descendant_id__in=subtree_ids).exclude(ancestor_id__in=subtree_ids).delete()
+
+        links = []
+        if not subtree:
+            subtree = [(self.pk, 0)]
+            links.append(ApiKeyClosure(ancestor_id=self.pk, descendant_id=self.pk, depth=0))
+        if self.parent_id:
+            ancestors = ApiKeyClosure.objects.filter(descendant_id=self.parent_id).values_list('ancestor_id', 'depth')
+            links.extend(ApiKeyClosure(ancestor_id=a, descendant_id=d, depth=a_depth + d_depth + 1)
+                         for a, a_depth in ancestors for d, d_depth in subtree)
+        ApiKeyClosure.objects.bulk_create(links)
+
+    def _update_sub_keys(self):
+        """Propagate this key's effective values down to all its sub keys."""
+        effective = {self.pk: self._get_effective()}
+        changed = []
+        sub_keys = ApiKey.objects.filter(ancestor_links__ancestor_id=self.pk, ancestor_links__depth__gt=0)
+        for key in sub_keys.order_by('ancestor_links__depth'):
+            values = self.inherit_values(effective.get(key.parent_id), key._get_own())
+            effective[key.pk] = values
+            if values != key._get_effective():
+                key._set_effective(values)
+                changed.append(key)
+        ApiKey.objects.bulk_update(changed, self.EFFECTIVE_FIELDS, batch_size=1000)
 
     def is_sub_key_of(self, key, strict=True):
         """
@@ -236,79 +316,84 @@ class ApiKey(models.Model):
         if self.pk == key:
             return not strict
 
-        parent = self.parent
-        while self.parent:
-            if parent.api_key == key:
-                return True
-            parent = parent.parent
-        return False
+        return ApiKeyClosure.objects.filter(ancestor_id=key, descendant_id=self.pk).exists()
+
+    def _set_own(self, field, value):
+        """Set an inherited field's own value and update its effective value."""
+        setattr(self, '_' + field, value)
+        self._update_effective()
 
     @property
     def expires(self):
-        if self._inherited.expires is not None:
-            return min(self._inherited.expires, self._expires or self._inherited.expires)
-        return self._expires
+        return self.effective_expires
 
     @expires.setter
     def expires(self, expires):
-        self._inherited.expires = expires
-        self._expires = expires
+        self._set_own('expires', expires)
 
     expires.fget.short_description = _expires.verbose_name
 
     @property
     def revoked(self):
-        if self._inherited.revoked is not None:
-            return (self._inherited.revoked is True) or (self._revoked is True)
-        return self._revoked
+        return self.effective_revoked
 
     @revoked.setter
     def revoked(self, revoked):
-        self._inherited.revoked = revoked
-        self._revoked = revoked
+        self._set_own('revoked', revoked)
 
     revoked.fget.boolean = True
     revoked.fget.short_description = _revoked.verbose_name
 
     @property
     def limits_day(self):
-        if self._inherited.limits_day is not None:
-            return min(self._inherited.limits_day, self._limits_day or self._inherited.limits_day)
-        return self._limits_day
+        return self.effective_limits_day
 
     @limits_day.setter
     def limits_day(self, limits_day):
-        self._inherited.limits_day = limits_day
-        self._limits_day = limits_day
+        self._set_own('limits_day', limits_day)
 
     limits_day.fget.short_description = _limits_day.verbose_name
 
     @property
     def limits_week(self):
-        if self._inherited.limits_week is not None:
-            return min(self._inherited.limits_week, self._limits_week or self._inherited.limits_week)
-        return self._limits_week
+        return self.effective_limits_week
 
     @limits_week.setter
     def limits_week(self, limits_week):
-        self._inherited.limits_week = limits_week
-        self._limits_week = limits_week
+        self._set_own('limits_week', limits_week)
 
     limits_week.fget.short_description = _limits_week.verbose_name
 
     @property
     def limits_month(self):
-        if self._inherited.limits_month is not None:
-            return min(self._inherited.limits_month, self._limits_month or self._inherited.limits_month)
-        return self._limits_month
+        return self.effective_limits_month
 
     @limits_month.setter
     def limits_month(self, limits_month):
-        self._inherited.limits_month = limits_month
-        self._limits_month = limits_month
+        self._set_own('limits_month', limits_month)
 
     limits_month.fget.short_description = _limits_month.verbose_name
 
+    @property
+    def limits_second(self):
+        return self.effective_limits_second
+
+    @limits_second.setter
+    def limits_second(self, limits_second):
+        self._set_own('limits_second', limits_second)
+
+    limits_second.fget.short_description = _limits_second.verbose_name
+
+    @property
+    def limits_concurrent(self):
+        return self.effective_limits_concurrent
+
+    @limits_concurrent.setter
+    def limits_concurrent(self, limits_concurrent):
+        self._set_own('limits_concurrent', limits_concurrent)
+
+    limits_concurrent.fget.short_description = _limits_concurrent.verbose_name
+
     @property
     def limits(self):
         """API key request limits as (day, week, month) tuple."""
@@ -337,21 +422,22 @@ class ApiKey(models.Model):
             return []
         return re.split(r'[\s;,]+', self.allowed_remote_hosts.strip())
 
+    @property
+    def role_names(self):
+        """Names of the key's roles as a set (loaded once per instance)."""
+        if self._role_names is None:
+            self._role_names = frozenset(r.role for r in self.roles.all())
+        return self._role_names
+
     @property
     def is_admin_key(self):
         """Whether key has admin privileges."""
-        for r in self.roles.values('role'):
-            if r['role'] == settings.API_ADMIN_ROLE:
-                return True
-        return False
+        return settings.API_ADMIN_ROLE in self.role_names
 
     @property
     def can_issue_keys(self):
         """Whether key is allowed to issue other API keys."""
-        for r in self.roles.values('role'):
-            if r['role'] in (settings.API_ADMIN_ROLE, settings.API_KEYCREATE_ROLE):
-                return True
-        return False
+        return settings.API_ADMIN_ROLE in self.role_names or settings.API_KEYCREATE_ROLE in self.role_names
 
     def __str__(self):
         if self.comments:
@@ -380,6 +466,43 @@ class ApiKey(models.Model):
     is_legacy_key.fget.short_description = _('Legacy Key')
 
 
+class ApiKeyClosure(models.Model):
+    """
+    Closure table of the API key hierarchy with one row per key and ancestor (including the key itself).
+    """
+    class Meta:
+        unique_together = ('ancestor', 'descendant')
+        verbose_name = _('API Key Hierarchy')
+        verbose_name_plural = _('API Key Hierarchy')
+
+    ancestor = models.ForeignKey(ApiKey, verbose_name=_('Ancestor'), related_name='descendant_links',
+                                 on_delete=models.CASCADE)
+    descendant = models.ForeignKey(ApiKey, verbose_name=_('Descendant'), related_name='ancestor_links',
+                                   on_delete=models.CASCADE)
+    depth = models.PositiveIntegerField(verbose_name=_('Depth'))
+
+    def __str__(self):
+        return f'{self.ancestor_id} -> {self.descendant_id} ({self.depth})'
+
+
+class ApiKeyQuotaUsage(models.Model):
+    """
+    Number of requests charged to an API key per day (see :mod:`chatnoir_api.quota`).
+    """
+    class Meta:
+        unique_together = ('api_key', 'day')
+        verbose_name = _('Quota Usage')
+        verbose_name_plural = _('Quota Usage')
+
+    api_key = models.ForeignKey(ApiKey, verbose_name=_('API Key'), related_name='quota_usage',
+                                on_delete=models.CASCADE)
+    day = models.DateField(verbose_name=_('Day'))
+    requests = models.PositiveBigIntegerField(verbose_name=_('Requests'), default=0)
+
+    def __str__(self):
+        return f'{self.day}: {self.requests} (Key ID: {self.api_key.key_id})'
+
+
 class ApiKeyPasscode(models.Model):
     """
     API key issue pass codes.
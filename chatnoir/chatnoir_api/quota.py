@@ -0,0 +1,204 @@
+# Copyright 2026 Janek Bevendorff
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import atexit
+from datetime import timedelta
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from .models import ApiKeyQuotaUsage
+
+logger = logging.getLogger(__name__)
+
+
+class _KeyUsage:
+    """Persisted request counts of an API key as of the last reload."""
+
+    __slots__ = ('day', 'today', 'week_before', 'month_before', 'last_used')
+
+    def __init__(self, day, today, week_before, month_before):
+        self.day = day
+        self.today = today
+        self.week_before = week_before
+        self.month_before = month_before
+        self.last_used = time.monotonic()
+
+
+class QuotaCounters:
+    """
+    Process-local, write-behind request counters of API keys.
+
+    Requests are counted per key and day in :class:`~chatnoir_api.models.ApiKeyQuotaUsage`. Charged requests
+    are only added up in memory and written in batches with atomic ``F()`` updates at most every
+    ``settings.API_QUOTA_FLUSH_INTERVAL`` seconds. Week and month usage is answered from the sums of the
+    previous 6 and 29 days, which are loaded once per key and day.
+
+    Requests charged by other processes become visible after they were flushed and this process
+    reloaded the key's counts (on every flush), so quotas may be exceeded by the number of requests
+    a key sends to all processes within one flush interval.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._usage = {}
+        self._pending = {}
+        self._flushing = {}
+        self._next_flush = 0.0
+
+    @staticmethod
+    def _today():
+        return timezone.now().date()
+
+    @staticmethod
+    def _load(api_key_pk, day):
+        """Load the persisted usage of an API key from the database."""
+        usage = ApiKeyQuotaUsage.objects.filter(api_key_id=api_key_pk, day__gt=day - timedelta(days=30)).aggregate(
+            today=Sum('requests', filter=Q(day=day)),
+            week_before=Sum('requests', filter=Q(day__gt=day - timedelta(days=7), day__lt=day)),
+            month_before=Sum('requests', filter=Q(day__lt=day)))
+        return _KeyUsage(day, usage['today'] or 0, usage['week_before'] or 0, usage['month_before'] or 0)
+
+    def _get_usage(self, api_key_pk, day):
+        with self._lock:
+            usage = self._usage.get(api_key_pk)
+            if usage is not None and usage.day == day:
+                usage.last_used = time.monotonic()
+                return usage
+
+        usage = self._load(api_key_pk, day)
+        with self._lock:
+            self._usage[api_key_pk] = usage
+        return usage
+
+    def _used(self, api_key_pk, usage):
+        """Used (day, week, month) quota including requests not written yet. Call while holding the lock."""
+        key = (api_key_pk, usage.day)
+        today = usage.today + self._pending.get(key, 0) + self._flushing.get(key, 0)
+        return today, usage.week_before + today, usage.month_before + today
+
+    def usage(self, api_key):
+        """
+        Get the request quota usage of an API key.
+
+        :param api_key: API key
+        :return: tuple of requests on the current day and within the last 7 and 30 days
+        """
+        usage = self._get_usage(api_key.pk, self._today())
+        with self._lock:
+            return self._used(api_key.pk, usage)
+
+    def charge(self, api_key, num_requests, limits):
+        """
+        Charge requests to an API key if they do not exceed its limits.
+
+        :param api_key: API key
+        :param num_requests: number of requests to charge (0 to only check the limits)
+        :param limits: tuple of day, week, and month limits (``None`` for unlimited)
+        :return: ``True`` if the requests were charged, ``False`` if they would exceed the limits
+        """
+        usage = self._get_usage(api_key.pk, self._today())
+        with self._lock:
+            used = self._used(api_key.pk, usage)
+            exceeded = any(l is not None and l < u + max(1, num_requests) for u, l in zip(used, limits))
+            if num_requests and not exceeded:
+                key = (api_key.pk, usage.day)
+                self._pending[key] = self._pending.get(key, 0) + num_requests
+            flush_due = time.monotonic() >= self._next_flush
+
+        if flush_due:
+            self.flush()
+        return not exceeded
+
+    @staticmethod
+    def _persist(api_key_pk, day, num_requests):
+        """Add requests to the persisted counter of a key and day."""
+        counter = ApiKeyQuotaUsage.objects.filter(api_key_id=api_key_pk, day=day)
+        if counter.update(requests=F('requests') + num_requests):
+            return
+        try:
+            with transaction.atomic():
+                ApiKeyQuotaUsage.objects.create(api_key_id=api_key_pk, day=day, requests=num_requests)
+        except IntegrityError:
+            # Created concurrently (or key deleted)
+            counter.update(requests=F('requests') + num_requests)
+
+    def flush(self):
+        """
+        Write pending request counts to the database and reload the counts of recently used keys.
+
+        Does nothing if another thread is already flushing.
+        """
+        if not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            with self._lock:
+                self._flushing, self._pending = self._pending, {}
+                self._next_flush = time.monotonic() + settings.API_QUOTA_FLUSH_INTERVAL
+
+            failed = {}
+            for (api_key_pk, day), num_requests in self._flushing.items():
+                try:
+                    self._persist(api_key_pk, day, num_requests)
+                except DatabaseError:
+                    logger.exception('Failed to write API quota usage.')
+                    failed[(api_key_pk, day)] = num_requests
+
+            today = self._today()
+            expire_before = time.monotonic() - settings.API_QUOTA_IDLE_TIMEOUT
+            with self._lock:
+                for k, n in failed.items():
+                    self._pending[k] = self._pending.get(k, 0) + n
+                    del self._flushing[k]
+                self._usage = {k: u for k, u in self._usage.items()
+                               if u.day == today and u.last_used >= expire_before}
+                reload_keys = list(self._usage)
+
+            try:
+                persisted = dict(ApiKeyQuotaUsage.objects.filter(
+                    api_key_id__in=reload_keys, day=today).values_list('api_key_id', 'requests'))
+            except DatabaseError:
+                logger.exception('Failed to reload API quota usage.')
+                persisted = None
+
+            with self._lock:
+                if persisted is not None:
+                    for k in reload_keys:
+                        if k in self._usage:
+                            self._usage[k].today = persisted.get(k, 0)
+                else:
+                    # Keep counting from the previous counts plus what was just written
+                    for (k, day), n in self._flushing.items():
+                        if k in self._usage and self._usage[k].day == day:
+                            self._usage[k].today += n
+                self._flushing = {}
+        finally:
+            self._flush_lock.release()
+
+
+quota_counters = QuotaCounters()
+
+
+@atexit.register
+def _flush_quota_counters():
+    try:
+        quota_counters.flush()
+    except Exception:
+        logger.exception('Failed to write API quota usage on exit.')
@@ -0,0 +1,178 @@
+# Copyright 2026 Janek Bevendorff
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Per-second request rate and concurrent search limits of API keys, shared by all processes.
+
+    State is kept in the Django cache ``settings.API_RATE_LIMIT_CACHE`` and only changed with atomic
+    increments and decrements, so only cache backends that are shared between processes and implement
+    those atomically are accepted (see :attr:`ATOMIC_BACKENDS`). The limits are not enforced if no cache
+    is configured.
+
+    Request rates are counted in one-second windows. A request is admitted if the requests of the current window
+    plus the share of the previous window's requests that still overlaps the last second stay within the limit,
+    which approximates a sliding window and prevents bursts of twice the limit at window boundaries.
+
+    Concurrent searches are counted in epochs of ``settings.API_RATE_LIMIT_SLOT_TIMEOUT`` seconds. Slots are
+    released in the epoch they were acquired in and only the current and previous epoch count towards the limit,
+    so slots that are never released (e.g., by crashed processes) expire after at most two epochs.
+    """
+
+    KEY_PREFIX = 'chatnoir_api.rate_limit'
+
+    """
+    Shared cache backends with atomic increments and decrements that keep the timeout of the counter.
+    The local-memory cache is not accepted, since each process would enforce the limits on its own.
+    """
+    ATOMIC_BACKENDS = frozenset((
+        'django.core.cache.backends.memcached.PyLibMCCache',
+        'django.core.cache.backends.memcached.PyMemcacheCache',
+        'django.core.cache.backends.redis.RedisCache',
+        'django_redis.cache.RedisCache',
+    ))
+
+    def __init__(self):
+        self._checked_alias = None
+        self._warned_disabled = False
+
+    def check_cache(self):
+        """
+        Get the configured cache.
+
+        :return: cache or ``None`` if rate limiting is disabled
+        :raises ImproperlyConfigured: if the cache backend is not shared or does not support atomic increments
+        """
+        alias = settings.API_RATE_LIMIT_CACHE
+        if alias is None:
+            return None
+
+        cache = caches[alias]
+        if alias != self._checked_alias:
+            backend = f'{type(cache).__module__}.{type(cache).__qualname__}'
+            if backend not in self.ATOMIC_BACKENDS:
+                raise ImproperlyConfigured(f'Cache backend {backend} of settings.API_RATE_LIMIT_CACHE is not '
+                                           f'shared between processes or does not support atomic increments.')
+            self._checked_alias = alias
+        return cache
+
+    @property
+    def _cache(self):
+        cache = self.check_cache()
+        if cache is None and not self._warned_disabled:
+            logger.warning('API key rate limits are configured, but not enforced '
+                           'without a cache (settings.API_RATE_LIMIT_CACHE).')
+            self._warned_disabled = True
+        return cache
+
+    @staticmethod
+    def _incr(cache, key, delta, timeout):
+        """Atomically increment a counter, creating it if it does not exist."""
+        try:
+            return cache.incr(key, delta)
+        except ValueError:
+            if cache.add(key, delta, timeout=timeout):
+                return delta
+            return cache.incr(key, delta)
+
+    @staticmethod
+    def _decr(cache, key, delta):
+        try:
+            cache.decr(key, delta)
+        except ValueError:
+            # Counter expired
+            pass
+
+    def acquire_rate(self, api_key, num_requests, limit):
+        """
+        Count requests against a key's per-second rate limit.
+
+        Requests exceeding the limit are not counted. Batches of more requests than the limit are admitted
+        as if they were only as many as the limit, so they can pass once no other requests are counted.
+
+        :param api_key: API key
+        :param num_requests: number of requests
+        :param limit: maximum requests per second (``None`` for unlimited)
+        :return: 0 if the requests were admitted, otherwise seconds until the client should retry
+        """
+        if limit is None:
+            return 0
+        cache = self._cache
+        if cache is None:
+            return 0
+        num_requests = min(max(1, num_requests), limit)
+
+        now = time.time()
+        window = int(now)
+        key = f'{self.KEY_PREFIX}.{api_key.pk}.{window}'
+        count = self._incr(cache, key, num_requests, timeout=3)
+        previous = cache.get(f'{self.KEY_PREFIX}.{api_key.pk}.{window - 1}', 0)
+        if count + previous * (1.0 - (now - window)) <= limit:
+            return 0
+
+        self._decr(cache, key, num_requests)
+        return window + 1 - now
+
+    def acquire_slot(self, api_key, limit):
+        """
+        Acquire one of a key's concurrent search slots.
+
+        :param api_key: API key
+        :param limit: maximum concurrent searches (``None`` for unlimited)
+        :return: tuple of whether a slot was acquired (always ``True`` if unlimited) and the slot
+                 to pass to :meth:`release_slot` (``None`` if nothing needs to be released)
+        """
+        if limit is None:
+            return True, None
+        cache = self._cache
+        if cache is None:
+            return True, None
+
+        epoch_length = settings.API_RATE_LIMIT_SLOT_TIMEOUT
+        epoch = int(time.time() / epoch_length)
+        slot = f'{self.KEY_PREFIX}.{api_key.pk}.slots.{epoch}'
+        count = self._incr(cache, slot, 1, timeout=2 * epoch_length)
+        # Counters must outlive both epochs they count in, even if the backend reset their timeout
+        cache.touch(slot, 2 * epoch_length)
+        count += cache.get(f'{self.KEY_PREFIX}.{api_key.pk}.slots.{epoch - 1}', 0)
+        if count <= limit:
+            return True, slot
+
+        self._decr(cache, slot, 1)
+        return False, None
+
+    def release_slot(self, slot):
+        """
+        Release a concurrent search slot acquired with :meth:`acquire_slot`.
+
+        :param slot: acquired slot (ignored if ``None``)
+        """
+        if slot is None:
+            return
+        cache = self._cache
+        if cache is not None:
+            self._decr(cache, slot, 1)
+
+
+rate_limiter = RateLimiter()
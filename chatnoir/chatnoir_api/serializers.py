@@ -120,6 +120,12 @@ class SimpleSearchRequestSerializer(AuthenticatedApiSerializer):
         default=False,
         help_text=_('Return additional scoring information')
     )
+    exact_total = ImplicitBooleanField(
+        required=False,
+        default=False,
+        help_text=_('Count all results exactly instead of up to %(limit)s (slower)') % {
+            'limit': settings.SEARCH_TRACK_TOTAL_HITS}
+    )
     _extended_meta = ImplicitBooleanField(
         required=False,
         default=False,
@@ -138,6 +144,51 @@ class PhraseSearchRequestSerializer(SimpleSearchRequestSerializer):
     )
 
 
+class SearchExportSerializer(ApiSerializer):
+    export_format = serializers.ChoiceField(
+        ('ndjson', 'trec'),
+        required=False,
+        default='ndjson',
+        initial='ndjson',
+        help_text=_('Export format (NDJSON or TREC run file)')
+    )
+    cursor = serializers.CharField(
+        required=False,
+        help_text=_('Resume cursor returned by a previous export of the same query')
+    )
+    topic = serializers.RegexField(
+        r'^\S+$',
+        required=False,
+        default='1',
+        initial='1',
+        help_text=_('Topic ID for TREC run files')
+    )
+    run_tag = serializers.RegexField(
+        r'^\S+$',
+        required=False,
+        default=settings.APPLICATION_NAME.replace(' ', '_'),
+        help_text=_('Run tag for TREC run files')
+    )
+
+
+class SimpleSearchExportRequestSerializer(SearchExportSerializer, SimpleSearchRequestSerializer):
+    pass
+
+
+class PhraseSearchExportRequestSerializer(SearchExportSerializer, PhraseSearchRequestSerializer):
+    pass
+
+
+class MultiSearchRequestSerializer(AuthenticatedApiSerializer):
+    queries = serializers.ListField(
+        child=serializers.DictField(),
+        min_length=1,
+        max_length=settings.API_MSEARCH_MAX_QUERIES,
+        initial=[{'query': 'hello world'}, {'query': 'hello world', 'type': 'phrases', 'slop': 1}],
+        help_text=_('List of search requests (type "search" or "phrases" with the respective request parameters)')
+    )
+
+
 class ResultMetaSerializer(ApiSerializer):
     query_time = serializers.IntegerField(
         help_text=_('Query time in milliseconds')
@@ -145,6 +196,10 @@ class ResultMetaSerializer(ApiSerializer):
     total_results = serializers.IntegerField(
         help_text=_('Total number of results')
     )
+    total_results_relation = serializers.ChoiceField(
+        ('eq', 'gte'),
+        help_text=_('Whether the total number of results is exact ("eq") or a lower bound ("gte")')
+    )
     indices = serializers.ListField(
         child=serializers.CharField(),
         help_text=_('List of indices that were searched')
@@ -221,6 +276,8 @@ class ApiLimitsSerializer(ApiSerializer):
     day = serializers.IntegerField(allow_null=True, required=False, min_value=1)
     week = serializers.IntegerField(allow_null=True, required=False, min_value=1)
     month = serializers.IntegerField(allow_null=True, required=False, min_value=1)
+    second = serializers.IntegerField(allow_null=True, required=False, min_value=1)
+    concurrent = serializers.IntegerField(allow_null=True, required=False, min_value=1)
 
 
 class ApiKeySerializer(ApiSerializer):
@@ -260,6 +317,8 @@ class ApiKeySerializer(ApiSerializer):
             _limits_day=limits.get('day'),
             _limits_week=limits.get('week'),
             _limits_month=limits.get('month'),
+            _limits_second=limits.get('second'),
+            _limits_concurrent=limits.get('concurrent'),
             _revoked=False,
             _expires=self.validated_data.get('expires'),
             allowed_remote_hosts=','.join(self.validated_data.get('remote_hosts', '')),
@@ -24,6 +24,9 @@ router_v1 = routers.DefaultRouter(trailing_slash=False)
 router_v1.APIRootView = views.APIRoot
 router_v1.register(r'_search', views.SimpleSearchViewSet, basename='v1-search')
 router_v1.register(r'_phrases', views.PhraseSearchViewSet, basename='v1-phrases')
+router_v1.register(r'_search/export', views.SimpleSearchExportViewSet, basename='v1-search-export')
+router_v1.register(r'_phrases/export', views.PhraseSearchExportViewSet, basename='v1-phrases-export')
+router_v1.register(r'_msearch', views.MultiSearchViewSet, basename='v1-msearch')
 router_v1.register(r'_manage_keys', views.ManageKeysInfoViewSet, basename='v1-manage-keys')
 router_v1.register(r'_manage_keys/token', views.CreateApiKeyTokenViewSet, basename='v1-create-apikey-token')
 router_v1.register(r'_manage_keys/create', views.ManageKeysCreateViewSet, basename='v1-manage-keys-create')
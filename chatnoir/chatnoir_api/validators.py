@@ -63,12 +63,12 @@ def validate_api_key(data, no_parent_ok=False):
         raise ValidationError({'parent': _('API key cannot be its own parent.')})
 
     limits = data.get('limits', {})
-    parent_limits = parent.limits
-    for i, lim in enumerate(('day', 'week', 'month')):
-        if limits.get(lim) is None or parent_limits[i] is None:
+    for lim in ('day', 'week', 'month', 'second', 'concurrent'):
+        parent_limit = getattr(parent, 'limits_' + lim)
+        if limits.get(lim) is None or parent_limit is None:
             # All good if no explicit limit set or parent is unlimited
             continue
-        elif parent_limits[i] is not None and limits.get(lim) is not None and limits[lim] > parent_limits[i]:
+        elif limits[lim] > parent_limit:
             # If parent is not unlimited, key limits must be within bounds
             raise ValidationError({
                 'limits': {lim: _('Request limit for "%s" cannot exceed parent request limit.') % lim}
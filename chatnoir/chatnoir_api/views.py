@@ -13,8 +13,10 @@
 # limitations under the License.
 
 import json
+from functools import partial
 from hashlib import sha256
 
+from django.http import StreamingHttpResponse
 from django.utils.translation import gettext_lazy as _
 import elasticsearch
 from rest_framework import routers, viewsets, exceptions as rest_exceptions
@@ -22,11 +24,13 @@ from rest_framework.request import QueryDict
 from rest_framework.response import Response
 from rest_framework.status import HTTP_504_GATEWAY_TIMEOUT
 
-from .authentication import ApiKeyAuthentication, HasKeyCreateRole
+from .authentication import ApiKeyAuthentication, BatchApiKeyAuthentication, HasKeyCreateRole, \
+    SearchApiKeyAuthentication
 from .metadata import ApiMetadata
+from .quota import quota_counters
 from .serializers import *
 
-from chatnoir_search.search import SimpleSearch, PhraseSearch
+from chatnoir_search.search import SimpleSearch, PhraseSearch, multi_search
 
 
 def api_exception_handler(exc, _):
@@ -38,11 +42,15 @@ def api_exception_handler(exc, _):
         # Django "corrects" these codes to 403, since API keys do not rely on the Django authentication middleware
         status_code = 401
 
+    headers = {}
+    if getattr(exc, 'wait', None):
+        headers['Retry-After'] = '%d' % exc.wait
+
     return Response({
         'code': status_code,
         'error': exc.get_codes(),
         'message': exc.detail
-    }, status_code)
+    }, status_code, headers=headers)
 
 
 def bool_param_set(name, request_params):
@@ -119,11 +127,23 @@ class SimpleSearchViewSet(ApiViewSet):
 
     serializer_class = SimpleSearchRequestSerializer
     allowed_methods = ('GET', 'POST', 'OPTIONS')
-    authentication_classes = (ApiKeyAuthentication,)
+    authentication_classes = (SearchApiKeyAuthentication,)
 
     def get_view_name(self):
         return _('Simple Search')
 
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(request, 'search_slot', None) is None:
+            return response
+
+        if response.streaming:
+            # Keep the slot until the streamed export is closed by the server, even if it was never iterated
+            response._resource_closers.append(partial(SearchApiKeyAuthentication.release_search_slot, request))
+        else:
+            SearchApiKeyAuthentication.release_search_slot(request)
+        return response
+
     def list(self, request, **kwargs):
         request.data.update(request.GET.dict())
         return self.post(request)
@@ -147,9 +167,8 @@ class SimpleSearchViewSet(ApiViewSet):
 
         fields = {}
         if request.auth:
-            for r in request.auth.roles.values('role'):
-                if r['role'] == settings.API_NOLOG_ROLE:
-                    return
+            if settings.API_NOLOG_ROLE in request.auth.role_names:
+                return
 
             fields['user'] = {
                 'name': request.auth.user.common_name if request.auth.user else '<anonymous>',
@@ -164,14 +183,21 @@ class SimpleSearchViewSet(ApiViewSet):
 
         search_obj.log_query(query, extra=fields)
 
+    @staticmethod
+    def _backend_timeout_exception():
+        exc = rest_exceptions.APIException(_('The search backend took too long to respond.'), 'timeout')
+        exc.status_code = HTTP_504_GATEWAY_TIMEOUT
+        return exc
+
     def _process_search(self, search_obj, request, params):
         """Run the search using the selected search class."""
         self._log_query(search_obj, request, params.data['query'], params)
+        search_obj.prefetch_next_page = settings.SEARCH_PREFETCH_NEXT_PAGE and not (
+            request.auth and settings.API_NOPREFETCH_ROLE in request.auth.role_names)
         try:
             serp_ctx = search_obj.search(params.data['query'])
         except elasticsearch.ConnectionTimeout:
-            raise rest_exceptions.APIException(_('The search backend took too long to respond.',
-                                                 code=HTTP_504_GATEWAY_TIMEOUT), 'timeout')
+            raise self._backend_timeout_exception()
         serp_ctx = serp_ctx.to_dict(results=True, meta=True, extended_meta=params.data.get('_extended_meta', False))
 
         if hasattr(search_obj, 'search_method') and 'meta' in serp_ctx:
@@ -190,6 +216,7 @@ class SimpleSearchViewSet(ApiViewSet):
                               validated.get('search_method'),
                               user_auth_info=request.auth)
         search.minimal_response = validated['minimal']
+        search.exact_total = validated['exact_total']
         return self._process_search(search, request, params)
 
 
@@ -208,9 +235,214 @@ class PhraseSearchViewSet(SimpleSearchViewSet):
         search = PhraseSearch(validated['index'], validated['from'], validated['size'],
                               validated['explain'], validated['slop'], user_auth_info=request.auth)
         search.minimal_response = validated['minimal']
+        search.exact_total = validated['exact_total']
         return self._process_search(search, request, params)
 
 
+class SimpleSearchExportViewSet(SimpleSearchViewSet):
+    __doc__ = _('%(appname)s search result export API') % {'appname': settings.APPLICATION_NAME}
+
+    serializer_class = SimpleSearchExportRequestSerializer
+
+    def get_view_name(self):
+        return _('Search Result Export')
+
+    def _create_export_search(self, request, validated):
+        return SimpleSearch(validated['index'], explain=False, search_method=validated.get('search_method'),
+                            user_auth_info=request.auth)
+
+    @staticmethod
+    def _format_ndjson(page, cursor, validated):
+        for hit in page:
+            yield json.dumps(hit) + '\n'
+        if cursor:
+            yield json.dumps({'cursor': cursor}) + '\n'
+
+    @staticmethod
+    def _format_trec(page, cursor, validated):
+        for hit in page:
+            yield '{} Q0 {} {} {} {}\n'.format(validated['topic'], hit['trec_id'] or hit['uuid'],
+                                                hit['rank'], hit['score'], validated['run_tag'])
+        if cursor:
+            yield f'# cursor {cursor}\n'
+
+    @staticmethod
+    def _format_ndjson_error(code, message, cursor):
+        yield json.dumps({'error': code, 'message': message, 'cursor': cursor}) + '\n'
+
+    @staticmethod
+    def _format_trec_error(code, message, cursor):
+        yield f'# error {code}: {message}\n'
+        if cursor:
+            yield f'# cursor {cursor}\n'
+
+    @staticmethod
+    def _remaining_quota(api_key):
+        """
+        Number of requests left in the quota of an API key.
+
+        :param api_key: API key
+        :return: remaining requests or ``None`` if unlimited
+        """
+        remaining = [l - u for u, l in zip(quota_counters.usage(api_key), api_key.limits) if l is not None]
+        return max(0, min(remaining)) if remaining else None
+
+    @staticmethod
+    def _charge_results(api_key, num_results):
+        """
+        Charge exported results to the quota of an API key (one request per result).
+
+        :param api_key: API key
+        :param num_results: number of exported results
+        :return: ``True`` if the results were charged, ``False`` if they would exceed the quota
+        """
+        limits = api_key.limits
+        if not num_results or limits == (None, None, None):
+            return True
+        return quota_counters.charge(api_key, num_results, limits)
+
+    def post(self, request, **kwargs):
+        params = self.serializer_class(data=self._get_request_params(request))
+        params.is_valid(raise_exception=True)
+        validated = params.validated_data
+        search = self._create_export_search(request, validated)
+        self._log_query(search, request, validated['query'], params)
+
+        # Every exported result is charged as one request, so pages must not be larger than the remaining quota
+        api_key = request.auth
+        page_size = settings.SEARCH_EXPORT_PAGE_SIZE
+        remaining_quota = self._remaining_quota(api_key)
+        if remaining_quota is not None:
+            page_size = max(1, min(page_size, remaining_quota))
+
+        pages = search.export(validated['query'], validated.get('cursor'), page_size)
+        try:
+            # Fetch first page eagerly, so errors can still be reported with a proper status code
+            first_page = next(pages, None)
+        except ValueError as e:
+            raise rest_exceptions.ValidationError({'cursor': str(e)}, 'invalid_cursor')
+        except elasticsearch.ConnectionTimeout:
+            raise self._backend_timeout_exception()
+        except elasticsearch.NotFoundError:
+            raise rest_exceptions.ValidationError({'cursor': _('Cursor expired.')}, 'expired_cursor')
+
+        if first_page is not None and not self._charge_results(api_key, len(first_page[0])):
+            raise rest_exceptions.Throttled(None, str(_('API request limit exceeded.')), 'quota_exceeded')
+
+        if validated['export_format'] == 'trec':
+            formatter, error_formatter = self._format_trec, self._format_trec_error
+            content_type = 'text/plain; charset=utf-8'
+        else:
+            formatter, error_formatter = self._format_ndjson, self._format_ndjson_error
+            content_type = 'application/x-ndjson'
+
+        def stream():
+            if first_page is None:
+                return
+            yield from formatter(*first_page, validated)
+            cursor = first_page[1]
+            for results, next_cursor in pages:
+                if not self._charge_results(api_key, len(results)):
+                    # Stop before the page that exceeds the quota, it can be resumed from the previous cursor
+                    yield from error_formatter('quota_exceeded', str(_('API request limit exceeded.')), cursor)
+                    return
+                yield from formatter(results, next_cursor, validated)
+                cursor = next_cursor
+
+        return StreamingHttpResponse(stream(), content_type=content_type)
+
+
+class PhraseSearchExportViewSet(SimpleSearchExportViewSet):
+    __doc__ = _('%(appname)s exact phrase search result export API') % {'appname': settings.APPLICATION_NAME}
+
+    serializer_class = PhraseSearchExportRequestSerializer
+
+    def get_view_name(self):
+        return _('Phrase Search Result Export')
+
+    def _create_export_search(self, request, validated):
+        return PhraseSearch(validated['index'], slop=validated['slop'], user_auth_info=request.auth)
+
+
+class MultiSearchViewSet(SimpleSearchViewSet):
+    __doc__ = _('%(appname)s batch search API') % {'appname': settings.APPLICATION_NAME}
+
+    serializer_class = MultiSearchRequestSerializer
+    allowed_methods = ('POST', 'OPTIONS')
+    authentication_classes = (BatchApiKeyAuthentication,)
+
+    def get_view_name(self):
+        return _('Batch Search')
+
+    def list(self, request, **kwargs):
+        raise rest_exceptions.MethodNotAllowed(request.method)
+
+    @staticmethod
+    def _create_search(request, query_data):
+        """
+        Validate a single query of a batch and create its search object.
+
+        :return: tuple of search object and validated request serializer
+        """
+        data = dict(query_data)
+        search_type = data.pop('type', 'search')
+        if 'q' in data and 'query' not in data:
+            data['query'] = data.pop('q')
+        if 'index' in data and type(data['index']) is str:
+            data['index'] = data['index'].split(',')
+
+        if search_type == 'phrases':
+            params = PhraseSearchRequestSerializer(data=data)
+            params.is_valid(raise_exception=True)
+            validated = params.validated_data
+            search = PhraseSearch(validated['index'], validated['from'], validated['size'],
+                                  validated['explain'], validated['slop'], user_auth_info=request.auth)
+        elif search_type == 'search':
+            params = SimpleSearchRequestSerializer(data=data)
+            params.is_valid(raise_exception=True)
+            validated = params.validated_data
+            search = SimpleSearch(validated['index'], validated['from'], validated['size'], validated['explain'],
+                                  validated.get('search_method'), user_auth_info=request.auth)
+        else:
+            raise rest_exceptions.ValidationError({'type': _('Must be "search" or "phrases".')})
+
+        search.minimal_response = validated['minimal']
+        search.exact_total = validated['exact_total']
+        return search, params
+
+    def post(self, request, **kwargs):
+        batch = MultiSearchRequestSerializer(data=request.data)
+        batch.is_valid(raise_exception=True)
+
+        responses = [None] * len(batch.validated_data['queries'])
+        searches = []
+        for i, query_data in enumerate(batch.validated_data['queries']):
+            try:
+                search, params = self._create_search(request, query_data)
+            except rest_exceptions.ValidationError as e:
+                responses[i] = {'code': e.status_code, 'error': e.get_codes(), 'message': e.detail}
+                continue
+            self._log_query(search, request, params.validated_data['query'], params)
+            searches.append((i, search, params))
+
+        if searches:
+            try:
+                serp_ctxs = multi_search([(s, p.validated_data['query']) for _, s, p in searches])
+            except elasticsearch.ConnectionTimeout:
+                raise self._backend_timeout_exception()
+
+            for (i, search, params), serp_ctx in zip(searches, serp_ctxs):
+                if isinstance(serp_ctx, dict):
+                    responses[i] = serp_ctx
+                    continue
+                responses[i] = serp_ctx.to_dict(results=True, meta=True,
+                                                extended_meta=params.validated_data.get('_extended_meta', False))
+                if 'meta' in responses[i]:
+                    responses[i]['meta']['search_method'] = search.search_method
+
+        return Response({'responses': responses})
+
+
 class ManageKeysViewSet(ApiViewSet):
     __doc__ = _('%(appname)s API key management API') % {'appname': settings.APPLICATION_NAME}
 
@@ -250,12 +482,14 @@ class ManageKeysInfoViewSet(ManageKeysViewSet):
                     'state': user.state,
                     'country': user.country.code if user.country else None,
                 },
-                'roles': [r.role for r in api_key.roles.all()],
+                'roles': sorted(api_key.role_names),
                 'remote_hosts': api_key.allowed_remote_hosts_list,
                 'limits': {
                     'day': api_key.limits_day,
                     'week': api_key.limits_week,
                     'month': api_key.limits_month,
+                    'second': api_key.limits_second,
+                    'concurrent': api_key.limits_concurrent,
                 },
                 'comment': api_key.comments
             })
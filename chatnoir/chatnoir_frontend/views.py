@@ -75,7 +75,7 @@ def _init_frontend_session(request):
         token_max_age = 315360000
         token_quota = apikey.limits_day or 2147483647
     else:
-        token, payload = ApiKeyAuthentication.create_temporary_frontend_token(
+        token, payload = ApiKeyAuthentication.get_temporary_frontend_token(
             validity=settings.API_KEY_TOKEN_FRONTEND_VALIDITY, issuer='web_frontend')
         valid_from = datetime.fromisoformat(payload['valid_from'].replace('Z', '+00:00'))
         valid_until = datetime.fromisoformat(payload['valid_until'].replace('Z', '+00:00'))
@@ -223,6 +223,10 @@ def docs(request):
             context = {
                 'indices': indices,
                 'cache_frontend_url': settings.CACHE_FRONTEND_URL,
+                'track_total_hits_limit': settings.SEARCH_TRACK_TOTAL_HITS,
+                'msearch_max_queries': settings.API_MSEARCH_MAX_QUERIES,
+                'export_page_size': settings.SEARCH_EXPORT_PAGE_SIZE,
+                'export_keep_alive': settings.SEARCH_EXPORT_PIT_KEEP_ALIVE,
                 'default_indices_json': json.dumps([i['id'] for i in indices
                                                     if settings.SEARCH_INDICES[i['id']].get('default', False)])
             }
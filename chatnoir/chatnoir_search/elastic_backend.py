@@ -12,17 +12,26 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from collections import OrderedDict
+import logging
+import threading
+import time
+
 from django.conf import settings
 import elasticsearch_dsl as edsl
 from elasticsearch.exceptions import NotFoundError
 
+from chatnoir_search.warc_locator import WarcRecordLocator
+
+logger = logging.getLogger(__name__)
+
 _INDICES = {}
 
 
 def _get_user_roles(user_auth_info):
     if not user_auth_info:
         return set()
-    return {r['role'] for r in user_auth_info.roles.values('role')}
+    return set(user_auth_info.role_names)
 
 
 def filter_restricted_indices(search_version=None, user_auth_info=None):
@@ -107,3 +116,139 @@ class SearchIndex:
             pass
 
         self.warc_meta_doc = WarcMetaDoc
+
+        self.warc_locator_path = self._conf.get('warc_locator')
+        self._warc_locator = None
+        self._taken_down_uuids = None
+        self._taken_down_uuids_expires = 0
+        self._taken_down_uuids_refresh = None
+        self._lock = threading.Lock()
+        self._target_uri_cache = OrderedDict()
+        self._target_uri_cache_lock = threading.Lock()
+
+    @property
+    def warc_locator(self):
+        """Local WARC record locator or ``None`` if not configured or not available."""
+        if self._warc_locator is not None or not self.warc_locator_path:
+            return self._warc_locator
+
+        with self._lock:
+            if self._warc_locator is None:
+                try:
+                    self._warc_locator = WarcRecordLocator(self.warc_locator_path)
+                except (OSError, ValueError) as e:
+                    logger.warning('Could not open WARC locator for index %s: %s', self.shorthand_name, e)
+                    self.warc_locator_path = None
+        return self._warc_locator
+
+    def taken_down_uuids(self):
+        """
+        Set of UUIDs in the WARC meta index which are currently taken down.
+
+        The set is cached for ``settings.WARC_LOCATOR_TAKEDOWN_TTL`` seconds to be able to serve
+        locator hits without querying the WARC meta index for every document. Only the first call waits
+        for the set to be loaded. Expired sets are refreshed in a background thread, while requests
+        continue to be served with the previous set.
+        """
+        if self._taken_down_uuids is None:
+            with self._lock:
+                if self._taken_down_uuids is None:
+                    self._load_taken_down_uuids()
+            return self._taken_down_uuids
+
+        if self._taken_down_uuids_expires <= time.monotonic():
+            with self._lock:
+                # Threads do not survive forks, so a refresh started in the parent process is not alive here
+                refresh = self._taken_down_uuids_refresh
+                if self._taken_down_uuids_expires <= time.monotonic() and not (refresh and refresh.is_alive()):
+                    self._taken_down_uuids_refresh = threading.Thread(
+                        target=self._refresh_taken_down_uuids, name=f'takedown-refresh-{self.shorthand_name}',
+                        daemon=True)
+                    self._taken_down_uuids_refresh.start()
+        return self._taken_down_uuids
+
+    def _load_taken_down_uuids(self):
+        """Load the set of taken-down UUIDs from the WARC meta index."""
+        search = (edsl.Search()
+                  .index(self.warc_index_name)
+                  .filter('term', takedown=True)
+                  .source(['uuid']))
+        self._taken_down_uuids = frozenset(hit.uuid for hit in search.scan() if hasattr(hit, 'uuid'))
+        self._taken_down_uuids_expires = time.monotonic() + settings.WARC_LOCATOR_TAKEDOWN_TTL
+
+    def _refresh_taken_down_uuids(self):
+        """Refresh the set of taken-down UUIDs in the background."""
+        try:
+            self._load_taken_down_uuids()
+        except Exception as e:
+            # Keep the previous set and retry after another TTL instead of on every request
+            logger.error('Could not refresh taken-down documents of index %s: %s', self.shorthand_name, e)
+            self._taken_down_uuids_expires = time.monotonic() + settings.WARC_LOCATOR_TAKEDOWN_TTL
+
+    def resolve_warc_target_uris(self, uris, batch_size=1000):
+        """
+        Resolve target URIs to the UUIDs of archived documents in the WARC meta index.
+
+        Uncached URIs are resolved with one ``terms`` query per batch. Resolutions (including misses) are
+        cached for ``settings.OUTLINK_RESOLUTION_CACHE_TTL`` seconds in a per-index LRU cache of
+        ``settings.OUTLINK_RESOLUTION_CACHE_SIZE`` entries.
+
+        :param uris: iterable of absolute target URIs
+        :param batch_size: maximum number of URIs per query
+        :return: dict of resolved URIs to document UUIDs (URIs without archived document are omitted)
+        """
+        now = time.monotonic()
+        resolved = {}
+        missing = []
+        with self._target_uri_cache_lock:
+            for uri in set(uris):
+                entry = self._target_uri_cache.get(uri)
+                if entry is None or entry[1] <= now:
+                    missing.append(uri)
+                    continue
+                self._target_uri_cache.move_to_end(uri)
+                if entry[0]:
+                    resolved[uri] = entry[0]
+
+        fetched = {}
+        for i in range(0, len(missing), batch_size):
+            batch = missing[i:i + batch_size]
+            search = (edsl.Search()
+                      .index(self.warc_index_name)
+                      .filter('terms', warc_target_uri=batch)
+                      .source(['uuid', 'warc_target_uri'])
+                      .extra(size=len(batch), collapse={'field': 'warc_target_uri'}))
+            for hit in search.execute().hits:
+                if hasattr(hit, 'uuid'):
+                    fetched[hit.warc_target_uri] = hit.uuid
+
+        resolved.update(fetched)
+        if missing:
+            expires = time.monotonic() + settings.OUTLINK_RESOLUTION_CACHE_TTL
+            with self._target_uri_cache_lock:
+                for uri in missing:
+                    self._target_uri_cache[uri] = (fetched.get(uri), expires)
+                    self._target_uri_cache.move_to_end(uri)
+                while len(self._target_uri_cache) > settings.OUTLINK_RESOLUTION_CACHE_SIZE:
+                    self._target_uri_cache.popitem(last=False)
+        return resolved
+
+    def locate_warc_meta_doc(self, field, value):
+        """
+        Look up a WARC meta document in the local WARC record locator.
+
+        :param field: key field (``uuid`` or ``warc_trec_id``)
+        :param value: key value
+        :return: WARC meta document or ``None`` if no locator is configured or the key was not found
+        """
+        locator = self.warc_locator
+        if locator is None:
+            return None
+
+        hit = locator.lookup(field, value)
+        if hit is None:
+            return None
+
+        hit['_source']['takedown'] = hit['_source'].get('uuid') in self.taken_down_uuids()
+        hit['_index'] = self.warc_index_name
+        return self.warc_meta_doc.from_es(hit)
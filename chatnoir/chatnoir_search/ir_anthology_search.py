@@ -93,7 +93,8 @@ class SimpleSearch(chatnoir_search.SimpleSearch):
         {
             'name': FieldName('full_text', pattern=_field_pattern),
             'fragment_size': 300,
-            'number_of_fragments': 1
+            'number_of_fragments': 1,
+            'no_match_size': 200
         }
     ]
 
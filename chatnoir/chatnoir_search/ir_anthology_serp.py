@@ -28,6 +28,19 @@ _pattern = '{field}_lang.{lang}'
 # noinspection DuplicatedCode
 class SerpContext(chatnoir_serp.SerpContext):
 
+    SOURCE_FIELDS_MINIMAL = [
+        FieldName('doi', False),
+        FieldName('url', False),
+        FieldName('title', pattern=_pattern),
+    ]
+
+    SOURCE_FIELDS_EXTENDED = [
+        FieldName('timestamp', False),
+        FieldName('authors', False),
+        FieldName('venue', False),
+        FieldName('year', False),
+    ]
+
     @property
     def results(self):
 
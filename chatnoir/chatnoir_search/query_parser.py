@@ -0,0 +1,159 @@
+# Copyright 2026 Janek Bevendorff
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import namedtuple
+from functools import lru_cache
+import re
+
+
+"""Plain query text between operators, phrases, and filters (may contain simple query string syntax)."""
+Term = namedtuple('Term', ['text', 'whitespace'])
+
+"""Quoted phrase (including its quotes)."""
+Phrase = namedtuple('Phrase', ['text', 'whitespace'])
+
+"""Boolean operator (``AND`` or ``OR``)."""
+Operator = namedtuple('Operator', ['op', 'whitespace'])
+
+"""Field filter such as ``site:example.com`` (keyword without range marker, comparison operator, raw value)."""
+FieldFilter = namedtuple('FieldFilter', ['keyword', 'operator', 'value', 'whitespace'])
+
+
+class ParsedQuery:
+    """
+    Query AST as a flat list of :class:`Term`, :class:`Phrase`, :class:`Operator`, and :class:`FieldFilter` nodes.
+
+    Each node stores the whitespace preceding it in the original query string.
+    """
+
+    def __init__(self, nodes):
+        self.nodes = nodes
+
+    @property
+    def filters(self):
+        """Field filters in query order."""
+        return [n for n in self.nodes if type(n) is FieldFilter]
+
+    def query_string(self):
+        """
+        Render the query without field filters as a simple query string.
+
+        ``AND`` is rendered as ``+`` prefix of the following node and ``OR`` as ``|``. Field filters are removed
+        together with one whitespace character following them. ``AND`` operators directly before a field filter
+        or at the end of the query are dropped.
+        """
+        parts = []
+        nodes = self.nodes
+        eat_whitespace = False
+        for i, n in enumerate(nodes):
+            t = type(n)
+            parts.append(n.whitespace[1:] if eat_whitespace else n.whitespace)
+            eat_whitespace = False
+            if t is FieldFilter:
+                eat_whitespace = True
+            elif t is Operator:
+                if n.op == 'OR':
+                    parts.append('|')
+                elif i + 1 < len(nodes) and type(nodes[i + 1]) is not FieldFilter:
+                    parts.append('+')
+                    eat_whitespace = True
+            else:
+                parts.append(n.text)
+        return ''.join(parts).strip()
+
+
+class QueryParser:
+    """
+    Single-pass tokenizer for user query strings with field filter operators.
+
+    Field filters must be preceded by whitespace (or the query start) and followed by whitespace (or the
+    query end). Their values are either quoted or a run of non-whitespace characters (digits only for range
+    filters). ``AND`` and ``OR`` are operators only if surrounded by whitespace and not inside a phrase or
+    separated from a preceding operator by only a single whitespace character (except ``AND`` after ``OR``).
+    Phrases also start only at the query start or after whitespace, quotes inside words (``27"``) are text.
+    """
+
+    def __init__(self, filter_keywords):
+        """
+        :param filter_keywords: filter keywords (keywords ending with ``<>`` are numeric range filters)
+        """
+        keywords = [k for k in filter_keywords if not k.endswith('<>')]
+        range_keywords = [k[:-2] for k in filter_keywords if k.endswith('<>')]
+
+        alternatives = []
+        if keywords:
+            kw = '|'.join(re.escape(k) for k in sorted(keywords, key=len, reverse=True))
+            alternatives.append(
+                rf'(?<!\S)(?P<kw>{kw})(?P<kw_op>[<>]=?|[=:])\s*(?P<kw_val>"[^"]+"|[^"\s]\S*)(?=\s|$)')
+        if range_keywords:
+            kw = '|'.join(re.escape(k) for k in sorted(range_keywords, key=len, reverse=True))
+            alternatives.append(rf'(?<!\S)(?P<rkw>{kw})(?P<rkw_op>[<>]=?|[=:])\s*(?P<rkw_val>\d+)(?=\s|$)')
+        alternatives.extend([
+            r'(?<=\s)(?P<op>AND|OR)(?=\s)',
+            r'(?<!\S)(?P<phrase>"[^"]*")',
+        ])
+        self._token_regex = re.compile('|'.join(alternatives))
+
+    def parse(self, query):
+        """
+        Parse a query string.
+
+        :param query: user query string
+        :return: :class:`ParsedQuery`
+        """
+        nodes = []
+        pos = 0
+        for m in self._token_regex.finditer(query):
+            whitespace = self._add_text(nodes, query[pos:m.start()])
+            pos = m.end()
+            group = m.lastgroup
+            if group in ('kw_val', 'rkw_val'):
+                prefix = group[:-4]
+                nodes.append(FieldFilter(m.group(prefix), m.group(prefix + '_op'), m.group(group), whitespace))
+            elif group == 'op':
+                op = m.group(group)
+                prev = nodes[-1] if nodes else None
+                if type(prev) is Operator and len(whitespace) == 1 and not (prev.op == 'OR' and op == 'AND'):
+                    nodes.append(Term(op, whitespace))
+                else:
+                    nodes.append(Operator(op, whitespace))
+            else:
+                nodes.append(Phrase(m.group(group), whitespace))
+        self._add_text(nodes, query[pos:])
+        return ParsedQuery(nodes)
+
+    @staticmethod
+    def _add_text(nodes, text):
+        """
+        Add plain text between two tokens as a :class:`Term` node.
+
+        :return: trailing whitespace of the text
+        """
+        stripped = text.strip()
+        if not stripped:
+            return text
+        leading = len(text) - len(text.lstrip())
+        nodes.append(Term(stripped, text[:leading]))
+        return text[leading + len(stripped):]
+
+
+@lru_cache(maxsize=None)
+def get_query_parser(filter_keywords):
+    """
+    Get a memoized query parser.
+
+    :param filter_keywords: tuple of filter keywords
+    :return: :class:`QueryParser`
+    """
+    return QueryParser(filter_keywords)
@@ -14,16 +14,250 @@
 
 import re
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+import copy
+from functools import partial
+from hashlib import sha256
+import json
 import locale
 import logging
+import threading
+import time
 
 from django.conf import settings
+from django.core import signing
+from elasticsearch.exceptions import NotFoundError, RequestError
 from elasticsearch_dsl import Q, Search, connections
+from elasticsearch_dsl.response import Response
 
 from chatnoir_search.elastic_backend import filter_restricted_indices
+from chatnoir_search.query_parser import get_query_parser
 from chatnoir_search.serp import SerpContext
+from chatnoir_search.serp_cache import get_serp_cache
+from chatnoir_search.singleflight import SingleFlight
 from chatnoir_search.types import FieldName, FieldValue
 
+logger = logging.getLogger(__name__)
+
+
+class FilteredResponse(Response):
+    """
+    Search response that tolerates parts stripped by a ``filter_path`` (such as empty hit lists).
+    """
+
+    def __init__(self, search, response, doc_class=None):
+        hits = response.setdefault('hits', {})
+        hits.setdefault('hits', [])
+        hits.setdefault('total', {'value': 0, 'relation': 'eq'})
+        response.setdefault('timed_out', False)
+        super().__init__(search, response, doc_class)
+
+
+class _TemplateSearch(Search):
+    """
+    Search with a request body rendered from a :class:`_SearchTemplate` instead of a query object tree.
+    """
+
+    def __init__(self, body=None, template=None, template_params=None, **kwargs):
+        super().__init__(**kwargs)
+        self._body = body
+        self._template = template
+        self._template_params = template_params
+
+    def _clone(self):
+        s = super()._clone()
+        s._body = self._body
+        s._template = self._template
+        s._template_params = self._template_params
+        return s
+
+    def to_dict(self, count=False, **kwargs):
+        d = dict(self._body)
+        d.update(kwargs)
+        return d
+
+    def execute(self, ignore_cache=False):
+        """
+        Execute the search with its stored search template if enabled, otherwise with the inline request body.
+
+        Falls back to the inline request body if the stored template is not installed on the cluster.
+        """
+        if not settings.SEARCH_STORED_TEMPLATES or self._template is None:
+            return super().execute(ignore_cache)
+        if not ignore_cache and hasattr(self, '_response'):
+            return self._response
+
+        template_id = self._template.stored_template_id
+        if template_id is None or _MISSING_STORED_TEMPLATES.get(template_id, 0) > time.monotonic():
+            return super().execute(ignore_cache)
+
+        try:
+            response = connections.get_connection(self._using).search_template(
+                index=self._index, body={'id': template_id, 'params': self._template_params}, **self._params)
+        except (NotFoundError, RequestError) as e:
+            if 'resource_not_found' not in str(e.error) and 'unable to find script' not in str(e.info).lower():
+                raise
+            logger.warning('Stored search template %s not found, falling back to inline request.', template_id)
+            _MISSING_STORED_TEMPLATES[template_id] = time.monotonic() + _STORED_TEMPLATE_RETRY_INTERVAL
+            return super().execute(ignore_cache)
+
+        self._response = self._response_class(self, response)
+        return self._response
+
+
+# Query string placeholder and user filter insertion marker in search templates
+_QUERY_PLACEHOLDER = '\x00chatnoir_query\x00'
+_FILTER_SPLICE = object()
+
+# Stored search templates not found on the cluster and when to retry them
+_MISSING_STORED_TEMPLATES = {}
+_STORED_TEMPLATE_RETRY_INTERVAL = 60
+
+_MUSTACHE_TOKEN_REGEX = re.compile(r'"\\u0000(.*?)\\u0000"')
+
+
+def _compile_template_node(node):
+    """
+    Compile a request body node into a render function.
+
+    :param node: request body node
+    :return: render function taking the query string and a list of filter dicts or ``None`` if the node is static
+    """
+    if isinstance(node, str):
+        if node == _QUERY_PLACEHOLDER:
+            return lambda query, filters: query
+        if _QUERY_PLACEHOLDER in node:
+            return lambda query, filters: node.replace(_QUERY_PLACEHOLDER, query)
+        return None
+
+    if isinstance(node, dict):
+        dynamic = {k: f for k, f in ((k, _compile_template_node(v)) for k, v in node.items()) if f}
+        if not dynamic:
+            return None
+        return lambda query, filters: {**node, **{k: f(query, filters) for k, f in dynamic.items()}}
+
+    if isinstance(node, list):
+        items = [(v, _compile_template_node(v)) for v in node if v is not _FILTER_SPLICE]
+        splice = any(v is _FILTER_SPLICE for v in node)
+        if not splice and not any(f for _, f in items):
+            return None
+
+        def render_list(query, filters):
+            l = [f(query, filters) if f else v for v, f in items]
+            if splice:
+                l.extend(filters)
+            return l
+        return render_list
+
+    return None
+
+
+class _SearchTemplate:
+    """
+    Precompiled search request for one search class, search method, language, and index selection.
+
+    Static parts of the request body are built once and shared between requests. Only the
+    parts containing the query string and user filters are rebuilt when rendering a request.
+    """
+
+    def __init__(self, search, name):
+        """
+        :param search: search request built with :data:`_QUERY_PLACEHOLDER` as query string
+        :param name: template name prefix for stored search templates
+        """
+        body = search.to_dict()
+        pre_query_filters = body.get('query', {}).get('bool', {}).get('filter')
+        if isinstance(pre_query_filters, list):
+            pre_query_filters.append(_FILTER_SPLICE)
+
+        self.name = name
+        self.index = search._index
+        self.params = search._params
+        self.response_class = search._response_class
+        self._body = body
+        self._render_body = _compile_template_node(body) or (lambda query, filters: body)
+
+        self.stored_template_source = self._build_mustache_source()
+        self.stored_template_id = None
+        if self.stored_template_source is not None:
+            source_hash = sha256(self.stored_template_source.encode()).hexdigest()[:16]
+            self.stored_template_id = f'{name}-{source_hash}'
+
+    def _build_mustache_source(self):
+        """
+        Build the mustache source for storing this template on the cluster.
+
+        :return: mustache source or ``None`` if the template cannot be expressed as a stored template
+        """
+        def convert(node):
+            if isinstance(node, str):
+                if node == _QUERY_PLACEHOLDER:
+                    return '\x00{{#toJson}}query{{/toJson}}\x00'
+                if _QUERY_PLACEHOLDER in node:
+                    raise ValueError('Query placeholder inside string.')
+                return node
+            if isinstance(node, dict):
+                return {k: convert(v) for k, v in node.items()}
+            if isinstance(node, list):
+                l = [convert(v) for v in node if v is not _FILTER_SPLICE]
+                if any(v is _FILTER_SPLICE for v in node):
+                    # Mustache cannot append to a list, so add user filters as a nested bool query
+                    l.append({'bool': {'filter': '\x00{{#toJson}}filters{{/toJson}}\x00'}})
+                return l
+            return node
+
+        try:
+            body = convert(self._body)
+        except ValueError:
+            return None
+        body.update({
+            'from': '\x00{{from}}\x00',
+            'size': '\x00{{size}}\x00',
+            'track_total_hits': '\x00{{#toJson}}track_total_hits{{/toJson}}\x00',
+            'explain': '\x00{{#toJson}}explain{{/toJson}}\x00',
+            '_source': '\x00{{#toJson}}source{{/toJson}}\x00',
+        })
+        return _MUSTACHE_TOKEN_REGEX.sub(r'\1', json.dumps(body, sort_keys=True))
+
+    def render(self, search_obj, query, filters):
+        """
+        Render a search request.
+
+        :param search_obj: search object providing result window and response options
+        :param query: query string
+        :param filters: list of user filter dicts to add to the pre-query filters
+        :return: configured Search
+        """
+        body = dict(self._render_body(query, filters))
+        template_params = {
+            'query': query,
+            'filters': filters,
+            'from': search_obj.search_from,
+            'size': search_obj.num_results,
+            'track_total_hits': search_obj.track_total_hits,
+            'explain': search_obj.explain,
+            'source': SerpContext.source_includes(search_obj),
+        }
+        body.update({
+            'from': template_params['from'],
+            'size': template_params['size'],
+            'track_total_hits': template_params['track_total_hits'],
+            'explain': template_params['explain'],
+            '_source': template_params['source'],
+        })
+        s = _TemplateSearch(body=body, template=self, template_params=template_params, index=self.index)
+        s._params = dict(self.params)
+        s._response_class = self.response_class
+        return s
+
+
+_SEARCH_TEMPLATES = OrderedDict()
+_SEARCH_TEMPLATES_LOCK = threading.Lock()
+_SEARCH_TEMPLATES_MAX_SIZE = 512
+
+# Coalesces identical concurrent search requests of this process (see SearchBase._execute)
+search_singleflight = SingleFlight()
+
 
 class SearchBase(ABC):
     """
@@ -32,6 +266,20 @@ class SearchBase(ABC):
 
     SEARCH_VERSION = None
 
+    """Response parts used by :class:`serp.SerpContext` (everything else is stripped by Elasticsearch)."""
+    RESPONSE_FILTER_PATH = [
+        'took',
+        'timed_out',
+        'terminated_early',
+        'hits.total',
+        'hits.hits._id',
+        'hits.hits._index',
+        'hits.hits._score',
+        'hits.hits._source',
+        'hits.hits.highlight',
+        'hits.hits._explanation',
+    ]
+
     def __init__(self, indices=None, search_from=0, num_results=10, explain=False, user_auth_info=None):
         """
         :param indices: list of indices to search (will be validated and replaced with defaults if necessary)
@@ -51,6 +299,8 @@ class SearchBase(ABC):
         self.search_from = max(0, min(search_from, 10000 - self.num_results))
         self.explain = explain
         self.minimal_response = False
+        self.exact_total = False
+        self.prefetch_next_page = False
         self.user_auth_info = user_auth_info
 
         self.query_logger = logging.getLogger(f'query_log.{self.__class__.__name__}')
@@ -98,6 +348,13 @@ class SearchBase(ABC):
 
         return indices
 
+    @property
+    def track_total_hits(self):
+        """Value for ``track_total_hits`` (exact count or count up to ``settings.SEARCH_TRACK_TOTAL_HITS``)."""
+        if self.exact_total:
+            return True
+        return settings.SEARCH_TRACK_TOTAL_HITS
+
     @property
     def default_search_method(self, default='default'):
         """The search method used by default for an index."""
@@ -136,6 +393,91 @@ class SearchBase(ABC):
         """
         self.query_logger.log(logging.INFO, "%s", query, extra=extra)
 
+    def _execute(self, search, search_method, prefetch=None):
+        """
+        Execute a search request, using the search result cache if configured.
+
+        Concurrent identical requests in the same process are coalesced into one backend request
+        (see ``settings.SEARCH_COALESCE_TIMEOUT``). Each caller receives its own response object.
+
+        :param search: configured Search
+        :param search_method: search method name
+        :param prefetch: function returning requests for over-fetching the next page into the search result cache
+                         (see :meth:`serp_cache.SerpCache.execute`)
+        :return: search response
+        """
+        timeout = settings.SEARCH_COALESCE_TIMEOUT
+        if not timeout:
+            return self._execute_cached(search, search_method, prefetch)
+
+        key_data = json.dumps([search._index, search_method, search._params, search.to_dict()],
+                              sort_keys=True, separators=(',', ':'), default=str)
+        response, shared = search_singleflight.do(
+            sha256(key_data.encode()).digest(),
+            lambda: self._execute_cached(search, search_method, prefetch),
+            timeout,
+            share=lambda r: json.dumps(r.to_dict()))
+        if shared:
+            return search._response_class(search, json.loads(response))
+        return response
+
+    def _execute_cached(self, search, search_method, prefetch=None):
+        serp_cache = get_serp_cache()
+        if serp_cache is None:
+            return search.execute()
+        return serp_cache.execute(search, list(self.selected_indices), search_method, prefetch)
+
+    def _project_response(self, search):
+        """
+        Restrict a search request's response to the source fields and response parts needed for the SERP.
+
+        :param search: configured Search
+        :return: configured Search
+        """
+        return (search
+                .source(SerpContext.source_includes(self))
+                .params(filter_path=','.join(self.RESPONSE_FILTER_PATH))
+                .response_class(FilteredResponse))
+
+    def _search_template_variant(self):
+        """
+        Name of further search options compiled into search templates (besides search method, language,
+        and index selection), which need a separate template per value.
+
+        :return: variant name or empty string
+        """
+        return ''
+
+    def _get_search_template(self, search_method, compile_fn, has_query):
+        """
+        Get the memoized search template for the current search class, language, index selection,
+        and template variant (see :meth:`_search_template_variant`).
+
+        :param search_method: search method name
+        :param compile_fn: function building the uncompiled search request for a query string
+        :param has_query: whether the query string is non-empty
+        :return: :class:`_SearchTemplate`
+        """
+        variant = self._search_template_variant()
+        key = (type(self), search_method, self.search_language, tuple(sorted(self.selected_indices)), has_query,
+               variant)
+        with _SEARCH_TEMPLATES_LOCK:
+            template = _SEARCH_TEMPLATES.get(key)
+            if template is not None:
+                _SEARCH_TEMPLATES.move_to_end(key)
+                return template
+
+        name = f'chatnoir-{type(self).__name__.lower()}-{search_method}-{self.search_language}'
+        if variant:
+            name += f'-{variant}'
+        name += f'-v{self.SEARCH_VERSION}'
+        template = _SearchTemplate(compile_fn(_QUERY_PLACEHOLDER if has_query else ''), name)
+        with _SEARCH_TEMPLATES_LOCK:
+            _SEARCH_TEMPLATES[key] = template
+            while len(_SEARCH_TEMPLATES) > _SEARCH_TEMPLATES_MAX_SIZE:
+                _SEARCH_TEMPLATES.popitem(last=False)
+        return template
+
     @abstractmethod
     def search(self, query):
         """
@@ -177,6 +519,43 @@ class SearchBase(ABC):
             return snippet.strip()
 
 
+def multi_search(searches):
+    """
+    Run multiple searches in a single Elasticsearch ``msearch`` request.
+
+    :param searches: list of (search object, query string) tuples
+    :return: list of :class:`serp.SerpContext` objects or error dicts (with ``code``, ``error``, and
+             ``message``) in the order of ``searches``
+    """
+    requests = [s.build_search_request(q) for s, q in searches]
+    body = []
+    filter_path = {'responses.error', 'responses.status'}
+    for r in requests:
+        header = {'index': r._index} if r._index else {}
+        header.update(r._params)
+        # Response filters are not allowed in msearch headers, only for the msearch request as a whole
+        filter_path.update(f'responses.{p}' for p in header.pop('filter_path', '').split(',') if p)
+        body.extend((header, r.to_dict()))
+
+    if 'default' not in connections.connections._conns:
+        connections.configure(default=settings.ELASTICSEARCH_PROPERTIES)
+    responses = connections.get_connection().msearch(
+        body=body, filter_path=','.join(sorted(filter_path)))['responses']
+
+    results = []
+    for (search_obj, query), request, raw in zip(searches, requests, responses):
+        if raw.get('error'):
+            error = raw['error'] if isinstance(raw['error'], dict) else {'type': str(raw['error'])}
+            results.append({
+                'code': raw.get('status', 500),
+                'error': error.get('type', 'search_error'),
+                'message': error.get('reason', ''),
+            })
+            continue
+        results.append(SerpContext(query, search_obj, request._response_class(request, raw)))
+    return results
+
+
 class SimpleSearch(SearchBase):
     """
     Simple search (version 1).
@@ -257,7 +636,8 @@ class SimpleSearch(SearchBase):
         {
             'name': FieldName('body'),
             'fragment_size': 100,
-            'number_of_fragments': 1
+            'number_of_fragments': 1,
+            'no_match_size': 100
         }
     ]
 
@@ -297,6 +677,8 @@ class SimpleSearch(SearchBase):
     """Number of top documents to rescore."""
     RESCORE_WINDOW = 400
 
+    _EXPORT_CURSOR_SALT = 'chatnoir_search.search.export'
+
     def __init__(self, indices=None, search_from=0, num_results=10, explain=False, search_method='default',
                  user_auth_info=None):
         super().__init__(indices, search_from, num_results, explain, user_auth_info=user_auth_info)
@@ -306,14 +688,124 @@ class SimpleSearch(SearchBase):
         if not self.search_method:
             self.search_method = self.default_search_method
 
+    def build_search_request(self, query):
+        """
+        Build the search request for the selected search method without executing it.
+
+        :param query: user query as string
+        :return: configured Search
+        """
+        return getattr(self, f'_build_{self.search_method}_search_request')(query)
+
     def search(self, query):
-        search_implementation = getattr(self, f'_build_{self.search_method}_search_request')
-        response = search_implementation(query).execute()
+        # Pages inside the rescore window are ranked the same when fetched together
+        prefetch = partial(self._build_prefetch_requests, query) \
+            if self.prefetch_next_page and self.search_from + 2 * self.num_results <= self.RESCORE_WINDOW else None
+        response = self._execute(self.build_search_request(query), self.search_method, prefetch)
         return SerpContext(query, self, response)
 
+    def _build_prefetch_requests(self, query):
+        """
+        Build the requests for over-fetching the current and the next page in one go.
+
+        :param query: user query as string
+        :return: tuple of the combined request and the request for the next page alone
+        """
+        return (self._build_window_search_request(query, self.search_from, 2 * self.num_results),
+                self._build_window_search_request(query, self.search_from + self.num_results, self.num_results))
+
+    def _build_window_search_request(self, query, search_from, num_results):
+        """
+        Build the search request for a different result window.
+
+        :param query: user query as string
+        :param search_from: start search at this result index
+        :param num_results: number of results to return
+        :return: configured Search
+        """
+        search = copy.copy(self)
+        search.search_from = search_from
+        search.num_results = num_results
+        return search.build_search_request(query)
+
+    def export(self, query, cursor=None, page_size=None):
+        """
+        Export all results of a query page by page with a point in time and ``search_after``.
+
+        Unlike paginated searches, exports are not limited to the first 10,000 results and every page
+        costs the same. Results are ranked by the pre-query only (rescoring is not compatible with
+        ``search_after``) and the result window offset of the search object is ignored.
+
+        :param query: user query as string
+        :param cursor: opaque resume cursor returned with a previous page
+        :param page_size: number of results per page (default: ``settings.SEARCH_EXPORT_PAGE_SIZE``)
+        :return: iterator of tuples with a list of result dicts (with ``rank``, ``score``, ``index``, ``uuid``,
+                 ``trec_id``, and ``target_uri``) and the resume cursor for continuing after this page
+        :raises ValueError: if the cursor is invalid or does not belong to this query
+        """
+        page_size = page_size or settings.SEARCH_EXPORT_PAGE_SIZE
+        keep_alive = settings.SEARCH_EXPORT_PIT_KEEP_ALIVE
+        request = self.build_search_request(query)
+        body = request.to_dict()
+        for k in ('from', 'highlight', 'rescore', 'explain', 'terminate_after'):
+            body.pop(k, None)
+        body.update(sort=[{'_score': 'desc'}, {'_shard_doc': 'asc'}],
+                    track_total_hits=False,
+                    _source=['uuid', 'warc_trec_id', 'warc_target_uri'])
+        # Page size is not part of the hash, so exports can be resumed with different page sizes
+        request_hash = sha256(json.dumps([sorted(self.selected_indices), body], sort_keys=True).encode()).hexdigest()
+        body['size'] = page_size
+
+        es = connections.get_connection()
+        if cursor:
+            try:
+                state = signing.loads(cursor, salt=self._EXPORT_CURSOR_SALT)
+            except signing.BadSignature:
+                raise ValueError('Invalid cursor.')
+            if state.get('request') != request_hash:
+                raise ValueError('Cursor does not belong to this query.')
+        else:
+            pit = es.open_point_in_time(index=','.join(request._index), keep_alive=keep_alive)['id']
+            state = {'request': request_hash, 'pit': pit, 'after': None, 'rank': 0}
+
+        index_shorthands = {v['index']: k for k, v in self.selected_indices.items()}
+        while True:
+            body['pit'] = {'id': state['pit'], 'keep_alive': keep_alive}
+            if state['after'] is not None:
+                body['search_after'] = state['after']
+            response = es.search(body=body)
+            hits = response['hits']['hits']
+            state['pit'] = response.get('pit_id', state['pit'])
+
+            page = []
+            for hit in hits:
+                state['rank'] += 1
+                source = hit.get('_source', {})
+                page.append({
+                    'rank': state['rank'],
+                    'score': hit['_score'],
+                    'index': index_shorthands.get(hit['_index'], hit['_index']),
+                    'uuid': source.get('uuid', hit['_id']),
+                    'trec_id': source.get('warc_trec_id'),
+                    'target_uri': source.get('warc_target_uri'),
+                })
+
+            if len(hits) < page_size:
+                try:
+                    es.close_point_in_time(body={'id': state['pit']})
+                except NotFoundError:
+                    pass
+                if page:
+                    yield page, None
+                return
+
+            state['after'] = hits[-1]['sort']
+            yield page, signing.dumps(state, salt=self._EXPORT_CURSOR_SALT, compress=True)
+
     def _build_default_search_request(self, query):
         """
         Build search request including pre-query, rescorer, node limit, highlighters etc.
+        from a precompiled search template.
 
         :param query: user query as string
         :return: configured Search
@@ -322,9 +814,19 @@ class SimpleSearch(SearchBase):
         # Parse query string and apply side effects
         query, user_filters = self._parse_query_string_operators(query)
 
+        template = self._get_search_template('default', self._compile_default_search_request, bool(query))
+        return template.render(self, query, [f.to_dict() for f in user_filters.filter])
+
+    def _compile_default_search_request(self, query, user_filters=()):
+        """
+        Build the uncompiled search request for the default search method.
+
+        :param query: query string (without operators)
+        :param user_filters: list of filter queries parsed from the query string
+        :return: configured Search
+        """
         pre_query = self._build_pre_query(query)
-        pre_query.filter.extend(user_filters.filter)
-        pre_query.must_not.extend(user_filters.must_not)
+        pre_query.filter.extend(user_filters)
 
         s = (Search()
              .index([i['index'] for i in self.selected_indices.values()])
@@ -332,7 +834,7 @@ class SimpleSearch(SearchBase):
              .extra(from_=self.search_from,
                     size=self.num_results,
                     terminate_after=self.NODE_LIMIT,
-                    track_total_hits=True,
+                    track_total_hits=self.track_total_hits,
                     explain=self.explain)
              .highlight_options(encoder='html'))
 
@@ -351,11 +853,22 @@ class SimpleSearch(SearchBase):
                 )
             ))
 
-        return s
+        return self._project_response(s)
 
     def _build_bm25_search_request(self, query):
         """
-        Build search request that uses an Anserini-inspired retrieval approach of doing BM25 on the default text.
+        Build search request that uses an Anserini-inspired retrieval approach of doing BM25 on the default text
+        from a precompiled search template.
+
+        :param query: user query as string
+        :return: configured Search
+        """
+        template = self._get_search_template('bm25', self._compile_bm25_search_request, bool(query))
+        return template.render(self, query, [])
+
+    def _compile_bm25_search_request(self, query):
+        """
+        Build the uncompiled search request for the BM25 search method.
 
         :param query: user query as string
         :return: configured Search
@@ -366,14 +879,14 @@ class SimpleSearch(SearchBase):
              .extra(from_=self.search_from,
                     size=self.num_results,
                     terminate_after=self.NODE_LIMIT,
-                    track_total_hits=True,
+                    track_total_hits=self.track_total_hits,
                     explain=self.explain)
              .highlight_options(encoder='html'))
 
         for h in self.HIGHLIGHT_FIELDS:
             s = s.highlight(h['name'].i18n(self.search_language), **{k: v for k, v in h.items() if k != 'name'})
 
-        return s
+        return self._project_response(s)
 
     def _parse_query_string_operators(self, query):
         """
@@ -384,56 +897,36 @@ class SimpleSearch(SearchBase):
         :return: stripped query string, generated filter query
         """
 
-        query = re.sub(r'(?!\B"[^"]*) AND (?![^"]*"\B)', ' +', query)
-        query = re.sub(r'(?!\B"[^"]*) OR (?![^"]*"\B)', ' | ', query)
-        query_string_orig = query
-
+        parsed = get_query_parser(tuple(self.QUERY_FILTERS)).parse(query)
         filter_query = Q('bool', filter=[])
 
-        for filter_keyword in self.QUERY_FILTERS:
-            filter_field = self.QUERY_FILTERS[filter_keyword].i18n(self.search_language)
-
-            is_range = filter_keyword.endswith('<>')
-            value_match = r'("[^"]+"|[^"]\S*)' if not is_range else r'(\d+)'
-            filter_keyword = filter_keyword.strip('<>')
-            kw_esc = re.escape(filter_keyword)
+        for f in parsed.filters:
+            is_range = f.keyword not in self.QUERY_FILTERS
+            filter_field = self.QUERY_FILTERS[f.keyword + '<>' if is_range else f.keyword].i18n(self.search_language)
+            filter_value = f.value
 
-            for filter_match in re.finditer(
-                    rf'(?:^|(?<=\s))({kw_esc})([<>]=?|[=:])\s*{value_match}(?:$|\s)',
-                    query_string_orig):
-                filter_value = filter_match.group(3).strip()
-
-                if is_range and not filter_value.isdigit():
-                    continue
-
-                # Remove filter from query string
-                query = query.replace(query_string_orig[filter_match.start():filter_match.end()], '', 1)
-
-                # Special case: index
-                if filter_field == '#index':
-                    self._indices_unvalidated = [i.strip() for i in filter_value.split(',')]
-                    continue
-
-                # Special case: language
-                if filter_field == 'lang':
-                    if filter_value in locale.locale_alias:
-                        self.search_language = filter_value
-                    continue
+            # Special case: index
+            if filter_field == '#index':
+                self._indices_unvalidated = [i.strip() for i in filter_value.split(',')]
+                continue
 
-                if is_range and filter_match.group(2) in ('<', '<=', '>', '>='):
-                    filter_query.filter.append(
-                        Q('range', **{filter_field: {
-                            ('lte' if filter_match.group(2).startswith('<') else 'gte'): filter_value}
-                        }))
-                else:
-                    query_type = 'match_phrase' if ' ' in filter_value else 'match'
-                    filter_query.filter.append(Q(query_type, **{
-                        filter_field.i18n(self.search_language): filter_value.strip('"')}))
+            # Special case: language
+            if filter_field == 'lang':
+                if filter_value in locale.locale_alias:
+                    self.search_language = filter_value
+                continue
 
-            query_string_orig = query.strip()
+            if is_range and f.operator in ('<', '<=', '>', '>='):
+                filter_query.filter.append(
+                    Q('range', **{filter_field: {
+                        ('lte' if f.operator.startswith('<') else 'gte'): filter_value}
+                    }))
+            else:
+                query_type = 'match_phrase' if ' ' in filter_value else 'match'
+                filter_query.filter.append(Q(query_type, **{
+                    filter_field.i18n(self.search_language): filter_value.strip('"')}))
 
-        query = query.strip()
-        return query, filter_query
+        return parsed.query_string(), filter_query
 
     def _build_pre_query(self, query):
         """
@@ -562,6 +1055,10 @@ class PhraseSearch(SimpleSearch):
         super().__init__(indices, search_from, num_results, explain, user_auth_info=user_auth_info)
         self.slop = slop or self.DEFAULT_SLOP
 
+    def _search_template_variant(self):
+        # Slop is compiled into the phrase query
+        return f'slop{min(self.slop, self.MAX_SLOP)}'
+
     def _build_pre_query(self, query):
         pre_query = Q('bool', filter=[], must_not=[])
         pre_query.filter.append(Q('term', lang=self.search_language))
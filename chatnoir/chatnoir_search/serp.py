@@ -28,6 +28,43 @@ class SerpContext:
     Results page context with processed results.
     """
 
+    """
+    Source fields read by :attr:`results` for minimal responses.
+
+    Large text fields are not needed, since snippets are taken from highlights.
+    """
+    SOURCE_FIELDS_MINIMAL = [
+        FieldName('uuid', False),
+        FieldName('lang', False),
+        FieldName('warc_target_uri', False),
+        FieldName('title'),
+    ]
+
+    """Additional source fields read by :attr:`results` for full responses."""
+    SOURCE_FIELDS_EXTENDED = [
+        FieldName('warc_record_id', False),
+        FieldName('warc_trec_id', False),
+        FieldName('warc_target_hostname', False),
+        FieldName('http_date', False),
+        FieldName('warc_date', False),
+        FieldName('page_rank', False),
+        FieldName('spam_rank', False),
+        FieldName('content_type', False),
+    ]
+
+    @classmethod
+    def source_includes(cls, search):
+        """
+        Source fields to request from Elasticsearch for a search.
+
+        :param search: SimpleSearch object
+        :return: list of field names
+        """
+        fields = cls.SOURCE_FIELDS_MINIMAL
+        if not search.minimal_response:
+            fields = fields + cls.SOURCE_FIELDS_EXTENDED
+        return [f.i18n(search.search_language) for f in fields]
+
     def __init__(self, query_string: str, search, response: Response):
         """
         :param query_string: original query string
@@ -68,6 +105,7 @@ class SerpContext:
         """
 
         results = []
+        cache_credential_query = self._cache_credential_query()
         for hit in self.response.hits:
             lang = getattr(hit, 'lang', self.search.search_language)
 
@@ -99,14 +137,8 @@ class SerpContext:
 
             doc_id = getattr(hit, 'uuid', hit.meta.id)
             cache_query = f'index={parse.quote(result_index)}&uuid={parse.quote(doc_id)}'
-            if self.search.user_auth_info:
-                auth_credential = getattr(self.search.user_auth_info, '_auth_credential', None)
-                if getattr(self.search.user_auth_info, '_auth_via_signature', False) and auth_credential:
-                    cache_query += f'&apikey={parse.quote(auth_credential)}'
-                else:
-                    signed_apikey, _ = ApiKeyAuthentication.create_signed_apikey_token(self.search.user_auth_info)
-                    if signed_apikey:
-                        cache_query += f'&apikey={parse.quote(signed_apikey)}'
+            if cache_credential_query:
+                cache_query += cache_credential_query
             cache_url = parse.urlparse(settings.CACHE_FRONTEND_URL)._replace(
                 query=cache_query)
             result = {
@@ -132,6 +164,22 @@ class SerpContext:
 
         return results
 
+    def _cache_credential_query(self):
+        """
+        Build the API key query string suffix for cache URLs (once per SERP).
+
+        :return: query string suffix starting with ``&`` or ``None`` if unauthenticated
+        """
+        if not self.search.user_auth_info:
+            return None
+
+        auth_credential = getattr(self.search.user_auth_info, '_auth_credential', None)
+        if not getattr(self.search.user_auth_info, '_auth_via_signature', False) or not auth_credential:
+            auth_credential, _ = ApiKeyAuthentication.get_signed_apikey_token(self.search.user_auth_info)
+        if not auth_credential:
+            return None
+        return f'&apikey={parse.quote(auth_credential)}'
+
     @property
     def results_filtered(self):
         """
@@ -189,9 +237,14 @@ class SerpContext:
 
     @serp_api_meta
     def total_results(self):
-        """Total hits found for the query."""
+        """Total hits found for the query (lower bound if :attr:`total_results_relation` is ``"gte"``)."""
         return self.response.hits.total.value
 
+    @serp_api_meta
+    def total_results_relation(self):
+        """Whether :attr:`total_results` is exact (``"eq"``) or a lower bound (``"gte"``)."""
+        return getattr(self.response.hits.total, 'relation', 'eq')
+
     @serp_api_meta
     def indices(self):
         """List of searched index IDs."""
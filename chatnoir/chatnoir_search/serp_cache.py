@@ -0,0 +1,186 @@
+# Copyright 2026 Janek Bevendorff
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from hashlib import sha256
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from elasticsearch.exceptions import ConnectionTimeout
+
+logger = logging.getLogger(__name__)
+
+
+class BackendLatency:
+    """
+    Exponentially weighted moving average of search backend response times in this process.
+    """
+
+    def __init__(self, alpha=0.1):
+        """
+        :param alpha: weight of new measurements
+        """
+        self.alpha = alpha
+        self.average = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, ms):
+        """
+        Record a backend response time.
+
+        :param ms: response time in milliseconds
+        """
+        with self._lock:
+            self.average += self.alpha * (ms - self.average)
+
+
+backend_latency = BackendLatency()
+
+
+class SerpCache:
+    """
+    Search result cache in front of Elasticsearch, backed by a (shared) Django cache.
+
+    Entries store the raw Elasticsearch response and are keyed on a hash of the final request body,
+    the selected indices, the search method, and the result window. Per-user data (such as signed
+    cache URLs) is added to the SERP after the lookup, so entries can be shared by all users.
+
+    Each index has a generation counter that is part of the key. Bumping it with :meth:`invalidate_indices`
+    orphans all entries of that index (e.g. after a takedown).
+
+    On a cache miss, the next result page can be over-fetched in the same backend request and stored
+    alongside the requested page (see :meth:`execute`).
+    """
+
+    KEY_PREFIX = 'serp'
+
+    def __init__(self, cache_alias, ttl, stale_ttl=0):
+        """
+        :param cache_alias: Django cache alias
+        :param ttl: seconds for which an entry is fresh
+        :param stale_ttl: seconds after expiry during which a stale entry is served if the backend times out
+        """
+        self.cache = caches[cache_alias]
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+
+    def _generation_key(self, index):
+        return f'{self.KEY_PREFIX}:gen:{index}'
+
+    def _entry_key(self, search, indices, search_method, generations=None):
+        if generations is None:
+            generations = self.cache.get_many([self._generation_key(i) for i in indices])
+        body = search.to_dict()
+        key_data = json.dumps([
+            sorted((i, generations.get(self._generation_key(i), 0)) for i in indices),
+            search_method,
+            body.get('from', 0),
+            body.get('size', 10),
+            body,
+        ], sort_keys=True, separators=(',', ':'), default=str)
+        return f'{self.KEY_PREFIX}:{sha256(key_data.encode()).hexdigest()}'
+
+    def _set(self, key, response_dict):
+        self.cache.set(key, {'response': response_dict, 'expires': time.time() + self.ttl},
+                       timeout=self.ttl + self.stale_ttl)
+
+    def execute(self, search, indices, search_method, prefetch=None):
+        """
+        Execute a search request or return its cached response.
+
+        If ``prefetch`` is given, the next page is not cached yet, and the average backend response time is
+        below ``settings.SEARCH_PREFETCH_MAX_LATENCY``, a request for both pages is sent instead and its
+        results are split into two cache entries.
+
+        :param search: configured :class:`elasticsearch_dsl.Search`
+        :param indices: shorthand names of the searched indices
+        :param search_method: search method name
+        :param prefetch: function returning a request for the requested and the following page
+                         and the request for only the following page
+        :return: search response
+        """
+        generations = self.cache.get_many([self._generation_key(i) for i in indices])
+        key = self._entry_key(search, indices, search_method, generations)
+        next_key = None
+        if prefetch is not None and backend_latency.average < settings.SEARCH_PREFETCH_MAX_LATENCY:
+            prefetch_search, next_search = prefetch()
+            next_key = self._entry_key(next_search, indices, search_method, generations)
+            entries = self.cache.get_many([key, next_key])
+            entry = entries.get(key)
+            next_entry = entries.get(next_key)
+            if next_entry is not None and next_entry['expires'] > time.time():
+                next_key = None
+        else:
+            entry = self.cache.get(key)
+        if entry is not None and entry['expires'] > time.time():
+            return search._response_class(search, entry['response'])
+
+        start = time.perf_counter()
+        try:
+            if next_key is None:
+                response = search.execute()
+            else:
+                response = prefetch_search.execute()
+        except ConnectionTimeout:
+            if entry is None:
+                raise
+            logger.warning('Search backend timed out, serving stale result.')
+            return search._response_class(search, entry['response'])
+        finally:
+            backend_latency.record((time.perf_counter() - start) * 1000)
+
+        if next_key is not None:
+            # Split over-fetched results into the requested and the next page
+            response_dict = response.to_dict()
+            size = search.to_dict().get('size', 10)
+            hits = response_dict['hits']['hits']
+            next_response_dict = dict(response_dict, hits=dict(response_dict['hits'], hits=hits[size:]))
+            response_dict = dict(response_dict, hits=dict(response_dict['hits'], hits=hits[:size]))
+            response = search._response_class(search, response_dict)
+            if not response.timed_out:
+                self._set(next_key, next_response_dict)
+
+        if not response.timed_out:
+            self._set(key, response.to_dict())
+        return response
+
+    def invalidate_indices(self, indices):
+        """
+        Invalidate all cached results of the given indices.
+
+        :param indices: index shorthand names
+        """
+        for index in indices:
+            key = self._generation_key(index)
+            # Generation counters must not expire before the entries using them
+            self.cache.add(key, 0, timeout=None)
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                self.cache.set(key, 1, timeout=None)
+
+
+def get_serp_cache():
+    """
+    Get the configured search result cache.
+
+    :return: :class:`SerpCache` instance or ``None`` if ``settings.SERP_CACHE`` is not set
+    """
+    if not settings.SERP_CACHE:
+        return None
+    return SerpCache(settings.SERP_CACHE, settings.SERP_CACHE_TTL,
+                     settings.SERP_CACHE_STALE_TTL if settings.SERP_CACHE_SERVE_STALE else 0)
@@ -0,0 +1,111 @@
+# Copyright 2026 Janek Bevendorff
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    """In-flight call shared by all callers with the same key."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.waiters = 0
+        self.shared = None
+        self.failed = False
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key within a process.
+
+    The first caller of a key (the leader) runs the function, all callers arriving while it is in flight
+    wait for it and receive its result. Waiters run the function themselves if the leader fails or
+    does not finish within the wait timeout. Results are not retained after the call completes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._counters = {'executed': 0, 'coalesced': 0, 'wait_timeouts': 0, 'leader_errors': 0}
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def do(self, key, fn, timeout, share=None):
+        """
+        Run ``fn`` or wait for an in-flight call with the same key.
+
+        Since the leader's result may still be in use by the leader, waiters receive ``share(result)``
+        instead, which is computed once and only if there are waiters.
+
+        :param key: hashable call key
+        :param fn: function without arguments
+        :param timeout: maximum seconds to wait for an in-flight call
+        :param share: function converting the result into the value passed to waiters (default: identity)
+        :return: tuple of the result (or shared value) and whether it was shared from another call
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+            else:
+                call.waiters += 1
+                leader = False
+
+        if not leader:
+            if not call.done.wait(timeout):
+                self._count('wait_timeouts')
+                logger.debug('Timed out waiting for in-flight call, executing it again.')
+            elif call.failed:
+                self._count('leader_errors')
+            else:
+                self._count('coalesced')
+                return call.shared, True
+            self._count('executed')
+            return fn(), False
+
+        result = None
+        try:
+            result = fn()
+            return result, False
+        except BaseException:
+            call.failed = True
+            raise
+        finally:
+            with self._lock:
+                self._counters['executed'] += 1
+                del self._calls[key]
+            # No new waiters can join after the call was removed
+            if call.waiters and not call.failed:
+                try:
+                    call.shared = share(result) if share is not None else result
+                except Exception:
+                    logger.exception('Failed to share result of in-flight call.')
+                    call.failed = True
+            call.done.set()
+
+    def stats(self):
+        """
+        Get the call counters of this process.
+
+        :return: dict with the numbers of executed calls, coalesced calls, waits that timed out,
+                 and waits that ended with a failed leader call
+        """
+        with self._lock:
+            return dict(self._counters, in_flight=len(self._calls))
@@ -0,0 +1,202 @@
+# Copyright 2026 Janek Bevendorff
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import heapq
+import json
+import mmap
+import os
+import struct
+import tempfile
+
+
+class WarcRecordLocator:
+    """
+    Compact, memory-mapped lookup table of WARC meta records.
+
+    The locator file maps document keys (UUIDs, TREC IDs) to the stored WARC meta record (source file,
+    offset, content length, content type etc.) without a round-trip to the WARC meta index.
+
+    File layout (all integers little endian)::
+
+        header:         magic (8 bytes), number of key tables (uint64)
+        table headers:  field name (16 bytes), key width (uint16), number of entries (uint64), offset (uint64)
+        record heap:    compact JSON WARC meta records
+        key tables:     sorted fixed-width entries of key (zero-padded), heap offset (uint64), heap length (uint32)
+    """
+
+    MAGIC = b'CNWLOC01'
+    KEY_FIELDS = ('uuid', 'warc_trec_id')
+
+    _HEADER = struct.Struct('<8sQ')
+    _TABLE_HEADER = struct.Struct('<16sHQQ')
+    _ENTRY_VALUE = struct.Struct('<QI')
+    _RUN_ENTRY = struct.Struct('<HQI')
+
+    def __init__(self, path):
+        """
+        Open an existing locator file.
+
+        :param path: locator file path
+        :raises ValueError: if the file is not a valid locator file
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, num_tables = self._HEADER.unpack_from(self._mmap, 0)
+        if magic != self.MAGIC:
+            self._mmap.close()
+            raise ValueError(f'Not a WARC locator file: {path}')
+
+        self._tables = {}
+        pos = self._HEADER.size
+        for _ in range(num_tables):
+            field, key_width, num_entries, offset = self._TABLE_HEADER.unpack_from(self._mmap, pos)
+            self._tables[field.rstrip(b'\0').decode()] = (key_width, num_entries, offset)
+            pos += self._TABLE_HEADER.size
+
+    def close(self):
+        self._mmap.close()
+
+    def __len__(self):
+        return max((t[1] for t in self._tables.values()), default=0)
+
+    def lookup(self, field, key):
+        """
+        Look up a WARC meta record by a key field with binary search.
+
+        :param field: key field name (e.g. ``uuid`` or ``warc_trec_id``)
+        :param key: key value
+        :return: dict with ``_id`` and ``_source`` of the WARC meta record or ``None`` if not found
+        """
+        if field not in self._tables or not isinstance(key, str):
+            return None
+
+        key_width, num_entries, offset = self._tables[field]
+        key = key.encode()
+        if len(key) > key_width:
+            return None
+        key = key.ljust(key_width, b'\0')
+
+        entry_size = key_width + self._ENTRY_VALUE.size
+        lo, hi = 0, num_entries
+        while lo < hi:
+            mid = (lo + hi) // 2
+            pos = offset + mid * entry_size
+            mid_key = self._mmap[pos:pos + key_width]
+            if mid_key < key:
+                lo = mid + 1
+            elif mid_key > key:
+                hi = mid
+            else:
+                heap_offset, heap_length = self._ENTRY_VALUE.unpack_from(self._mmap, pos + key_width)
+                return json.loads(self._mmap[heap_offset:heap_offset + heap_length])
+        return None
+
+    @classmethod
+    def _write_run(cls, entries, tmp_dir):
+        entries.sort()
+        run = tempfile.TemporaryFile(dir=tmp_dir)
+        for key, heap_offset, heap_length in entries:
+            run.write(cls._RUN_ENTRY.pack(len(key), heap_offset, heap_length))
+            run.write(key)
+        run.seek(0)
+        entries.clear()
+        return run
+
+    @classmethod
+    def _read_run(cls, run):
+        while True:
+            buf = run.read(cls._RUN_ENTRY.size)
+            if not buf:
+                return
+            key_len, heap_offset, heap_length = cls._RUN_ENTRY.unpack(buf)
+            yield run.read(key_len), heap_offset, heap_length
+
+    @classmethod
+    def build(cls, path, hits, run_size=5000000):
+        """
+        Build a new locator file from an iterable of WARC meta records.
+
+        Keys are sorted with an external merge sort in runs of ``run_size`` entries, so memory
+        usage stays bounded for large crawls. The file is written to a temporary location first
+        and then moved into place atomically.
+
+        :param path: output file path
+        :param hits: iterable of ``(doc_id, source_dict)`` tuples
+        :param run_size: maximum number of keys to sort in memory
+        :return: number of records written
+        """
+        out_dir = os.path.dirname(os.path.abspath(path))
+        headers_size = cls._HEADER.size + len(cls.KEY_FIELDS) * cls._TABLE_HEADER.size
+        runs = {f: [] for f in cls.KEY_FIELDS}
+        buffers = {f: [] for f in cls.KEY_FIELDS}
+        key_widths = {f: 1 for f in cls.KEY_FIELDS}
+        num_records = 0
+
+        fd, tmp_path = tempfile.mkstemp(dir=out_dir, prefix='.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                out.write(b'\0' * headers_size)
+                heap_offset = headers_size
+
+                for doc_id, source in hits:
+                    record = json.dumps({'_id': doc_id, '_source': source},
+                                        ensure_ascii=False, separators=(',', ':')).encode()
+                    out.write(record)
+
+                    for f in cls.KEY_FIELDS:
+                        if not source.get(f):
+                            continue
+                        key = source[f].encode()
+                        key_widths[f] = max(key_widths[f], len(key))
+                        buffers[f].append((key, heap_offset, len(record)))
+                        if len(buffers[f]) >= run_size:
+                            runs[f].append(cls._write_run(buffers[f], out_dir))
+
+                    heap_offset += len(record)
+                    num_records += 1
+
+                table_headers = []
+                for f in cls.KEY_FIELDS:
+                    key_width = key_widths[f]
+                    num_entries = 0
+                    table_offset = out.tell()
+                    buffers[f].sort()
+                    last_key = None
+                    for key, offset, length in heapq.merge(buffers[f], *(cls._read_run(r) for r in runs[f])):
+                        if key == last_key:
+                            continue
+                        last_key = key
+                        out.write(key.ljust(key_width, b'\0'))
+                        out.write(cls._ENTRY_VALUE.pack(offset, length))
+                        num_entries += 1
+                    table_headers.append(cls._TABLE_HEADER.pack(f.encode(), key_width, num_entries, table_offset))
+                    for r in runs[f]:
+                        r.close()
+                    buffers[f].clear()
+
+                out.seek(0)
+                out.write(cls._HEADER.pack(cls.MAGIC, len(cls.KEY_FIELDS)))
+                out.write(b''.join(table_headers))
+                out.flush()
+                os.fsync(out.fileno())
+
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        return num_records
@@ -14,10 +14,14 @@
 
 import logging
 import os
+import posixpath
 import re
+import secrets
+import threading
 import urllib.parse as urlparse
 
 import boto3
+from botocore.config import Config as BotoConfig
 from botocore.errorfactory import ClientError
 from django.conf import settings
 from django.utils .html import escape as html_escape
@@ -30,11 +34,96 @@ from resiliparse.parse.html import HTMLTree
 import json
 import zlib
 
+from .render_pool import get_render_pool, run_in_render_pool
+
 logger = logging.getLogger(__name__)
 
+# Maximum number of bytes to scan for the end of the HTML head when parsing only the head
+_HTML_HEAD_SCAN_LIMIT = 65536
+_HTML_HEAD_END_REGEX = re.compile(rb'</head\s*>|<body[\s>]', re.IGNORECASE)
+
+_S3_CLIENT = None
+_S3_CLIENT_PID = None
+_S3_CLIENT_LOCK = threading.Lock()
+
+
+def _reset_s3_client():
+    global _S3_CLIENT, _S3_CLIENT_PID, _S3_CLIENT_LOCK
+    _S3_CLIENT = None
+    _S3_CLIENT_PID = None
+    _S3_CLIENT_LOCK = threading.Lock()
+
+
+# Connection pools must not be shared between forked uWSGI workers
+os.register_at_fork(after_in_child=_reset_s3_client)
+
+
+def get_s3_client():
+    """
+    Get the process-wide S3 client.
+
+    The client is created lazily on first use with the endpoint settings from ``settings.S3_ENDPOINT_PROPERTIES``
+    and the connection pool, retry, and timeout settings from ``settings.S3_CLIENT_CONFIG``. Boto3 clients
+    are thread-safe, so a single client (and its keep-alive connection pool) is shared by all request threads.
+    A new client is created after a fork.
+
+    :return: boto3 S3 client
+    """
+    global _S3_CLIENT, _S3_CLIENT_PID
+    if _S3_CLIENT is not None and _S3_CLIENT_PID == os.getpid():
+        return _S3_CLIENT
+
+    with _S3_CLIENT_LOCK:
+        if _S3_CLIENT is None or _S3_CLIENT_PID != os.getpid():
+            # Sessions are not thread-safe, so create a dedicated one instead of using the default session
+            session = boto3.session.Session()
+            _S3_CLIENT = session.client('s3', config=BotoConfig(**settings.S3_CLIENT_CONFIG),
+                                        **settings.S3_ENDPOINT_PROPERTIES)
+            _S3_CLIENT_PID = os.getpid()
+        return _S3_CLIENT
+
+
+_WARC_READ_STATS = dict(range_requests=0, short_reads=0, bytes_fetched=0, bytes_over_read=0)
+_WARC_READ_STATS_LOCK = threading.Lock()
+
+
+def _update_warc_read_stats(**kwargs):
+    with _WARC_READ_STATS_LOCK:
+        for k, v in kwargs.items():
+            _WARC_READ_STATS[k] += v
+
+
+def warc_read_stats():
+    """
+    Process-wide WARC read statistics.
+
+    ``bytes_over_read`` counts bytes that were fetched from S3 but not consumed by the WARC parser.
+
+    :return: dict with counters for range requests, short reads, fetched bytes, and over-read bytes
+    """
+    with _WARC_READ_STATS_LOCK:
+        return dict(_WARC_READ_STATS)
+
+
+class _CountingStream:
+    """
+    Read-only stream wrapper counting the number of bytes read and keeping the bytes of the first read.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self.bytes_read = 0
+        self.head = b''
+
+    def read(self, size=-1):
+        data = self._stream.read(size)
+        if not self.bytes_read:
+            self.head = data
+        self.bytes_read += len(data)
+        return data
+
 
 class CacheDocument:
-    _S3_RESOURCE = None
 
     def __init__(self, rewrite_auth_credential=None):
         """
@@ -46,27 +135,27 @@ class CacheDocument:
         self._meta_doc = None
         self._doc_index = None
         self._doc_bytes = None
-        self._html_tree = None
+        self._html_tree = None       # Lazily parsed HTML tree
+        self._head_tree = None       # Lazily parsed HTML tree of only the document head
+        self._has_html = False       # Document has an HTML representation that can be parsed
+        self._jsonl_doc = None
         self._rewrite_auth_credential = rewrite_auth_credential
         self._is_clueweb09 = False   # ClueWeb09 quirks mode
         self._doc_found = False
         self._raw_doc_content_type = 'application/octet-stream'
+        self._payload_stream = None
+        self._payload_location = None  # S3 bucket, object, and payload offset of an uncompressed streamed record
 
         if 'default' not in connections.connections._conns:
             connections.configure(default=settings.ELASTICSEARCH_PROPERTIES)
 
-        self._init_s3()
-
-    def _init_s3(self):
-        if self._S3_RESOURCE is None:
-            self._S3_RESOURCE = boto3.resource('s3', **settings.S3_ENDPOINT_PROPERTIES)
-
-    def retrieve_by_idx_id(self, index, idx_uuid):
+    def retrieve_by_idx_id(self, index, idx_uuid, meta_only=False):
         """
         Retrieve document by its UUID.
 
         :param index: index object
         :param idx_uuid: document internal index UUID
+        :param meta_only: retrieve only the WARC meta document (use :meth:`read_record` to read the record later)
         :return: True on success
         """
         try:
@@ -77,8 +166,20 @@ class CacheDocument:
         self._doc_index = index
         self._meta_doc = doc
 
+        if meta_only:
+            return True
         return self._read_record(doc)
 
+    def read_record(self):
+        """
+        Read the record of a previously retrieved WARC meta document.
+
+        :return: True on success
+        """
+        if self._meta_doc is None:
+            raise RuntimeError('No document retrieved.')
+        return self._read_record(self._meta_doc)
+
     def _read_record(self, doc):
         """
         read the record encoded by the document doc. If the source_file of doc points to a json(lines) file, the record is parsed as jsonl, otherwise as warc.
@@ -89,29 +190,40 @@ class CacheDocument:
         if doc.source_file.endswith('.json') or doc.source_file.endswith('.jsonl') or doc.source_file.endswith('jsonl.gz'):
             self._read_jsonl_record(doc.source_file, doc.source_offset, doc.content_length)
         else:
-            self._read_warc_record(doc.source_file, doc.source_offset)
+            self._read_warc_record(doc.source_file, doc.source_offset, getattr(doc, 'content_length', None))
 
         return True
 
-    def retrieve_by_filter(self, index, **filter_expr):
+    def retrieve_by_filter(self, index, meta_only=False, **filter_expr):
         """
         Retrieve first document that matches the given filter expression in the WARC meta index.
 
+        If the index has a local WARC record locator, it is consulted first and the WARC meta
+        index is only queried on a miss.
+
         :param index: index object
+        :param meta_only: retrieve only the WARC meta document (use :meth:`read_record` to read the record later)
         :param filter_expr: term filter expression (e.g. warc_target_uri="https://example.com")
         :return: True on success
         """
-        result = (Search().doc_type(index.warc_meta_doc)
-                  .index(index.warc_index_name)
-                  .filter('term', **filter_expr)
-                  .extra(terminate_after=1).execute())
+        doc = None
+        if len(filter_expr) == 1:
+            doc = index.locate_warc_meta_doc(*next(iter(filter_expr.items())))
 
-        if not result.hits:
-            return False
+        if doc is None:
+            result = (Search().doc_type(index.warc_meta_doc)
+                      .index(index.warc_index_name)
+                      .filter('term', **filter_expr)
+                      .extra(terminate_after=1).execute())
+
+            if not result.hits:
+                return False
+            doc = result.hits[0]
 
-        doc = result.hits[0]
         self._doc_index = index
         self._meta_doc = doc
+        if meta_only:
+            return True
         return self._read_record(doc)
 
     def _read_jsonl_record(self, jsonl_file_url, start_offset, content_length=None):
@@ -133,10 +245,10 @@ class CacheDocument:
         try:
             bucket_name, obj_name = jsonl_file_url[5:].split('/', 1)
             obj_name = obj_name.replace("corpusjsonl.gz", "corpus.jsonl.gz")
-            obj = self._S3_RESOURCE.Object(bucket_name, obj_name)
             start = start_offset
             end = start_offset + content_length
-            stream = obj.get(Range=f'bytes={start}-{end}')['Body']
+            stream = get_s3_client().get_object(
+                Bucket=bucket_name, Key=obj_name, Range=f'bytes={start}-{end}')['Body']
             response = stream._raw_stream.read()
             if jsonl_file_url.endswith('.gz'):
                 d = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
@@ -151,51 +263,158 @@ class CacheDocument:
             if ("warc_target_uri" not in self._meta_doc or not self._meta_doc["warc_target_uri"]) and "original_document" in response and "url" in response["original_document"]:
                 self._meta_doc["warc_target_uri"] = response["original_document"]["url"]
 
-            title = None
-            if 'title' in response:
-                title = response['title']
-            elif 'original_document' in response and 'title' in response['original_document']:
-                title = response['original_document']['title']
-            elif 'docid' in response:
-                title = f'Document {response["docid"]}'
-            elif 'docno' in response:
-                title = f'Document {response["docno"]}'
+            self._jsonl_doc = response
+            self._html_tree = None
+            self._head_tree = None
+            self._has_html = True
+            self._raw_doc_content_type = 'application/json'
 
-            body = f'<h1>{html_escape(title)}</h1>'
+        except Exception as e:
+            logger.error(e)
+            logger.error('Could not parse json record.', e)
+            raise ValueError('Could not parse json record', e)
 
-            if 'headings' in response:
-                body += f'<h2>Headings:</h2><p>' + html_escape(response['headings']) + '</p>'
+    @staticmethod
+    def _jsonl_title(jsonl_doc):
+        """Determine title of a JSONL document."""
+        if 'title' in jsonl_doc:
+            return jsonl_doc['title']
+        elif 'original_document' in jsonl_doc and 'title' in jsonl_doc['original_document']:
+            return jsonl_doc['original_document']['title']
+        elif 'docid' in jsonl_doc:
+            return f'Document {jsonl_doc["docid"]}'
+        elif 'docno' in jsonl_doc:
+            return f'Document {jsonl_doc["docno"]}'
+        return None
 
-            if 'original_document' in response and 'headings' in response['original_document']:
-                body += f'<h2>Headings:</h2><p>' + html_escape(response['original_document']['headings']) + '</p>'
+    @classmethod
+    def _jsonl_to_html(cls, jsonl_doc):
+        """Render a synthetic HTML page from a JSONL document."""
+        title = cls._jsonl_title(jsonl_doc)
+        body = f'<h1>{html_escape(title)}</h1>'
 
-            if 'segment' in response:
-                body += '<h2>Segment (from the page):</h2><p>' + html_escape(response['segment']) + '</p>'
+        if 'headings' in jsonl_doc:
+            body += f'<h2>Headings:</h2><p>' + html_escape(jsonl_doc['headings']) + '</p>'
 
-            if 'body' in response:
-                body += '<h2>Body (from the page):</h2><p>' + html_escape(response['body']) + '</p>'
+        if 'original_document' in jsonl_doc and 'headings' in jsonl_doc['original_document']:
+            body += f'<h2>Headings:</h2><p>' + html_escape(jsonl_doc['original_document']['headings']) + '</p>'
 
-            if 'text' in response:
-                body += '<h2>Text:</h2><p>' + html_escape(response['text']) + '</p>'
+        if 'segment' in jsonl_doc:
+            body += '<h2>Segment (from the page):</h2><p>' + html_escape(jsonl_doc['segment']) + '</p>'
 
-            body = body.replace('\n', '<br>')
-            html = ''.join(['<html><head><title>', html_escape(title), '</title></head><body>', body, '</body></html>'])
+        if 'body' in jsonl_doc:
+            body += '<h2>Body (from the page):</h2><p>' + html_escape(jsonl_doc['body']) + '</p>'
 
-            self._html_tree = HTMLTree.parse(html)
-            self._raw_doc_content_type = 'application/json'
+        if 'text' in jsonl_doc:
+            body += '<h2>Text:</h2><p>' + html_escape(jsonl_doc['text']) + '</p>'
 
-        except Exception as e:
-            logger.error(e)
-            logger.error('Could not parse json record.', e)
-            raise ValueError('Could not parse json record', e)
+        body = body.replace('\n', '<br>')
+        return ''.join(['<html><head><title>', html_escape(title), '</title></head><body>', body, '</body></html>'])
 
-    def _read_warc_record(self, warc_file_url, start_offset):
+    def _get_html_tree(self):
         """
-        Read WARC record from S3 object store.
+        Parse the document HTML on first access.
 
-        :param warc_file_url: S3 object URL
+        :return: HTML tree or ``None`` if the document has no HTML representation
+        """
+        if self._html_tree is None and self._has_html:
+            if self._jsonl_doc is not None:
+                self._html_tree = HTMLTree.parse(self._jsonl_to_html(self._jsonl_doc))
+            else:
+                self._html_tree = HTMLTree.parse_from_bytes(self._doc_bytes, self._meta_doc.content_encoding)
+        return self._html_tree
+
+    def _get_head_tree(self):
+        """
+        Get an HTML tree that contains at least the document head.
+
+        If the full document has not been parsed yet, only the bytes up to the end of the head are parsed.
+
+        :return: HTML tree or ``None`` if the document has no HTML representation
+        """
+        if self._html_tree is not None or not self._has_html or self._jsonl_doc is not None:
+            return self._get_html_tree()
+
+        if self._head_tree is None:
+            m = _HTML_HEAD_END_REGEX.search(self._doc_bytes, 0, _HTML_HEAD_SCAN_LIMIT)
+            if not m:
+                return self._get_html_tree()
+            self._head_tree = HTMLTree.parse_from_bytes(self._doc_bytes[:m.start()], self._meta_doc.content_encoding)
+        return self._head_tree
+
+    def _open_warc_record(self, bucket_name, obj_name, start_offset, length, parse_http):
+        """
+        Open a (bounded) S3 byte range and parse the headers of the WARC record at its beginning.
+
+        :param bucket_name: S3 bucket name
+        :param obj_name: S3 object name
         :param start_offset: byte offset of record in WARC file
-        :return: WarcRecord
+        :param length: number of bytes to fetch or ``None`` to read until the end of the file
+        :param parse_http: parse HTTP headers
+        :return: tuple of WARC record (``None`` if range too short), S3 body stream, and counting raw stream
+        """
+        byte_range = f'bytes={start_offset}-{start_offset + length - 1}' if length else f'bytes={start_offset}-'
+        response = get_s3_client().get_object(Bucket=bucket_name, Key=obj_name, Range=byte_range)
+        stream = response['Body']
+        counting_stream = _CountingStream(stream._raw_stream)
+        try:
+            record = next(ArchiveIterator(
+                counting_stream,
+                strict_mode=not self._is_clueweb09,
+                parse_http=parse_http
+            ))
+        except StopIteration:
+            if not length:
+                stream.close()
+                raise
+            # Range too short to even contain the WARC headers
+            record = None
+        return record, stream, counting_stream
+
+    @staticmethod
+    def _close_warc_stream(stream, counting_stream, bounded, complete=True):
+        """
+        Close an S3 record stream and update the read statistics.
+
+        :param stream: S3 body stream
+        :param counting_stream: counting raw stream wrapper
+        :param bounded: whether the stream was opened with a bounded byte range
+        :param complete: whether the record was read completely
+        """
+        bytes_over_read = 0
+        if bounded:
+            # Drain the bounded remainder, so the connection can be returned to the keep-alive pool
+            bytes_over_read = len(stream._raw_stream.read())
+        stream.close()
+
+        _update_warc_read_stats(range_requests=1, short_reads=int(bounded and not complete),
+                                bytes_fetched=counting_stream.bytes_read + bytes_over_read,
+                                bytes_over_read=bytes_over_read)
+
+    def _fetch_warc_record(self, bucket_name, obj_name, start_offset, length, parse_http):
+        """
+        Fetch and parse a single WARC record from a (bounded) S3 byte range.
+
+        :param bucket_name: S3 bucket name
+        :param obj_name: S3 object name
+        :param start_offset: byte offset of record in WARC file
+        :param length: number of bytes to fetch or ``None`` to read until the end of the file
+        :param parse_http: parse HTTP headers
+        :return: tuple of WARC record, payload bytes, and whether the record was read completely
+        """
+        record, stream, counting_stream = self._open_warc_record(
+            bucket_name, obj_name, start_offset, length, parse_http)
+        payload = record.reader.read() if record is not None else b''
+        complete = record is not None and len(payload) >= record.content_length
+        self._close_warc_stream(stream, counting_stream, bool(length), complete)
+        return record, payload, complete
+
+    def _parse_warc_location(self, warc_file_url):
+        """
+        Parse WARC S3 URL and determine WARC parsing options.
+
+        :param warc_file_url: S3 object URL
+        :return: tuple of S3 bucket name, object name, and whether to parse HTTP headers
         """
         if not warc_file_url.startswith('s3://'):
             raise ValueError('WARC URL is not an S3 URL.')
@@ -203,34 +422,205 @@ class CacheDocument:
         # ClueWeb09 WARCs are broken and need further processing
         self._is_clueweb09 = getattr(self._meta_doc, 'warc_trec_id', '').startswith('clueweb09')
 
+        bucket_name, obj_name = warc_file_url[5:].split('/', 1)
+        # Override HTTP parsing flag from meta index to work around broken ClueWeb22 headers
+        parse_http = (self._meta_doc.warc_type in ('request', 'response')
+                      and self._meta_doc.content_type.startswith('application/http'))
+        return bucket_name, obj_name, parse_http
+
+    def _set_raw_doc_content_type(self):
+        """Set raw document content type from WARC meta document."""
+        http_content_type = self._meta_doc.http_content_type
+        if http_content_type and http_content_type in ('text/html', 'application/xhtml+xml'):
+            self._raw_doc_content_type = 'text/html'
+        elif http_content_type and http_content_type.endswith('/json'):
+            self._meta_doc.http_content_type = 'application/json'
+        elif http_content_type:
+            self._raw_doc_content_type = http_content_type
+
+    def is_streamable(self):
+        """
+        Whether the record of a previously retrieved meta document is large enough to be worth streaming
+        with :meth:`open_payload_stream` instead of reading it into memory.
+        """
+        if self._meta_doc is None or self._doc_found:
+            return False
+        source_file = self._meta_doc.source_file
+        if source_file.endswith('.json') or source_file.endswith('.jsonl') or source_file.endswith('jsonl.gz'):
+            return False
+        content_length = getattr(self._meta_doc, 'content_length', None)
+        return bool(content_length) and content_length >= settings.CACHE_STREAMING_MIN_SIZE
+
+    def open_payload_stream(self):
+        """
+        Open the WARC record of a previously retrieved meta document for streaming its payload.
+
+        Only the record headers are parsed. Use :meth:`iter_payload` to read the payload.
+
+        :return: payload length in bytes or ``None`` if the record could not be read
+        """
+        start_offset = self._meta_doc.source_offset
         try:
-            bucket_name, obj_name = warc_file_url[5:].split('/', 1)
-            obj = self._S3_RESOURCE.Object(bucket_name, obj_name)
-            start = start_offset
-            stream = obj.get(Range=f'bytes={start}-')['Body']
-            # Override HTTP parsing flag from meta index to work around broken ClueWeb22 headers
-            parse_http = (self._meta_doc.warc_type in ('request', 'response')
-                          and self._meta_doc.content_type.startswith('application/http'))
-            self._warc_record = next(
-                ArchiveIterator(
-                    stream._raw_stream,
-                    strict_mode=not self._is_clueweb09,
-                    parse_http=parse_http
-                )
-            )
-            self._doc_bytes = self._warc_record.reader.read()
-            stream.close()
+            bucket_name, obj_name, parse_http = self._parse_warc_location(self._meta_doc.source_file)
+            length = self._meta_doc.content_length + settings.WARC_RECORD_HEADER_SLACK
+            record, stream, counting_stream = self._open_warc_record(
+                bucket_name, obj_name, start_offset, length, parse_http)
+
+            # Streams cannot be retried once the response has started, so make sure the range is large enough
+            warc_content_length = record.headers.get('Content-Length', '') if record is not None else ''
+            if record is None or (warc_content_length.isdigit()
+                                  and int(warc_content_length) + settings.WARC_RECORD_HEADER_SLACK > length):
+                self._close_warc_stream(stream, counting_stream, True, False)
+                length = 2 * length
+                if warc_content_length.isdigit():
+                    length = max(length, int(warc_content_length) + settings.WARC_RECORD_HEADER_SLACK)
+                record, stream, counting_stream = self._open_warc_record(
+                    bucket_name, obj_name, start_offset, length, parse_http)
+                if record is None:
+                    self._close_warc_stream(stream, counting_stream, True, False)
+                    logger.error('Could not read WARC record at position %s.', start_offset)
+                    return None
+
+        except ClientError as e:
+            logger.exception(e)
+            return None
+
+        self._warc_record = record
+        self._payload_stream = (stream, counting_stream)
+        self._payload_location = None
+        payload_offset = self._payload_offset(record, counting_stream.head) if not self._is_clueweb09 else None
+        if payload_offset is not None:
+            self._payload_location = (bucket_name, obj_name, start_offset + payload_offset)
+        self._set_raw_doc_content_type()
+        return record.content_length
+
+    @staticmethod
+    def _payload_offset(record, head):
+        """
+        Determine the payload offset within an uncompressed WARC record.
+
+        :param record: WARC record with parsed headers
+        :param head: first bytes of the record
+        :return: payload offset or ``None`` if the record is compressed or the offset cannot be determined
+        """
+        if not head.startswith(b'WARC/'):
+            return None
+        warc_headers_end = head.find(b'\r\n\r\n')
+        block_length = record.headers.get('Content-Length', '')
+        if warc_headers_end < 0 or not block_length.isdigit():
+            return None
+        # Parsed HTTP headers are not counted in the remaining content length
+        return warc_headers_end + 4 + int(block_length) - record.content_length
+
+    def _open_payload_range(self, start, end):
+        """
+        Open an S3 byte range of the payload of an uncompressed record opened with :meth:`open_payload_stream`.
+
+        :param start: first payload byte
+        :param end: payload byte position to stop at (exclusive)
+        :return: tuple of S3 body stream and counting raw stream or ``None`` if the range could not be opened
+        """
+        bucket_name, obj_name, payload_offset = self._payload_location
+        try:
+            response = get_s3_client().get_object(
+                Bucket=bucket_name, Key=obj_name, Range=f'bytes={payload_offset + start}-{payload_offset + end - 1}')
+        except ClientError as e:
+            logger.exception(e)
+            return None
+        stream = response['Body']
+        return stream, _CountingStream(stream._raw_stream)
+
+    def iter_payload(self, start=0, end=None, chunk_size=65536):
+        """
+        Iterate the payload of a record opened with :meth:`open_payload_stream` in chunks.
+
+        For uncompressed records, the payload from ``start`` on is requested directly with a new S3 byte range.
+        Compressed records cannot be seeked into, so bytes before ``start`` are skipped within the record stream.
+
+        :param start: first payload byte to return
+        :param end: payload byte position to stop at (exclusive) or ``None`` to read to the end
+        :param chunk_size: chunk size in bytes
+        :return: iterator of bytes chunks
+        """
+        reader = self._warc_record.reader
+        pos = 0
+        drain = False
+        if start > 0 and self._payload_location is not None:
+            range_end = self._warc_record.content_length if end is None else min(end, self._warc_record.content_length)
+            payload_stream = self._open_payload_range(start, range_end) if start < range_end else None
+            if payload_stream is not None:
+                # Do not drain the record stream, skipping its remainder is what the new range is for
+                self.close()
+                self._payload_stream = payload_stream
+                reader = payload_stream[1]
+                # The range ends at the requested end, so read it to the end to keep the connection alive
+                pos, end = start, None
+        try:
+            while end is None or pos < end:
+                chunk = reader.read(chunk_size if end is None else min(chunk_size, end - pos))
+                if not chunk:
+                    drain = True
+                    break
+                chunk_start = pos
+                pos += len(chunk)
+                if pos <= start:
+                    continue
+                yield chunk[max(0, start - chunk_start):]
+        finally:
+            self.close(drain)
+
+    def close(self, drain=False):
+        """
+        Close any open payload stream.
+
+        :param drain: drain the remaining bytes of the bounded S3 range to keep the connection alive
+                      (only worth it if the payload was read to the end)
+        """
+        if self._payload_stream:
+            self._close_warc_stream(*self._payload_stream, bounded=drain)
+            self._payload_stream = None
+
+    def _read_warc_record(self, warc_file_url, start_offset, content_length=None):
+        """
+        Read WARC record from S3 object store.
+
+        If the record's content length is known, only the record bytes plus ``settings.WARC_RECORD_HEADER_SLACK``
+        are requested. If the bounded read turns out to be too short, the record is requested again with a
+        larger range.
+
+        :param warc_file_url: S3 object URL
+        :param start_offset: byte offset of record in WARC file
+        :param content_length: WARC record content length (if known)
+        :return: WarcRecord
+        """
+        bucket_name, obj_name, parse_http = self._parse_warc_location(warc_file_url)
+
+        try:
+            length = content_length + settings.WARC_RECORD_HEADER_SLACK if content_length else None
+            record, payload, complete = self._fetch_warc_record(
+                bucket_name, obj_name, start_offset, length, parse_http)
+            if not complete and length:
+                # Short read, retry with a larger range based on the actual record length if we have it
+                retry_length = 2 * length
+                if record is not None and record.headers.get('Content-Length', '').isdigit():
+                    retry_length = max(retry_length,
+                                       int(record.headers['Content-Length']) + settings.WARC_RECORD_HEADER_SLACK)
+                logger.debug('Short WARC read at %s:%s, retrying with %s bytes.', obj_name, start_offset, retry_length)
+                record, payload, _ = self._fetch_warc_record(
+                    bucket_name, obj_name, start_offset, retry_length, parse_http)
+                if record is None:
+                    logger.error('Could not read WARC record at position %s.', start_offset)
+                    return
+
+            self._warc_record = record
+            self._doc_bytes = payload
             self._doc_found = True
 
             self._html_tree = None
-            if self._meta_doc.http_content_type and self._meta_doc.http_content_type in (
-                    'text/html', 'application/xhtml+xml'):
-                self._html_tree = HTMLTree.parse_from_bytes(self._doc_bytes, self._meta_doc.content_encoding)
-                self._raw_doc_content_type = 'text/html'
-            elif self._meta_doc.http_content_type and self._meta_doc.http_content_type.endswith('/json'):
-                self._meta_doc.http_content_type = 'application/json'
-            elif self._meta_doc.http_content_type:
-                self._raw_doc_content_type = self._meta_doc.http_content_type
+            self._head_tree = None
+            self._set_raw_doc_content_type()
+            # HTML is only parsed on first access, raw requests never need a DOM
+            self._has_html = self._raw_doc_content_type == 'text/html'
 
         except StopIteration:
             logger.error('End of WARC reached when trying to read position %s.', start_offset)
@@ -251,21 +641,37 @@ class CacheDocument:
             return None
 
         body = self._doc_bytes
-        if self._html_tree:
-            if main_content:
-                body = extract_plain_text(self._html_tree, preserve_formatting='minimal_html' if minimal_html else True,
-                                          main_content=True, alt_texts=True)
-            elif not raw_html:
-                body = self._post_process_html(self._html_tree)
-
-            # ClueWeb09 messed up the encoding of many pages, so strip Unicode replacement characters
-            if self._is_clueweb09:
-                body = (body.replace('\ufffd', '')
-                        if type(body) is str else body.replace(b'\xef\xbf\xbd', b''))
+        if not self._has_html:
+            return bytes_to_str(body, self._meta_doc.content_encoding)
+
+        if raw_html and not main_content:
+            return _strip_replacement_chars(body) if self._is_clueweb09 else body
+
+        rewriter = None
+        if not main_content:
+            rewriter = CacheUrlRewriter(self._meta_doc.warc_target_uri, self._doc_index.shorthand_name,
+                                        self._rewrite_auth_credential, settings.CACHE_FRONTEND_URL,
+                                        resolve_outlinks=settings.CACHE_RESOLVE_OUTLINKS)
+
+        if get_render_pool() is None:
+            html = self._get_html_tree()
+        elif self._jsonl_doc is not None:
+            html = self._jsonl_to_html(self._jsonl_doc)
+        else:
+            html = self._doc_bytes
 
-            return body
+        # Parsing and rendering may be offloaded to the render pool, which raises RenderPoolError on failure
+        body, outlinks = run_in_render_pool(_render_html, html, self._meta_doc.content_encoding,
+                                            main_content, minimal_html, rewriter, self._is_clueweb09)
+        if outlinks:
+            body = rewriter.insert_outlinks(body, outlinks, self._doc_index.resolve_warc_target_uris)
+        return body
 
-        return bytes_to_str(body, self._meta_doc.content_encoding)
+    def doc_found(self):
+        """
+        :return: True if the document record was read successfully
+        """
+        return self._doc_found
 
     def raw_doc_content_type(self):
         return self._raw_doc_content_type
@@ -280,7 +686,7 @@ class CacheDocument:
 
     def is_html_fragment(self):
         """Document is an HTML fragment (MS MARCO etc.)."""
-        return not self.is_html() and self._html_tree
+        return not self.is_html() and self._has_html
 
     def is_json(self):
         """Document is JSON."""
@@ -330,19 +736,24 @@ class CacheDocument:
         return self._read_doc_content(main_content=True, minimal_html=minimal_html)
 
     def html_title(self):
-        if not self._html_tree:
+        if self._jsonl_doc is not None:
+            return self._jsonl_title(self._jsonl_doc) or ''
+        head_tree = self._get_head_tree()
+        if not head_tree:
             return ''
-        return self._html_tree.title
+        return head_tree.title
 
     def html_meta_viewport(self):
-        if not self._html_tree:
+        head_tree = self._get_head_tree()
+        if not head_tree or not head_tree.head:
             return None
-        el = self._html_tree.head.query_selector('meta[name="viewport"]')
+        el = head_tree.head.query_selector('meta[name="viewport"]')
         if not el:
             return None
         return el.getattr('content')
 
-    def _post_process_html(self, html_tree):
+    @staticmethod
+    def _post_process_html(html_tree, rewriter):
         """
         Post-process HTML by rewriting links in an HTML document and updating encoding information.
 
@@ -350,23 +761,13 @@ class CacheDocument:
         Images and embeds are replaced with their direct absolute URLs.
 
         :param html_tree: Resiliparse HTML tree
-        :return: modified HTML
+        :param rewriter: :class:`CacheUrlRewriter` for the document
+        :return: tuple of modified HTML and deferred outlinks (see :meth:`CacheUrlRewriter.rewrite_links`)
         """
         if not html_tree.body:
-            return ''
+            return '', []
 
-        for a in html_tree.body.query_selector_all('a[href], area[href]'):
-            a['href'] = self._rewrite_url(a['href'], self._meta_doc.warc_target_uri, False)
-
-        for link in html_tree.body.query_selector_all('link[href]'):
-            link['href'] = self._rewrite_url(link['href'], self._meta_doc.warc_target_uri, True)
-
-        for embed in html_tree.body.query_selector_all(
-                'img[src], script[src], iframe[src], video[src], audio[src], input[type=image][src]'):
-            embed['src'] = self._rewrite_url(embed['src'], self._meta_doc.warc_target_uri, True)
-
-        for obj in html_tree.body.query_selector_all('object[data]'):
-            obj['data'] = self._rewrite_url(obj['data'], self._meta_doc.warc_target_uri, True)
+        outlinks = rewriter.rewrite_links(html_tree.body)
 
         # Add HTML head elements (find or create head first)
         head = html_tree.head
@@ -394,51 +795,211 @@ class CacheDocument:
         if meta_enc:
             meta_enc['content'] = re.sub(r'charset=[\w-]+', 'charset=utf-8', meta_enc['content'])
 
-        return html_tree.document.html
+        return html_tree.document.html, outlinks
+
+
+def _strip_replacement_chars(body):
+    """Strip Unicode replacement characters (ClueWeb09 messed up the encoding of many pages)."""
+    return body.replace('\ufffd', '') if type(body) is str else body.replace(b'\xef\xbf\xbd', b'')
+
+
+def _render_html(html, encoding, main_content, minimal_html, rewriter, strip_replacement_chars):
+    """
+    Parse and render an HTML document. This function may run in a render pool worker process.
+
+    :param html: HTML tree, HTML bytes, or HTML string
+    :param encoding: encoding of HTML bytes
+    :param main_content: return only textual main content with minimal HTML formatting
+    :param minimal_html: use minimal HTML formatting for main content extraction
+    :param rewriter: :class:`CacheUrlRewriter` for post-processing HTML (ignored if ``main_content`` is set)
+    :param strip_replacement_chars: strip Unicode replacement characters from the result
+    :return: tuple of rendered body and deferred outlinks
+    """
+    if isinstance(html, bytes):
+        html = HTMLTree.parse_from_bytes(html, encoding)
+    elif isinstance(html, str):
+        html = HTMLTree.parse(html)
+
+    outlinks = []
+    if main_content:
+        body = extract_plain_text(html, preserve_formatting='minimal_html' if minimal_html else True,
+                                  main_content=True, alt_texts=True)
+    else:
+        body, outlinks = CacheDocument._post_process_html(html, rewriter)
+
+    if strip_replacement_chars:
+        body = _strip_replacement_chars(body)
+    return body, outlinks
+
+
+class CacheUrlRewriter:
+    """
+    Rewrite URLs in a cached document to point to the cache endpoint proxy.
+
+    The document base URL, cache URL prefix, and credential suffix are prepared once per document,
+    so rewriting a link is only a single URL parse.
+
+    If outlink resolution is enabled, outlinks are replaced with placeholders and resolved in one batch
+    after the document has been serialized (see :meth:`insert_outlinks`). Archived outlinks point
+    directly to the cached document's UUID and all others point to the live web. Placeholders carry
+    a random per-rewriter nonce, so placeholder-like text in the page itself is never replaced.
+    Rewriters hold no references to Django or Elasticsearch state, so they can be passed to render
+    pool workers.
+    """
+
+    _LINK_SELECTOR = ('a[href], area[href], link[href], img[src], script[src], iframe[src], video[src], audio[src], '
+                      'input[type=image][src], object[data]')
+
+    # Link attribute and whether to add the "raw" parameter for each element matched by _LINK_SELECTOR
+    _LINK_ATTRS = {
+        'a': ('href', False),
+        'area': ('href', False),
+        'link': ('href', True),
+        'img': ('src', True),
+        'script': ('src', True),
+        'iframe': ('src', True),
+        'video': ('src', True),
+        'audio': ('src', True),
+        'input': ('src', True),
+        'object': ('data', True),
+    }
+
+    _OUTLINK_PLACEHOLDER = '__CHATNOIR_OUTLINK_{}_{}__'
+
+    def __init__(self, source_base, index_shorthand, auth_credential=None, cache_url=None, resolve_outlinks=False):
+        """
+        :param source_base: absolute source base URL for resolving relative URLs
+        :param index_shorthand: index shorthand name for the rewritten cache URLs
+        :param auth_credential: optional auth credential to add to the rewritten URLs
+        :param cache_url: cache frontend URL (default: ``settings.CACHE_FRONTEND_URL``)
+        :param resolve_outlinks: defer outlinks for batch resolution with :meth:`insert_outlinks`
+        """
+        self._source_base = source_base
+        self._base_parts = urlparse.urlparse(source_base)
+        base_dir = self._base_parts.path
+        if not base_dir.endswith('/'):
+            base_dir = posixpath.dirname(base_dir)
+        self._base_dir = base_dir or '/'
+
+        cache_url = cache_url or settings.CACHE_FRONTEND_URL
+        self._prefix = f'{cache_url}?index={index_shorthand}&url='
+        self._uuid_prefix = f'{cache_url}?index={index_shorthand}&uuid='
+        self._resolve_outlinks = resolve_outlinks
+        self._outlink_nonce = secrets.token_hex(8)
+        self._outlink_placeholder_regex = re.compile(
+            self._OUTLINK_PLACEHOLDER.format(self._outlink_nonce, r'(\d+)'))
+        self._suffix = f'&apikey={urlparse.quote(auth_credential)}' if auth_credential else ''
+        self._raw_suffix = self._suffix + '&raw'
+        self._rewritten = {}
+
+    def rewrite_links(self, node):
+        """
+        Rewrite all links and embeds below a DOM node in a single pass.
+
+        If outlink resolution is enabled, anchor targets are replaced with placeholders instead.
+
+        :param node: Resiliparse DOM node
+        :return: list of deferred absolute outlink URLs, indexed by placeholder number
+        """
+        outlinks = []
+        outlink_ids = {}
+        for el in node.query_selector_all(self._LINK_SELECTOR):
+            attr, raw = self._LINK_ATTRS[el.tag]
+            if raw or not self._resolve_outlinks:
+                el[attr] = self.rewrite(el[attr], raw)
+                continue
+
+            url, rewrite = self._resolve(el[attr])
+            if not rewrite:
+                el[attr] = url
+                continue
+            if url not in outlink_ids:
+                outlink_ids[url] = len(outlinks)
+                outlinks.append(url)
+            el[attr] = self._OUTLINK_PLACEHOLDER.format(self._outlink_nonce, outlink_ids[url])
+        return outlinks
+
+    def insert_outlinks(self, html, outlinks, outlink_resolver):
+        """
+        Resolve deferred outlinks in one batch and replace their placeholders in a serialized document.
+
+        :param html: serialized HTML returned after :meth:`rewrite_links`
+        :param outlinks: deferred outlinks returned by :meth:`rewrite_links`
+        :param outlink_resolver: callable that maps an iterable of absolute URLs to a dict of
+                                 archived URLs and their document UUIDs
+        :return: HTML with resolved outlinks
+        """
+        try:
+            archived = outlink_resolver(outlinks)
+            resolved = [''.join((self._uuid_prefix, urlparse.quote(archived[url]), self._suffix))
+                        if url in archived else url for url in outlinks]
+        except Exception as e:
+            logger.warning('Could not resolve outlinks of %s: %s', self._source_base, e)
+            resolved = [self._cache_url(url, False) for url in outlinks]
+
+        def repl(m):
+            i = int(m.group(1))
+            return html_escape(resolved[i]) if i < len(resolved) else m.group(0)
+
+        return self._outlink_placeholder_regex.sub(repl, html)
 
-    def _rewrite_url(self, input_url, source_base, raw=False):
+    def rewrite(self, input_url, raw=False):
         """
-        Resolve a relative URI to an absolute URI.
-        If `relative_url` is already absolute (i.e. with schema and network location), it's returned unchanged.
+        Resolve a relative URL against the document base URL and rewrite it to a cache URL.
 
-        :param input_url: relative URI
-        :param source_base: absolute source base URL for resolving `relative_url`
+        Fragment-only URLs and URLs with unsafe protocol prefixes are returned unchanged.
+
+        :param input_url: absolute or relative URL
         :param raw: add "raw" parameter to rewritten URL
-        :return: rewritten URI
+        :return: rewritten URL
         """
+        key = (input_url, raw)
+        if key not in self._rewritten:
+            self._rewritten[key] = self._rewrite(input_url, raw)
+        return self._rewritten[key]
+
+    def _rewrite(self, input_url, raw):
+        url, rewrite = self._resolve(input_url)
+        if not rewrite:
+            return url
+        return self._cache_url(url, raw)
 
+    def _cache_url(self, url, raw):
+        return ''.join((self._prefix, urlparse.quote(url), self._raw_suffix if raw else self._suffix))
+
+    def _resolve(self, input_url):
+        """
+        Resolve a URL against the document base URL.
+
+        :param input_url: absolute or relative URL
+        :return: tuple of resolved URL and whether it should be rewritten to point to the cache
+        """
         input_url = input_url.strip()
 
         # Return relative fragment URLs as is
         if input_url.startswith('#'):
-            return input_url
+            return input_url, False
 
         # Turn effectively relative fragment URLs into actual fragments
-        if input_url.startswith(source_base) and input_url[len(source_base):].startswith('#'):
-            return input_url[len(source_base):]
+        if input_url.startswith(self._source_base) and input_url[len(self._source_base):].startswith('#'):
+            return input_url[len(self._source_base):], False
 
-        base_url_parts = urlparse.urlparse(source_base)
         target_url_parts = urlparse.urlparse(input_url)
         repl = {}
         if not target_url_parts.scheme:
-            repl['scheme'] = base_url_parts.scheme
-        elif target_url_parts.scheme not in ['https', 'http']:
+            repl['scheme'] = self._base_parts.scheme
+        elif target_url_parts.scheme not in ('https', 'http'):
             # Do not rewrite unsafe protocol prefixes
-            return input_url
+            return input_url, False
 
         if not target_url_parts.netloc:
-            repl['netloc'] = base_url_parts.netloc
-
-        if not target_url_parts.path.startswith('/'):
-            base_path = base_url_parts.path
-            if not base_path.endswith('/'):
-                base_path = os.path.dirname(base_path)
-            repl['path'] = os.path.abspath(os.path.join(base_path, target_url_parts.path))
-
-        new_url = urlparse.urlunparse(target_url_parts._replace(**repl))
-        new_url = f'{settings.CACHE_FRONTEND_URL}?index={self._doc_index.shorthand_name}&url={urlparse.quote(new_url)}'
-        if self._rewrite_auth_credential:
-            new_url += f'&apikey={urlparse.quote(self._rewrite_auth_credential)}'
-        if raw:
-            new_url += '&raw'
-        return new_url
+            repl['netloc'] = self._base_parts.netloc
+            path = target_url_parts.path
+            if not path:
+                repl['path'] = self._base_parts.path
+            elif not path.startswith('/'):
+                repl['path'] = posixpath.normpath(posixpath.join(self._base_dir, path))
+                if path.endswith('/') and not repl['path'].endswith('/'):
+                    repl['path'] += '/'
+
+        return urlparse.urlunparse(target_url_parts._replace(**repl)), True
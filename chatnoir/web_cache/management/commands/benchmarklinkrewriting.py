@@ -0,0 +1,74 @@
+import glob
+import os
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from resiliparse.parse.html import HTMLTree
+
+from web_cache.cache import CacheUrlRewriter
+
+
+class Command(BaseCommand):
+    help = 'Benchmark cache link rewriting on a corpus of saved HTML pages.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('corpus', help='Directory with saved HTML pages (*.html, *.htm).')
+        parser.add_argument(
+            '--base-url',
+            default='https://example.com/path/page.html',
+            help='Base URL for resolving relative links (default: https://example.com/path/page.html).',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Number of times to rewrite each page (default: 5).',
+        )
+        parser.add_argument(
+            '--credential',
+            default='__CHATNOIR_AUTH_CREDENTIAL__',
+            help='Auth credential to add to rewritten links.',
+        )
+
+    def handle(self, *args, **options):
+        files = sorted(glob.glob(os.path.join(options['corpus'], '*.htm*')))
+        if not files:
+            raise CommandError(f'No HTML pages found in {options["corpus"]}')
+
+        page_times = []
+        parse_time = 0.0
+        num_links = 0
+        for file in files:
+            with open(file, 'rb') as f:
+                html_bytes = f.read()
+
+            best = None
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                tree = HTMLTree.parse_from_bytes(html_bytes)
+                parse_time += time.perf_counter() - start
+                if not tree.body:
+                    break
+
+                start = time.perf_counter()
+                rewriter = CacheUrlRewriter(options['base_url'], 'bench', options['credential'])
+                rewriter.rewrite_links(tree.body)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+
+            if best is not None:
+                page_times.append(best)
+                num_links += len(tree.body.query_selector_all(CacheUrlRewriter._LINK_SELECTOR))
+
+        if not page_times:
+            raise CommandError('No pages with a body found.')
+
+        total = sum(page_times)
+        self.stdout.write(f'Pages:              {len(page_times)}')
+        self.stdout.write(f'Links:              {num_links}')
+        self.stdout.write(f'Parse time (total): {parse_time * 1000:.2f} ms')
+        self.stdout.write(f'Rewrite time:       {total * 1000:.2f} ms (best of {options["repeat"]} per page)')
+        self.stdout.write(f'Median per page:    {statistics.median(page_times) * 1000:.3f} ms')
+        self.stdout.write(f'Max per page:       {max(page_times) * 1000:.3f} ms')
+        self.stdout.write(f'Links per second:   {num_links / total if total else 0:.0f}')
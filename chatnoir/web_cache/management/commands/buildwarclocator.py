@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from elasticsearch_dsl import connections, Search
+
+from chatnoir_search.elastic_backend import SearchIndex
+from chatnoir_search.warc_locator import WarcRecordLocator
+
+
+class Command(BaseCommand):
+    help = 'Build a local WARC record locator file for an index from its WARC meta index.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('index', help='Index shorthand name.')
+        parser.add_argument(
+            '--output',
+            help='Output file (default: the "warc_locator" path configured for the index).',
+        )
+        parser.add_argument(
+            '--run-size',
+            type=int,
+            default=5000000,
+            help='Number of keys to sort in memory before spilling to disk (default: 5000000).',
+        )
+
+    def handle(self, *args, **options):
+        if options['index'] not in settings.SEARCH_INDICES:
+            raise CommandError(f'No such index: {options["index"]}')
+
+        search_index = SearchIndex(options['index'])
+        output = options['output'] or search_index.warc_locator_path
+        if not output:
+            raise CommandError('No output file given and no "warc_locator" path configured for the index.')
+
+        if 'default' not in connections.connections._conns:
+            connections.configure(default=settings.ELASTICSEARCH_PROPERTIES)
+
+        fields = [f for f in SearchIndex.WarcMetaDocBase._doc_type.mapping if f != 'takedown']
+        search = (Search()
+                  .index(search_index.warc_index_name)
+                  .source(fields)
+                  .params(size=5000, preserve_order=False))
+
+        def hits():
+            for i, hit in enumerate(search.scan()):
+                if i and i % 1000000 == 0:
+                    self.stdout.write(f'{i} records read...')
+                yield hit.meta.id, hit.to_dict()
+
+        num_records = WarcRecordLocator.build(output, hits(), run_size=options['run_size'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {num_records} record(s) to {output}.'))
@@ -0,0 +1,213 @@
+# Copyright 2026 Janek Bevendorff
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import fcntl
+from hashlib import sha256
+import logging
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
+from urllib import parse
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class RenderCache:
+    """
+    Local disk cache for post-processed web cache documents with size-bounded LRU eviction.
+
+    Entries are keyed on (index, document UUID, render mode) and can be shared by all worker processes
+    on a host. Rendered bodies must not contain per-user credentials, so rewritten links are rendered
+    with :attr:`AUTH_CREDENTIAL_PLACEHOLDER`, which is replaced with the actual credential on delivery
+    (see :meth:`insert_auth_credential`).
+    """
+
+    MODES = ('raw', 'html', 'minimal', 'plain')
+    AUTH_CREDENTIAL_PLACEHOLDER = '__CHATNOIR_AUTH_CREDENTIAL__'
+
+    _AUTH_CREDENTIAL_PARAM_REGEX = re.compile(r'&(?:amp;)?apikey=' + AUTH_CREDENTIAL_PLACEHOLDER)
+
+    """Interval in seconds after which writes trigger an eviction sweep."""
+    SWEEP_INTERVAL = 60
+
+    def __init__(self, cache_dir, max_size, max_entry_size):
+        """
+        :param cache_dir: cache directory
+        :param max_size: maximum total cache size in bytes
+        :param max_entry_size: maximum size of a single entry in bytes
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.max_entry_size = max_entry_size
+        self._bytes_since_sweep = 0
+        self._last_sweep = time.monotonic()
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, index, doc_uuid, mode):
+        if mode not in self.MODES:
+            raise ValueError(f'Invalid render mode "{mode}"')
+        h = sha256(f'{index}\0{doc_uuid}'.encode()).hexdigest()
+        return os.path.join(self.cache_dir, h[:2], f'{h}.{mode}')
+
+    def get(self, index, doc_uuid, mode):
+        """
+        Get a cached rendered document.
+
+        :param index: index shorthand
+        :param doc_uuid: document UUID
+        :param mode: render mode (one of :attr:`MODES`)
+        :return: cached entry dict or ``None``
+        """
+        path = self._path(index, doc_uuid, mode)
+        try:
+            with open(path, 'rb') as f:
+                entry = pickle.load(f)
+            # Update modification time for LRU eviction
+            os.utime(path)
+            return entry
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, pickle.UnpicklingError) as e:
+            logger.warning('Could not read render cache entry %s: %s', path, e)
+            return None
+
+    def set(self, index, doc_uuid, mode, entry):
+        """
+        Add a rendered document to the cache.
+
+        Entries larger than the configured maximum entry size are skipped.
+
+        :param index: index shorthand
+        :param doc_uuid: document UUID
+        :param mode: render mode (one of :attr:`MODES`)
+        :param entry: entry dict
+        """
+        data = pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_entry_size:
+            return
+
+        path = self._path(index, doc_uuid, mode)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.', suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning('Could not write render cache entry %s: %s', path, e)
+            return
+
+        with self._lock:
+            self._bytes_since_sweep += len(data)
+            if self._bytes_since_sweep < self.max_size // 100 \
+                    and time.monotonic() - self._last_sweep < self.SWEEP_INTERVAL:
+                return
+            self._bytes_since_sweep = 0
+            self._last_sweep = time.monotonic()
+        self.evict()
+
+    def invalidate(self, index, doc_uuid):
+        """
+        Remove all cached render modes of a document.
+
+        :param index: index shorthand
+        :param doc_uuid: document UUID
+        """
+        for mode in self.MODES:
+            try:
+                os.unlink(self._path(index, doc_uuid, mode))
+            except FileNotFoundError:
+                pass
+
+    def evict(self):
+        """
+        Evict least recently used entries until the cache is below 90% of its maximum size.
+
+        Only one process sweeps the cache directory at a time. Other processes skip the sweep.
+        """
+        with open(os.path.join(self.cache_dir, '.lock'), 'wb') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+
+            entries = []
+            total_size = 0
+            for shard in os.scandir(self.cache_dir):
+                if not shard.is_dir():
+                    continue
+                for e in os.scandir(shard.path):
+                    try:
+                        stat = e.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, e.path))
+                    total_size += stat.st_size
+
+            if total_size <= self.max_size:
+                return
+
+            entries.sort()
+            target_size = self.max_size * 9 // 10
+            for _, size, path in entries:
+                if total_size <= target_size:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                total_size -= size
+
+    @classmethod
+    def insert_auth_credential(cls, body, auth_credential):
+        """
+        Replace the credential placeholder in a rendered body with an actual credential.
+
+        :param body: rendered body
+        :param auth_credential: auth credential or ``None`` to remove the credential parameter
+        :return: body with credential
+        """
+        if not isinstance(body, str) or cls.AUTH_CREDENTIAL_PLACEHOLDER not in body:
+            return body
+        if not auth_credential:
+            return cls._AUTH_CREDENTIAL_PARAM_REGEX.sub('', body)
+        return body.replace(cls.AUTH_CREDENTIAL_PLACEHOLDER, parse.quote(auth_credential))
+
+
+_RENDER_CACHE = None
+_RENDER_CACHE_LOCK = threading.Lock()
+
+
+def get_render_cache():
+    """
+    Get the configured render cache.
+
+    :return: :class:`RenderCache` instance or ``None`` if ``settings.RENDER_CACHE_DIR`` is not set
+    """
+    global _RENDER_CACHE
+    if _RENDER_CACHE is not None or not settings.RENDER_CACHE_DIR:
+        return _RENDER_CACHE
+
+    with _RENDER_CACHE_LOCK:
+        if _RENDER_CACHE is None:
+            _RENDER_CACHE = RenderCache(settings.RENDER_CACHE_DIR,
+                                        settings.RENDER_CACHE_MAX_SIZE,
+                                        settings.RENDER_CACHE_MAX_ENTRY_SIZE)
+    return _RENDER_CACHE
@@ -0,0 +1,204 @@
+# Copyright 2026 Janek Bevendorff
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import weakref
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class RenderPoolError(Exception):
+    """Document could not be rendered in the render pool (pool busy, timeout, or worker crash)."""
+
+
+_RENDER_POOL = None
+_RENDER_POOL_PID = None
+_RENDER_POOL_SLOTS = None
+_RENDER_POOL_FREE_SLOTS = None   # Indices of free slots in the task start time array
+_RENDER_POOL_TASK_STARTS = None  # Start times of running tasks per slot (0 if not started), shared with workers
+_RENDER_POOL_LOCK = threading.Lock()
+# Pools that were terminated because of a timeout, whose other tasks may be retried
+_TIMED_OUT_POOLS = weakref.WeakSet()
+
+# Seconds between checks whether a queued task has started
+_QUEUE_POLL_INTERVAL = 0.1
+
+# Task start time array of a render pool worker process
+_WORKER_TASK_STARTS = None
+
+
+def _reset_render_pool():
+    """Reset render pool in forked child processes."""
+    global _RENDER_POOL, _RENDER_POOL_PID, _RENDER_POOL_SLOTS, _RENDER_POOL_FREE_SLOTS, \
+        _RENDER_POOL_TASK_STARTS, _RENDER_POOL_LOCK
+    _RENDER_POOL = None
+    _RENDER_POOL_PID = None
+    _RENDER_POOL_SLOTS = None
+    _RENDER_POOL_FREE_SLOTS = None
+    _RENDER_POOL_TASK_STARTS = None
+    _RENDER_POOL_LOCK = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_render_pool)
+
+
+def _init_render_worker(task_starts):
+    global _WORKER_TASK_STARTS
+    _WORKER_TASK_STARTS = task_starts
+
+
+def _run_render_task(slot, fn, args):
+    """Record the start time of a task in the worker process and run it."""
+    _WORKER_TASK_STARTS[slot] = time.time()
+    return fn(*args)
+
+
+def get_render_pool():
+    """
+    Get the worker process pool of the current process for parsing and rendering cache documents.
+
+    Workers are started from a fork server, since forking a multi-threaded uwsgi worker is unsafe.
+
+    :return: :class:`ProcessPoolExecutor` or ``None`` if ``settings.CACHE_RENDER_POOL_WORKERS`` is 0
+    """
+    global _RENDER_POOL, _RENDER_POOL_PID, _RENDER_POOL_SLOTS, _RENDER_POOL_FREE_SLOTS, _RENDER_POOL_TASK_STARTS
+    if not settings.CACHE_RENDER_POOL_WORKERS:
+        return None
+    if _RENDER_POOL is not None and _RENDER_POOL_PID == os.getpid():
+        return _RENDER_POOL
+
+    with _RENDER_POOL_LOCK:
+        if _RENDER_POOL is None or _RENDER_POOL_PID != os.getpid():
+            mp_context = multiprocessing.get_context('forkserver')
+            if _RENDER_POOL_SLOTS is None:
+                num_slots = settings.CACHE_RENDER_POOL_WORKERS + settings.CACHE_RENDER_POOL_MAX_QUEUED
+                _RENDER_POOL_SLOTS = threading.BoundedSemaphore(num_slots)
+                _RENDER_POOL_FREE_SLOTS = list(range(num_slots))
+                _RENDER_POOL_TASK_STARTS = mp_context.Array('d', num_slots, lock=False)
+
+            pool_kwargs = {}
+            if sys.version_info >= (3, 11):
+                # Not supported before Python 3.11, where workers are never replaced
+                pool_kwargs['max_tasks_per_child'] = settings.CACHE_RENDER_POOL_MAX_TASKS_PER_CHILD
+            _RENDER_POOL = ProcessPoolExecutor(
+                max_workers=settings.CACHE_RENDER_POOL_WORKERS,
+                mp_context=mp_context,
+                initializer=_init_render_worker,
+                initargs=(_RENDER_POOL_TASK_STARTS,),
+                **pool_kwargs)
+            _RENDER_POOL_PID = os.getpid()
+    return _RENDER_POOL
+
+
+def _terminate_render_pool(pool, timed_out=False):
+    """Kill the workers of a render pool (running tasks cannot be cancelled otherwise)."""
+    global _RENDER_POOL
+    with _RENDER_POOL_LOCK:
+        if _RENDER_POOL is pool:
+            _RENDER_POOL = None
+        if timed_out:
+            _TIMED_OUT_POOLS.add(pool)
+
+    if hasattr(pool, 'terminate_workers'):
+        pool.terminate_workers()
+        return
+    for p in list((getattr(pool, '_processes', None) or {}).values()):
+        p.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _wait_for_render_task(pool, slot, fn, args):
+    """
+    Submit a task to the render pool and wait for its result.
+
+    Only the execution of the task counts towards ``settings.CACHE_RENDER_TIMEOUT``. Tasks that do not start
+    within the same time are cancelled, but do not cause a restart of the pool.
+    """
+    timeout = settings.CACHE_RENDER_TIMEOUT
+    task_starts = _RENDER_POOL_TASK_STARTS
+    task_starts[slot] = 0.0
+    future = pool.submit(_run_render_task, slot, fn, args)
+    queue_deadline = time.time() + timeout
+    while True:
+        started = task_starts[slot]
+        if started:
+            wait = started + timeout - time.time()
+        else:
+            wait = min(queue_deadline - time.time(), _QUEUE_POLL_INTERVAL)
+        try:
+            return future.result(timeout=max(0.0, wait))
+        except FutureTimeoutError:
+            pass
+
+        started = task_starts[slot]
+        if started and time.time() >= started + timeout:
+            logger.warning('Rendering timed out after %s seconds, restarting render pool.', timeout)
+            _terminate_render_pool(pool, timed_out=True)
+            raise RenderPoolError('Render timeout.')
+        # Tasks that are about to start cannot be cancelled anymore, keep waiting for those
+        if not started and time.time() >= queue_deadline and future.cancel():
+            raise RenderPoolError('Render pool busy.')
+
+
+def run_in_render_pool(fn, *args):
+    """
+    Run a function in the render pool and wait for its result.
+
+    If the render pool is disabled, the function is run directly in the calling thread. Otherwise, at most
+    ``CACHE_RENDER_POOL_WORKERS + CACHE_RENDER_POOL_MAX_QUEUED`` tasks are submitted at a time and each task
+    must finish within ``settings.CACHE_RENDER_TIMEOUT`` seconds after it started. A process pool cannot lose
+    a single worker without breaking, so the pool is restarted if a task times out, which ensures pathological
+    documents cannot block a worker indefinitely. Other tasks killed with it are retried once in the new pool.
+
+    :param fn: picklable module-level function
+    :param args: picklable function arguments
+    :return: function result
+    :raises RenderPoolError: if the pool is busy, the task timed out, or a worker crashed
+    """
+    pool = get_render_pool()
+    if pool is None:
+        return fn(*args)
+
+    slots = _RENDER_POOL_SLOTS
+    if not slots.acquire(timeout=settings.CACHE_RENDER_TIMEOUT):
+        raise RenderPoolError('Render pool busy.')
+    with _RENDER_POOL_LOCK:
+        slot = _RENDER_POOL_FREE_SLOTS.pop()
+    try:
+        for attempt in range(2):
+            try:
+                return _wait_for_render_task(pool, slot, fn, args)
+            except RuntimeError as e:
+                if attempt == 0 and pool in _TIMED_OUT_POOLS:
+                    # Pool was restarted because another task timed out
+                    pool = get_render_pool()
+                    continue
+                if isinstance(e, BrokenProcessPool):
+                    _terminate_render_pool(pool)
+                    raise RenderPoolError('Render pool worker crashed.') from e
+                # Pool was shut down by a concurrent timeout
+                raise RenderPoolError('Render pool restarting.') from e
+    finally:
+        with _RENDER_POOL_LOCK:
+            _RENDER_POOL_FREE_SLOTS.append(slot)
+        slots.release()
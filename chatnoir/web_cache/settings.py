@@ -41,6 +41,34 @@ S3_ENDPOINT_PROPERTIES = {
     "aws_secret_access_key": "secret_key"
 }
 
+# S3 client connection pool, retry, and timeout settings (passed to botocore.config.Config)
+S3_CLIENT_CONFIG = {
+    'max_pool_connections': 32,
+    'connect_timeout': 5,
+    'read_timeout': 30,
+    'retries': {
+        'max_attempts': 3,
+        'mode': 'standard'
+    },
+    'tcp_keepalive': True
+}
+
+# Number of bytes to fetch in addition to a WARC record's content length to account for WARC headers
+WARC_RECORD_HEADER_SLACK = 16384
+
+# Minimum record content length in bytes above which raw cache documents are streamed instead of buffered
+CACHE_STREAMING_MIN_SIZE = 1024 * 1024
+
+# Worker processes per uwsgi process for parsing and rendering cache documents (0 to render in request threads)
+CACHE_RENDER_POOL_WORKERS = 0
+# Maximum number of documents waiting for a free render worker
+CACHE_RENDER_POOL_MAX_QUEUED = 16
+# Number of documents after which a render worker is replaced (Python 3.11+, ignored on older versions)
+CACHE_RENDER_POOL_MAX_TASKS_PER_CHILD = 1000
+# Seconds after which rendering a document is aborted and the raw document is served instead (time waiting
+# for a free render worker is not counted, but documents waiting longer than this are served raw as well)
+CACHE_RENDER_TIMEOUT = 20
+
 # Public URL of search frontend
 SEARCH_FRONTEND_URL = None
 
@@ -13,12 +13,13 @@
 # limitations under the License.
 
 import base64
+import logging
 import re
 from urllib import parse
 import uuid
 
 from django.conf import settings
-from django.http import Http404, HttpResponseRedirect, HttpResponse, JsonResponse
+from django.http import Http404, HttpResponseRedirect, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
 from django.utils.encoding import iri_to_uri
 from django.views.decorators.http import require_safe
@@ -29,6 +30,10 @@ from chatnoir_frontend.error_views import permission_denied
 from chatnoir_search.elastic_backend import get_index
 from elasticsearch_dsl import connections, Search
 from .cache import CacheDocument
+from .render_cache import RenderCache, get_render_cache
+from .render_pool import RenderPoolError
+
+logger = logging.getLogger(__name__)
 
 
 def bool_param_set(param_name, param_dict):
@@ -45,6 +50,7 @@ _URLSAFE_B64_UUID_REGEX = re.compile(r'^[a-zA-Z0-9_-]{22}$')
 _CLUEWEB_TREC_ID_REGEX = re.compile(r'^clueweb[0-9]{2}-[a-z0-9-]{6}-[0-9]{2}-[0-9]{5}$')
 _MS_MARCO_TREC_ID_REGEX = re.compile(r'^msmarco_.*$')
 _LEGACY_UUID_REGEX = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$')
+_BYTE_RANGE_REGEX = re.compile(r'^bytes=(\d*)-(\d*)$')
 
 
 def normalize_doc_id_str(doc_id):
@@ -105,10 +111,7 @@ def api_key_has_required_roles(api_key, required_roles):
     if required_roles is None:
         return True
 
-    for role in api_key.roles.values('role'):
-        if role['role'] in [*required_roles, settings.API_ADMIN_ROLE]:
-            return True
-    return False
+    return not api_key.role_names.isdisjoint([*required_roles, settings.API_ADMIN_ROLE])
 
 
 # noinspection PyProtectedMember
@@ -130,23 +133,26 @@ def cache(request):
     # Reuse existing token credential if available, otherwise mint new token
     auth_credential = getattr(auth_info[1], '_auth_credential', None)
     if not getattr(auth_info[1], '_auth_via_signature', False):
-        signed_apikey, _ = ApiKeyAuthentication.create_signed_apikey_token(auth_info[1], validity=7200)
+        signed_apikey, _ = ApiKeyAuthentication.get_signed_apikey_token(auth_info[1], validity=7200)
         if signed_apikey:
             auth_credential = signed_apikey
-    cache_doc = CacheDocument(auth_credential)
+    # Rendered documents are cached without credentials, which are inserted on delivery
+    render_cache = get_render_cache()
+    cache_doc = CacheDocument(RenderCache.AUTH_CREDENTIAL_PLACEHOLDER if render_cache else auth_credential)
     found = False
     try:
         if request.GET.get('uuid'):
-            found = cache_doc.retrieve_by_filter(search_index, uuid=normalize_doc_id_str(request.GET['uuid']))
+            found = cache_doc.retrieve_by_filter(
+                search_index, meta_only=True, uuid=normalize_doc_id_str(request.GET['uuid']))
         elif request.GET.get('trec-id'):
             found = cache_doc.retrieve_by_filter(
-                search_index, warc_trec_id=normalize_doc_id_str(request.GET['trec-id']))
+                search_index, meta_only=True, warc_trec_id=normalize_doc_id_str(request.GET['trec-id']))
         elif request.GET.get('url'):
             if not request.GET['url'].startswith('https://') and not request.GET['url'].startswith('http://'):
                 # Do not redirect to unsafe URLs
                 raise Http404
 
-            found = cache_doc.retrieve_by_filter(search_index, warc_target_uri=request.GET['url'])
+            found = cache_doc.retrieve_by_filter(search_index, meta_only=True, warc_target_uri=request.GET['url'])
             if not found:
                 if raw_mode and request.META.get('HTTP_REFERER', '').startswith(settings.CACHE_FRONTEND_URL):
                     # Don't show redirect page for directly embedded content
@@ -169,6 +175,37 @@ def cache(request):
 
     doc_meta = cache_doc.doc_meta()
     doc_uuid = doc_meta['uuid']
+
+    if raw_mode and cache_doc.is_streamable():
+        return _stream_raw_response(request, cache_doc)
+
+    render_mode = 'raw' if raw_mode else 'plain' if plain_mode else 'minimal' if minimal_mode else 'html'
+    rendered = render_cache.get(index_shorthand, doc_uuid, render_mode) if render_cache else None
+    if rendered is None:
+        try:
+            cache_doc.read_record()
+        except ValueError:
+            # Malformed or unsupported record location
+            raise Http404
+        try:
+            rendered = _render_cache_doc(cache_doc, raw_mode, plain_mode, minimal_mode)
+        except RenderPoolError as e:
+            # Fall back to the raw document if rendering failed or took too long
+            logger.warning('Could not render document %s: %s', doc_uuid, e)
+            query = request.GET.copy()
+            for param in ('plain', 'minimal'):
+                query.pop(param, None)
+            query['raw'] = '1'
+            return HttpResponseRedirect(f'{request.path}?{query.urlencode()}')
+        if render_cache and cache_doc.doc_found():
+            render_cache.set(index_shorthand, doc_uuid, render_mode, rendered)
+    elif rendered['warc_target_uri'] and not getattr(doc_meta, 'warc_target_uri', None):
+        doc_meta.warc_target_uri = rendered['warc_target_uri']
+
+    body = rendered['body']
+    if render_cache:
+        body = RenderCache.insert_auth_credential(body, auth_credential)
+
     cache_url_query = f'index={parse.quote(index_shorthand)}&uuid={parse.quote(doc_uuid)}'
     if auth_credential:
         cache_url_query += f'&apikey={parse.quote(auth_credential)}'
@@ -178,55 +215,177 @@ def cache(request):
         search_frontend_url=settings.SEARCH_FRONTEND_URL,
         cache=dict(
             meta=doc_meta,
-            title=cache_doc.html_title(),
+            title=rendered['title'],
             crawl_date=getattr(doc_meta, 'http_date', None) or getattr(doc_meta, 'warc_date', None),
             index=search_index.display_name,
-            html_meta_viewport=cache_doc.html_meta_viewport(),
+            html_meta_viewport=rendered['html_meta_viewport'],
             cache_url=parse.urlunparse(cache_url),
-            is_text_doc=cache_doc.is_text(),
-            is_html_doc=cache_doc.is_html(),
-            is_html_fragment_doc=cache_doc.is_html_fragment(),
-            is_json_doc=cache_doc.is_json(),
-            is_xml_doc=cache_doc.is_xml(),
-            is_binary_doc=cache_doc.is_binary(),
+            is_text_doc=rendered['is_text'],
+            is_html_doc=rendered['is_html'],
+            is_html_fragment_doc=rendered['is_html_fragment'],
+            is_json_doc=rendered['is_json'],
+            is_xml_doc=rendered['is_xml'],
+            is_binary_doc=rendered['is_binary'],
             taken_down=doc_taken_down,
         )
     )
 
-    body = None
-    if raw_mode or cache_doc.is_text() or cache_doc.is_binary():
-        body = cache_doc.bytes()
-    elif not cache_doc.is_binary() and (
-            plain_mode or minimal_mode or cache_doc.is_html_fragment() or cache_doc.is_xml()):
-        body = cache_doc.main_content(
-            minimal_html=((cache_doc.is_html() and minimal_mode) or cache_doc.is_html_fragment()) and not plain_mode)
-    elif cache_doc.is_html():
-        body = cache_doc.html(not raw_mode)
-
-    if cache_doc.is_text() and raw_mode:
-        content_type = f'text/plain; charset={settings.DEFAULT_CHARSET}'
-    elif not raw_mode:
-        content_type = 'text/html; charset=utf-8'
-    else:
-        content_type = iri_to_uri(cache_doc.raw_doc_content_type())
-        charset = doc_meta.content_encoding or settings.DEFAULT_CHARSET
-        content_type = f'{content_type}; charset={charset}'
-
     if raw_mode:
-        response = HttpResponse(body, content_type=content_type, status=200)
+        content_type = _raw_content_type(rendered['is_text'], rendered['raw_doc_content_type'], doc_meta)
+        response = _buffered_raw_response(request, body, content_type)
     else:
-        if not cache_doc.is_binary():
-            body_key = 'html' if (cache_doc.is_html() and not minimal_mode) else 'plainhtml'
-            if cache_doc.is_text() or plain_mode:
+        content_type = 'text/html; charset=utf-8'
+        if not rendered['is_binary']:
+            body_key = 'html' if (rendered['is_html'] and not minimal_mode) else 'plainhtml'
+            if rendered['is_text'] or plain_mode:
                 body_key = 'plaintext'
             context['cache'][f'body_{body_key}'] = body
         response = render(request, 'cache.html', context=context, content_type=content_type)
 
+    return _add_cache_headers(response, doc_meta)
+
+
+def _add_cache_headers(response, doc_meta):
     response['X-Robots-Tag'] = 'noindex,nofollow'
     response['Link'] = f'<{iri_to_uri(doc_meta.warc_target_uri)}>; rel="canonical"'
     return response
 
 
+def _raw_content_type(is_text, raw_doc_content_type, doc_meta):
+    """Response content type for raw documents."""
+    if is_text:
+        return f'text/plain; charset={settings.DEFAULT_CHARSET}'
+    charset = doc_meta.content_encoding or settings.DEFAULT_CHARSET
+    return f'{iri_to_uri(raw_doc_content_type)}; charset={charset}'
+
+
+def _parse_range_header(request, total_length):
+    """
+    Parse a single-range HTTP ``Range`` request header.
+
+    Multi-range and malformed requests are ignored and served in full.
+
+    :param request: HTTP request
+    :param total_length: total length of the response body
+    :return: tuple of start and (exclusive) end byte positions or ``None`` if no range was requested
+    :raises ValueError: if the requested range is not satisfiable
+    """
+    match = _BYTE_RANGE_REGEX.match(request.META.get('HTTP_RANGE', '').strip())
+    if not match or match.groups() == ('', ''):
+        return None
+
+    first, last = match.groups()
+    if not first:
+        # Suffix range
+        if int(last) == 0:
+            raise ValueError('Unsatisfiable range.')
+        return max(0, total_length - int(last)), total_length
+
+    start = int(first)
+    end = min(int(last) + 1, total_length) if last else total_length
+    if start >= total_length or start >= end:
+        raise ValueError('Unsatisfiable range.')
+    return start, end
+
+
+def _set_range_headers(response, byte_range, total_length):
+    response['Accept-Ranges'] = 'bytes'
+    if byte_range:
+        response['Content-Range'] = f'bytes {byte_range[0]}-{byte_range[1] - 1}/{total_length}'
+        response['Content-Length'] = byte_range[1] - byte_range[0]
+    else:
+        response['Content-Length'] = total_length
+    return response
+
+
+def _range_not_satisfiable(total_length):
+    response = HttpResponse(status=416)
+    response['Content-Range'] = f'bytes */{total_length}'
+    return response
+
+
+def _buffered_raw_response(request, body, content_type):
+    """
+    Serve a buffered raw document, honouring single byte ranges.
+    """
+    if not isinstance(body, bytes):
+        return HttpResponse(body, content_type=content_type, status=200)
+
+    try:
+        byte_range = _parse_range_header(request, len(body))
+    except ValueError:
+        return _range_not_satisfiable(len(body))
+
+    if byte_range:
+        response = HttpResponse(body[byte_range[0]:byte_range[1]], content_type=content_type, status=206)
+    else:
+        response = HttpResponse(body, content_type=content_type, status=200)
+    return _set_range_headers(response, byte_range, len(body))
+
+
+def _stream_raw_response(request, cache_doc):
+    """
+    Stream a large raw document from the WARC record to the client without buffering it.
+
+    Range requests for uncompressed WARC records are served with an S3 byte range at the requested offset.
+    Compressed WARC records cannot be seeked into directly, so they are skipped to the offset within the
+    (bounded) record stream.
+    """
+    try:
+        total_length = cache_doc.open_payload_stream()
+    except ValueError:
+        # Malformed or unsupported record location
+        raise Http404
+    if total_length is None:
+        raise Http404
+
+    try:
+        byte_range = _parse_range_header(request, total_length)
+    except ValueError:
+        cache_doc.close()
+        return _range_not_satisfiable(total_length)
+
+    content_type = _raw_content_type(cache_doc.is_text(), cache_doc.raw_doc_content_type(), cache_doc.doc_meta())
+    if byte_range:
+        response = StreamingHttpResponse(cache_doc.iter_payload(*byte_range), content_type=content_type, status=206)
+    else:
+        response = StreamingHttpResponse(cache_doc.iter_payload(), content_type=content_type, status=200)
+    _set_range_headers(response, byte_range, total_length)
+    return _add_cache_headers(response, cache_doc.doc_meta())
+
+
+def _render_cache_doc(cache_doc, raw_mode, plain_mode, minimal_mode):
+    """
+    Render the body of a cache document for the given mode.
+
+    :return: dict with rendered body and the document properties needed for displaying it
+    """
+    body = None
+    if raw_mode or cache_doc.is_text():
+        body = cache_doc.bytes()
+    elif not cache_doc.is_binary() and (
+            plain_mode or minimal_mode or cache_doc.is_html_fragment() or cache_doc.is_xml()):
+        body = cache_doc.main_content(
+            minimal_html=((cache_doc.is_html() and minimal_mode) or cache_doc.is_html_fragment()) and not plain_mode)
+    elif cache_doc.is_html():
+        body = cache_doc.html(not raw_mode)
+
+    return dict(
+        body=body,
+        # Raw documents are delivered as is, so avoid parsing their HTML head
+        title='' if raw_mode else cache_doc.html_title(),
+        html_meta_viewport=None if raw_mode else cache_doc.html_meta_viewport(),
+        raw_doc_content_type=cache_doc.raw_doc_content_type(),
+        warc_target_uri=getattr(cache_doc.doc_meta(), 'warc_target_uri', None),
+        is_text=bool(cache_doc.is_text()),
+        is_html=bool(cache_doc.is_html()),
+        is_html_fragment=bool(cache_doc.is_html_fragment()),
+        is_json=bool(cache_doc.is_json()),
+        is_xml=bool(cache_doc.is_xml()),
+        is_binary=bool(cache_doc.is_binary()),
+    )
+
+
 @require_safe
 def term_vectors(request):
     """Get term vector for a document, useful for query expansion, relevance feedback, etc."""